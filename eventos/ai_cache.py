@@ -0,0 +1,145 @@
+"""
+eventos/ai_cache.py
+Caché de respuestas de Gemini para el asistente de eventos y el chatbot.
+
+La llave combina la pregunta normalizada con un hash del contexto del
+prompt (datos del evento, lista de eventos recomendados o plantilla), así
+que editar el evento cambia la llave y la respuesta vieja deja de usarse.
+Las respuestas viven en la caché de Django (compartida entre procesos,
+con vigencia ``AI_ANSWER_CACHE_SECONDS``) y en una copia LRU del proceso
+limitada a ``AI_ANSWER_CACHE_MAX_ENTRIES``. Peticiones idénticas en
+paralelo se agrupan en una sola llamada a Gemini: dentro del proceso las
+demás esperan el resultado del primero, y entre procesos un ``cache.add``
+reserva la llamada mientras los demás sondean la caché.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .places import normalizar
+
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_LOCK_SECONDS = 30
+POLL_SECONDS = 0.1
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, sin acentos, sin signos de puntuación y con espacios simples."""
+    return " ".join(re.sub(r"[^\w\s]", " ", normalizar(question or "")).split())
+
+
+def answer_key(scope: str, question: str, context: str) -> str:
+    digest = hashlib.sha256(f"{normalize_question(question)}\x1f{context}".encode("utf-8")).hexdigest()
+    return f"ai_answer:{scope}:{digest}"
+
+
+class AnswerCache:
+    """Respuestas por llave con vigencia, límite de tamaño y agrupación de llamadas."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+
+    @property
+    def ttl(self) -> int:
+        return getattr(settings, "AI_ANSWER_CACHE_SECONDS", DEFAULT_TTL_SECONDS)
+
+    @property
+    def max_entries(self) -> int:
+        return getattr(settings, "AI_ANSWER_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+
+    @property
+    def lock_seconds(self) -> int:
+        return getattr(settings, "AI_ANSWER_LOCK_SECONDS", DEFAULT_LOCK_SECONDS)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._local.move_to_end(key)
+                    return entry[1]
+                del self._local[key]
+        answer = cache.get(key)
+        if answer is not None:
+            self._remember(key, answer)
+        return answer
+
+    def set(self, key: str, answer: str) -> None:
+        cache.set(key, answer, self.ttl)
+        self._remember(key, answer)
+
+    def clear(self) -> None:
+        """Vacía la copia del proceso; la caché compartida expira sola."""
+        with self._lock:
+            self._local.clear()
+
+    def _remember(self, key: str, answer: str) -> None:
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.ttl, answer)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        """
+        Devuelve la respuesta cacheada o la calcula con ``compute``. Las
+        respuestas vacías y los errores no se cachean; un error se propaga
+        también a las peticiones que esperaban la misma llave.
+        """
+        answer = self.get(key)
+        if answer is not None:
+            return answer
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            answer = self._compute_once(key, compute)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(answer)
+            return answer
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _compute_once(self, key: str, compute: Callable[[], str]) -> str:
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + self.lock_seconds
+        owner = cache.add(lock_key, 1, self.lock_seconds)
+        # Otro proceso ya está llamando a Gemini con la misma llave: se espera su respuesta
+        while not owner and time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            answer = self.get(key)
+            if answer is not None:
+                return answer
+            owner = cache.add(lock_key, 1, self.lock_seconds)
+        try:
+            answer = compute()
+            if answer:
+                self.set(key, answer)
+            return answer
+        finally:
+            if owner:
+                cache.delete(lock_key)
+
+
+answer_cache = AnswerCache()
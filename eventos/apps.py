@@ -7,3 +7,7 @@ class EventosConfig(AppConfig):
 
     def ready(self):
         import eventos.signals
+        from eventos.places import get_place_index
+
+        # Índice de lugares del chatbot: se construye una vez al arrancar el proceso
+        get_place_index()
@@ -0,0 +1,190 @@
+"""
+eventos/cancellation.py
+Cancelación masiva de eventos: tickets, aforo, pagos y notificaciones por lotes.
+
+``start_event_cancellation`` marca el evento como cancelado y crea un
+``EventCancellationJob``; el trabajo lo procesa el comando
+``process_cancellation_jobs --loop``, que también reanuda los que quedaron
+en curso o fallidos. Solo con ``EVENT_CANCELLATION_RUN_IN_THREAD`` corre en
+un hilo al confirmar la transacción. Cada lote
+cancela tickets con un UPDATE, descuenta aforo con un UPDATE por tipo de
+contador, marca los pagos y encola los correos con ``bulk_create``. Como
+solo toma tickets aún activos, un trabajo interrumpido se puede reanudar.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Event, EventCancellationJob, Ticket, TicketStatusChoices
+from .services import _release_held, _release_sold
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CANCELLATION_BATCH_SIZE = 1000
+ACTIVE_STATUSES = (TicketStatusChoices.COMPRADA, TicketStatusChoices.PENDIENTE)
+
+
+def start_event_cancellation(event: Event, requested_by=None) -> EventCancellationJob:
+    """Cancela el evento y programa la cancelación de sus tickets en segundo plano."""
+    with transaction.atomic():
+        event.status = "cancelado"
+        if requested_by is not None:
+            event._changed_by = requested_by
+        event.save(update_fields=["status"])
+        job = EventCancellationJob.objects.create(
+            event=event,
+            requested_by=requested_by,
+            total_tickets=Ticket.objects.filter(event=event, status__in=ACTIVE_STATUSES).count(),
+        )
+        if getattr(settings, "EVENT_CANCELLATION_RUN_IN_THREAD", False):
+            transaction.on_commit(lambda: _run_in_thread(job.pk))
+    return job
+
+
+def _run_in_thread(job_id: int) -> None:
+    def target():
+        try:
+            process_cancellation_job(job_id)
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=target, name=f"event-cancellation-{job_id}", daemon=True).start()
+
+
+def _cancel_batch(job: EventCancellationJob, batch_size: int) -> int:
+    """Cancela un lote de tickets activos del evento y devuelve cuántos procesó."""
+    from usuarios.email_service import queue_emails
+
+    event = job.event
+    with transaction.atomic():
+        rows = list(
+            Ticket.objects.select_for_update(skip_locked=True)
+            .filter(event_id=event.pk, status__in=ACTIVE_STATUSES)
+            .order_by("id")
+            .values_list(
+                "id", "status", "config_type_id", "inventory_shard", "amount",
+                "hold_expires_at", "unique_code", "payment_reference", "user_id",
+                "user__email", "user__first_name",
+            )[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        sold: Dict[Tuple[int, Optional[int]], int] = defaultdict(int)
+        held: Dict[Tuple[int, Optional[int]], int] = defaultdict(int)
+        paid_refs, pending_refs = set(), set()
+        recipients: Dict[int, Tuple[str, str]] = {}
+        for (_, ticket_status, config_type_id, shard, amount, hold_expires_at,
+             unique_code, payment_reference, user_id, email, first_name) in rows:
+            refs = {unique_code, payment_reference} - {None}
+            if ticket_status == TicketStatusChoices.COMPRADA:
+                sold[(config_type_id, shard)] += amount
+                paid_refs |= refs
+                recipients[user_id] = (email, first_name)
+            else:
+                if hold_expires_at is not None:
+                    held[(config_type_id, shard)] += amount
+                pending_refs |= refs
+
+        Ticket.objects.filter(id__in=[row[0] for row in rows]).update(
+            status=TicketStatusChoices.CANCELADA,
+            hold_expires_at=None,
+        )
+        _release_sold(sold)
+        _release_held(held)
+
+        refunds = _close_payments(event, paid_refs, pending_refs)
+
+        # Un usuario con varios tickets en el lote recibe un solo aviso
+        emails = queue_emails(
+            (
+                email,
+                f"Evento cancelado: {event.event_name}",
+                "emails/event_cancelled",
+                {"name": first_name or email, "event_name": event.event_name},
+            )
+            for email, first_name in recipients.values()
+        )
+
+        EventCancellationJob.objects.filter(pk=job.pk).update(
+            processed_tickets=F("processed_tickets") + len(rows),
+            refunds_marked=F("refunds_marked") + refunds,
+            emails_queued=F("emails_queued") + emails,
+        )
+    return len(rows)
+
+
+def _close_payments(event: Event, paid_refs, pending_refs) -> int:
+    """
+    Marca para reembolso los pagos aprobados y cancela los que no se completaron,
+    registrando cada cambio en el libro de pagos. Devuelve los reembolsos marcados.
+    """
+    from payments.ledger import build_entry, record_entries
+    from payments.models import PaymentTransaction
+
+    payments = list(
+        PaymentTransaction.objects.select_for_update()
+        .filter(
+            Q(reference_code__in=paid_refs, status="aprobado")
+            | Q(reference_code__in=pending_refs, status__in=["iniciada", "pendiente"])
+        )
+        .only("id", "reference_code", "status", "amount", "currency")
+    )
+    entries, by_status = [], defaultdict(list)
+    for payment in payments:
+        from_status = payment.status
+        payment.status = "reembolso_pendiente" if from_status == "aprobado" else "cancelada"
+        by_status[payment.status].append(payment.id)
+        entries.append(
+            build_entry(payment, from_status=from_status, from_amount=payment.amount, event_id=event.pk)
+        )
+
+    now = timezone.now()
+    for new_status, ids in by_status.items():
+        PaymentTransaction.objects.filter(id__in=ids).update(status=new_status, updated_at=now)
+    record_entries(entries)
+    return len(by_status["reembolso_pendiente"])
+
+
+def process_cancellation_job(job_id: int, batch_size: int = DEFAULT_CANCELLATION_BATCH_SIZE) -> EventCancellationJob:
+    """Procesa un trabajo de cancelación hasta terminar los tickets activos del evento."""
+    job = EventCancellationJob.objects.select_related("event").get(pk=job_id)
+    if job.status == EventCancellationJob.Status.COMPLETADO:
+        return job
+    EventCancellationJob.objects.filter(pk=job.pk).update(
+        status=EventCancellationJob.Status.EN_PROGRESO,
+        started_at=job.started_at or timezone.now(),
+    )
+    try:
+        while _cancel_batch(job, batch_size) == batch_size:
+            pass
+    except Exception as exc:
+        logger.exception("Falló la cancelación del evento %s (trabajo %s)", job.event_id, job.pk)
+        EventCancellationJob.objects.filter(pk=job.pk).update(
+            status=EventCancellationJob.Status.FALLIDO, error=str(exc)[:1000]
+        )
+    else:
+        # Tickets bloqueados por otro proceso quedan para la siguiente ejecución
+        remaining = Ticket.objects.filter(event_id=job.event_id, status__in=ACTIVE_STATUSES).exists()
+        if not remaining:
+            EventCancellationJob.objects.filter(pk=job.pk).update(
+                status=EventCancellationJob.Status.COMPLETADO, finished_at=timezone.now(), error=""
+            )
+    job.refresh_from_db()
+    return job
+
+
+def pending_jobs():
+    """Trabajos sin terminar, en orden de creación."""
+    return EventCancellationJob.objects.filter(
+        ~Q(status=EventCancellationJob.Status.COMPLETADO)
+    ).order_by("created_at")
@@ -0,0 +1,146 @@
+"""
+Compara el reconocimiento de lugares del chatbot contra la versión anterior.
+
+La versión anterior releía el fixture en cada petición y llamaba a
+``difflib.get_close_matches`` por palabra contra todas las ciudades,
+departamentos y variantes de categoría. El índice de ``eventos.places`` se
+construye una vez por proceso. El comando genera mensajes con nombres del
+fixture (con y sin errores de tipeo), verifica que ambas versiones
+reconozcan lo mismo y reporta el tiempo por mensaje.
+"""
+
+import json
+import random
+import time
+from difflib import get_close_matches
+from typing import List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eventos.places import CATEGORY_VARIANTS, FIXTURE_PATH, PlaceIndex, normalizar
+
+FILLERS = [
+    "hola", "que", "eventos", "hay", "en", "este", "fin", "de", "semana", "me",
+    "recomiendas", "algo", "para", "ir", "con", "mis", "amigos", "cerca", "a",
+]
+
+
+def _legacy_match(palabras: List[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Reconocimiento tal como lo hacía ChatBotView.post antes del índice."""
+    with open(FIXTURE_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    ciudades = [normalizar(x["fields"]["name"]) for x in data if x["model"].endswith("city")]
+    departamento_map = {
+        normalizar(x["fields"]["name"]): x["fields"]["name"] for x in data if x["model"].endswith("department")
+    }
+
+    cat = None
+    for palabra in palabras:
+        for key, variantes in CATEGORY_VARIANTS.items():
+            if get_close_matches(palabra, [normalizar(v) for v in variantes], n=1, cutoff=0.7):
+                cat = key
+                break
+        if cat:
+            break
+
+    ciudad = None
+    for palabra in palabras:
+        coincidencias = get_close_matches(palabra, ciudades, n=1, cutoff=0.7)
+        if coincidencias:
+            ciudad = coincidencias[0]
+            break
+
+    departamento_real = None
+    for palabra in palabras:
+        coincidencias = get_close_matches(palabra, list(departamento_map.keys()), n=1, cutoff=0.7)
+        if coincidencias:
+            departamento_real = departamento_map[coincidencias[0]]
+            break
+    return cat, ciudad, departamento_real
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    index = rng.randrange(len(word))
+    return word[:index] + word[index + 1:] if rng.random() < 0.5 else word[:index] + word[index] + word[index:]
+
+
+class Command(BaseCommand):
+    help = "Mide el reconocimiento de ciudades, departamentos y categorías del chatbot contra difflib."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000, help="Mensajes distintos a generar.")
+        parser.add_argument("--rounds", type=int, default=3, help="Veces que se recorre la lista de mensajes.")
+        parser.add_argument("--seed", type=int, default=7, help="Semilla de los mensajes generados.")
+
+    def handle(self, *args, **options):
+        if options["messages"] <= 0 or options["rounds"] <= 0:
+            raise CommandError("--messages y --rounds deben ser positivos.")
+        rng = random.Random(options["seed"])
+
+        started = time.perf_counter()
+        index = PlaceIndex.from_fixture()
+        build_seconds = time.perf_counter() - started
+        if not len(index.cities):
+            raise CommandError(f"No se pudieron cargar lugares desde {FIXTURE_PATH}.")
+
+        names = list(index.cities.canonical) + list(index.departments.canonical)
+        categories = [variant for variants in CATEGORY_VARIANTS.values() for variant in variants]
+        messages = []
+        for _ in range(options["messages"]):
+            words = rng.sample(FILLERS, rng.randint(3, 8))
+            for pool in (names, categories):
+                if rng.random() < 0.6:
+                    word = normalizar(rng.choice(pool)).split()[0]
+                    words.insert(rng.randrange(len(words) + 1), _typo(word, rng) if rng.random() < 0.4 else word)
+            messages.append(normalizar(" ".join(words)).split())
+
+        def recognize(palabras):
+            departamento = index.departments.first_match(palabras)
+            return (
+                index.category(palabras),
+                index.cities.first_match(palabras),
+                index.departments.canonical.get(departamento) if departamento else None,
+            )
+
+        mismatches = [palabras for palabras in messages if recognize(palabras) != _legacy_match(palabras)]
+        if mismatches:
+            raise CommandError(
+                f"{len(mismatches)} mensajes con resultados distintos; p. ej. {' '.join(mismatches[0])!r}."
+            )
+
+        total = len(messages) * options["rounds"]
+        started = time.perf_counter()
+        for _ in range(options["rounds"]):
+            for palabras in messages:
+                _legacy_match(palabras)
+        legacy_seconds = time.perf_counter() - started
+
+        # Índice nuevo sin memoria de palabras, y después con la memoria ya caliente
+        cold = PlaceIndex.from_fixture()
+        started = time.perf_counter()
+        for palabras in messages:
+            cold.category(palabras)
+            cold.cities.first_match(palabras)
+            cold.departments.first_match(palabras)
+        cold_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(options["rounds"]):
+            for palabras in messages:
+                recognize(palabras)
+        index_seconds = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Índice: {len(index.cities)} ciudades y {len(index.departments)} departamentos, "
+            f"construido en {build_seconds * 1000:.2f} ms"
+        )
+        self.stdout.write(f"difflib + fixture por petición: {legacy_seconds / total * 1e6:.1f} µs/mensaje")
+        self.stdout.write(f"Índice en frío: {cold_seconds / len(messages) * 1e6:.1f} µs/mensaje")
+        self.stdout.write(f"Índice en caliente: {index_seconds / total * 1e6:.1f} µs/mensaje")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(messages)} mensajes reconocidos igual que con difflib; "
+                f"{legacy_seconds / max(index_seconds, 1e-9):.0f}x más rápido."
+            )
+        )
@@ -0,0 +1,264 @@
+"""
+Prueba de carga del flujo de compra (BuyTicketAPIView) ante una apertura de venta.
+
+Crea un evento con aforo limitado y un usuario con token por petición, y
+lanza compras concurrentes por HTTP contra un servidor local. Por defecto
+levanta un servidor WSGI en el mismo proceso; con ``--base-url`` apunta a
+uno externo que comparta la base de datos. Reporta rendimiento y latencias
+p50/p95/p99 con el conteo de respuestas por código, y verifica que los
+contadores de aforo coincidan con los tickets creados y nunca superen
+``maximun_capacity``. Falla si alguna petición terminó en 5xx o error de
+red, si ninguna compra tuvo éxito o si las compras exitosas no coinciden
+con los boletos contados.
+
+Solo corre con DEBUG, contra SQLite o una base ``test_*``; otra base exige
+``--i-know``. Al terminar borra el evento, los usuarios y sus tickets salvo
+con ``--keep``. SQLite serializa las escrituras: con concurrencia alta las
+compras fallan con "database is locked", así que las cifras representativas
+se obtienen con PostgreSQL.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import List, Optional, Tuple
+from urllib import error, request as urlrequest
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.models import Sum
+
+from eventos.models import Event, Ticket, TicketStatusChoices, TicketType, TicketTypeEvent
+from eventos.services import enable_sharding
+from usuarios.authentication import issue_access_token
+from usuarios.models import CustomUser
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _QuietServer(ThreadedWSGIServer):
+    # Los errores de conexión ya cuentan como "error de red" en el reporte
+    def handle_error(self, request, client_address):
+        pass
+
+
+def check_database(allow_any: bool) -> None:
+    """Rechaza bases que no sean locales o de pruebas salvo con DEBUG o confirmación explícita."""
+    name = str(connection.settings_dict["NAME"])
+    if allow_any or settings.DEBUG or connection.vendor == "sqlite" or name.startswith("test_"):
+        return
+    raise CommandError(
+        f"La base '{name}' ({connection.vendor}) no parece local ni de pruebas. "
+        "Activa DEBUG, usa una base test_* o confirma con --i-know."
+    )
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def _histogram(codes: Counter) -> str:
+    return ", ".join(f"{code}: {count}" for code, count in sorted(codes.items(), key=str))
+
+
+class Command(BaseCommand):
+    help = "Lanza compras concurrentes contra un evento de prueba y verifica que no haya sobreventa."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Total de compras a lanzar.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Hilos que envían compras en paralelo.")
+        parser.add_argument("--capacity", type=int, default=500, help="Aforo del tipo de ticket sembrado.")
+        parser.add_argument("--amount", type=int, default=1, help="Boletos por compra.")
+        parser.add_argument(
+            "--price",
+            type=Decimal,
+            default=Decimal("0"),
+            help="Precio del ticket; 0 vende directo, otro valor crea retenciones pendientes.",
+        )
+        parser.add_argument("--shards", type=int, default=0, help="Fragmentos de inventario (0 sin fragmentar).")
+        parser.add_argument(
+            "--base-url",
+            default="",
+            help="URL de un servidor ya levantado (ej. http://127.0.0.1:8000). Vacío levanta uno en proceso.",
+        )
+        parser.add_argument("--timeout", type=float, default=30.0, help="Timeout por petición en segundos.")
+        parser.add_argument("--keep", action="store_true", help="Conserva el evento y usuarios sembrados.")
+        parser.add_argument(
+            "--i-know",
+            action="store_true",
+            help="Permite correr contra una base que no es local ni de pruebas.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] <= 0 or options["concurrency"] <= 0 or options["amount"] <= 0:
+            raise CommandError("--requests, --concurrency y --amount deben ser positivos.")
+
+        check_database(options["i_know"])
+        if connection.vendor == "sqlite" and options["concurrency"] > 1:
+            self.stdout.write(
+                self.style.WARNING(
+                    "SQLite serializa las escrituras: espera respuestas 500 por 'database is locked'. "
+                    "Usa PostgreSQL para medir."
+                )
+            )
+
+        run_id = uuid.uuid4().hex[:8]
+        event, config_type, users, ticket_type_created = self._seed(run_id, options)
+        try:
+            tokens = [issue_access_token(user)[0] for user in users]
+            codes = self._run(event, config_type, tokens, options)
+            self._verify(config_type, options["capacity"], codes, options["amount"])
+        finally:
+            if not options["keep"]:
+                self._cleanup(event, config_type, users, ticket_type_created)
+
+    def _run(self, event: Event, config_type: TicketTypeEvent, tokens: List[str], options) -> Counter:
+        server = None
+        base_url = options["base_url"].rstrip("/")
+        if not base_url:
+            server = _QuietServer(("127.0.0.1", 0), _QuietHandler)
+            server.set_app(get_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        url = f"{base_url}/api/events/{event.id}/buy/"
+        body = json.dumps({"config_type_id": config_type.id, "amount": options["amount"]}).encode("utf-8")
+
+        self.stdout.write(
+            f"Lanzando {len(tokens)} compras con {options['concurrency']} hilos contra {url} "
+            f"(aforo {options['capacity']}, {options['amount']} boleto(s) por compra)..."
+        )
+        # Los 400 por aforo agotado son esperados y los 5xx se cuentan en el reporte;
+        # sus trazas no se registran una a una
+        logging.disable(logging.CRITICAL)
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                results = list(
+                    executor.map(lambda token: self._buy(url, body, token, options["timeout"]), tokens)
+                )
+            elapsed = time.perf_counter() - started
+        finally:
+            logging.disable(logging.NOTSET)
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        return self._report(results, elapsed)
+
+    def _seed(self, run_id: str, options) -> Tuple[Event, TicketTypeEvent, List[CustomUser], bool]:
+        event = Event.objects.create(
+            event_name=f"Prueba de carga {run_id}",
+            description="Evento sembrado por loadtest_purchases.",
+            status="activo",
+        )
+        ticket_type, ticket_type_created = TicketType.objects.get_or_create(ticket_name="Prueba de carga")
+        config_type = TicketTypeEvent.objects.create(
+            event=event,
+            ticket_type=ticket_type,
+            price=options["price"],
+            maximun_capacity=options["capacity"],
+        )
+        if options["shards"] > 1:
+            enable_sharding(config_type, options["shards"])
+
+        users = CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    username=f"loadtest-{run_id}-{index}",
+                    email=f"loadtest-{run_id}-{index}@example.com",
+                    first_name="Carga",
+                    last_name=str(index),
+                    password="!",
+                )
+                for index in range(options["requests"])
+            ]
+        )
+        if any(user.pk is None for user in users):
+            users = list(CustomUser.objects.filter(username__startswith=f"loadtest-{run_id}-"))
+        return event, config_type, users, ticket_type_created
+
+    @staticmethod
+    def _cleanup(event: Event, config_type: TicketTypeEvent, users: List[CustomUser], ticket_type_created: bool) -> None:
+        # Los tickets, fragmentos e historial del evento caen en cascada con él y con los usuarios
+        event.delete()
+        CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+        if ticket_type_created:
+            TicketType.objects.filter(pk=config_type.ticket_type_id, tickettypeevent__isnull=True).delete()
+
+    @staticmethod
+    def _buy(url: str, body: bytes, token: str, timeout: float) -> Tuple[Optional[int], float]:
+        req = urlrequest.Request(
+            url,
+            data=body,
+            method="POST",
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        )
+        started = time.perf_counter()
+        try:
+            with urlrequest.urlopen(req, timeout=timeout) as response:
+                response.read()
+                code = response.status
+        except error.HTTPError as exc:
+            code = exc.code
+        except (error.URLError, OSError):
+            code = None
+        return code, time.perf_counter() - started
+
+    def _report(self, results: List[Tuple[Optional[int], float]], elapsed: float) -> Counter:
+        latencies = sorted(latency for _, latency in results)
+        codes = Counter("error de red" if code is None else code for code, _ in results)
+        self.stdout.write(f"Duración: {elapsed:.2f} s; rendimiento: {len(results) / elapsed:.1f} compras/s")
+        self.stdout.write(
+            "Latencia p50/p95/p99: "
+            + " / ".join(f"{_percentile(latencies, p) * 1000:.1f} ms" for p in (50, 95, 99))
+        )
+        self.stdout.write(f"Respuestas: {_histogram(codes)}")
+        return codes
+
+    def _verify(self, config_type: TicketTypeEvent, capacity: int, codes: Counter, amount: int) -> None:
+        config_type = TicketTypeEvent.objects.with_inventory().get(pk=config_type.pk)
+        tickets = Ticket.objects.filter(config_type=config_type)
+        sold = tickets.filter(status=TicketStatusChoices.COMPRADA).aggregate(total=Sum("amount"))["total"] or 0
+        held = (
+            tickets.filter(status=TicketStatusChoices.PENDIENTE, hold_expires_at__isnull=False)
+            .aggregate(total=Sum("amount"))["total"]
+            or 0
+        )
+        self.stdout.write(
+            f"Aforo: vendidos {config_type.total_sold} (tickets {sold}), "
+            f"retenidos {config_type.total_held} (tickets {held}), máximo {capacity}"
+        )
+
+        problems = []
+        failed = sum(count for code, count in codes.items() if not isinstance(code, int) or code >= 500)
+        succeeded = sum(count for code, count in codes.items() if isinstance(code, int) and 200 <= code < 300)
+        if failed:
+            problems.append(f"{failed} peticiones terminaron en 5xx o error de red")
+        if not succeeded:
+            problems.append("ninguna compra tuvo éxito")
+        if succeeded * amount != sold + held:
+            problems.append(f"{succeeded} compras exitosas no coinciden con {sold + held} boletos en tickets")
+        if config_type.total_sold != sold:
+            problems.append(f"capacity_sold={config_type.total_sold} no coincide con {sold} boletos vendidos")
+        if config_type.total_held != held:
+            problems.append(f"capacity_held={config_type.total_held} no coincide con {held} boletos retenidos")
+        if config_type.total_sold + config_type.total_held > capacity:
+            problems.append("se superó maximun_capacity")
+        if problems:
+            raise CommandError("Prueba fallida: " + "; ".join(problems) + f". Respuestas: {_histogram(codes)}.")
+        self.stdout.write(self.style.SUCCESS("Inventario consistente: sin sobreventa."))
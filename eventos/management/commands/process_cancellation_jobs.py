@@ -0,0 +1,51 @@
+"""Procesa o reanuda las cancelaciones masivas de eventos que no terminaron."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from eventos.cancellation import DEFAULT_CANCELLATION_BATCH_SIZE, pending_jobs, process_cancellation_job
+
+
+class Command(BaseCommand):
+    help = "Anula por lotes los tickets de eventos cancelados cuyo trabajo quedó pendiente, en curso o fallido."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_CANCELLATION_BATCH_SIZE,
+            help="Cantidad de tickets anulados por transacción.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Sigue ejecutándose y sondea los trabajos cuando no queda ninguno.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5.0,
+            help="Segundos de espera entre sondeos con --loop.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                completed = 0
+                for job_id in pending_jobs().values_list("id", flat=True):
+                    job = process_cancellation_job(job_id, batch_size=options["batch_size"])
+                    completed += job.status == job.Status.COMPLETADO
+                    self.stdout.write(
+                        f"Trabajo {job.pk} (evento {job.event_id}): {job.status}, "
+                        f"{job.processed_tickets}/{job.total_tickets} tickets, "
+                        f"{job.refunds_marked} reembolsos, {job.emails_queued} correos."
+                    )
+                if not options["loop"]:
+                    break
+                # Una pasada sin trabajos terminados (ninguno, fallidos o bloqueados) espera antes de reintentar
+                if not completed:
+                    time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Cancelaciones procesadas."))
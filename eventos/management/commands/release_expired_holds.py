@@ -0,0 +1,38 @@
+"""Libera retenciones de inventario vencidas y cancela tickets pendientes abandonados."""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from eventos.services import DEFAULT_SWEEP_BATCH_SIZE, release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Cancela tickets pendientes con retención vencida y devuelve su aforo en lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_SWEEP_BATCH_SIZE,
+            help="Cantidad de tickets procesados por transacción.",
+        )
+        parser.add_argument(
+            "--stale-hours",
+            type=int,
+            default=24,
+            help="Cancela pendientes sin retención más antiguos que estas horas (0 para omitir).",
+        )
+
+    def handle(self, *args, **options):
+        stale_hours = options["stale_hours"]
+        result = release_expired_holds(
+            batch_size=options["batch_size"],
+            stale_after=timedelta(hours=stale_hours) if stale_hours > 0 else None,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Retenciones liberadas: {result['released']}. "
+                f"Pendientes antiguos cancelados: {result['stale']}."
+            )
+        )
@@ -0,0 +1,34 @@
+"""Activa o desactiva contadores de inventario fragmentados para un tipo de ticket."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eventos.models import TicketTypeEvent
+from eventos.services import disable_sharding, enable_sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Reparte el aforo libre de un TicketTypeEvent en N contadores para reducir la "
+        "contención en eventos de alta demanda. Con --shards 0 vuelve al contador único."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("config_type_id", type=int, help="ID del TicketTypeEvent.")
+        parser.add_argument("--shards", type=int, default=8, help="Cantidad de fragmentos (0 para desactivar).")
+
+    def handle(self, *args, **options):
+        try:
+            config_type = TicketTypeEvent.objects.get(pk=options["config_type_id"])
+        except TicketTypeEvent.DoesNotExist as exc:
+            raise CommandError("El TicketTypeEvent indicado no existe.") from exc
+
+        shards = options["shards"]
+        if shards == 0:
+            disable_sharding(config_type)
+            self.stdout.write(self.style.SUCCESS(f"Contador único restaurado para {config_type}."))
+            return
+        if shards < 2:
+            raise CommandError("Use al menos 2 fragmentos, o 0 para desactivar.")
+
+        enable_sharding(config_type, shards)
+        self.stdout.write(self.style.SUCCESS(f"{config_type} ahora usa {shards} contadores de inventario."))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0008_chathistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, help_text='Vencimiento de la retención de inventario del ticket pendiente.', null=True),
+        ),
+        migrations.AddField(
+            model_name='tickettypeevent',
+            name='capacity_held',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Boletos retenidos por tickets pendientes de pago.'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['status', 'hold_expires_at'], name='events_tick_status_f7be4b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['user', 'config_type', 'status'], name='events_tick_user_id_db010c_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0009_ticket_inventory_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='waiting_room_enabled',
+            field=models.BooleanField(default=False, help_text='Exige pasar por la sala de espera virtual antes de comprar.'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='waiting_room_rate_per_minute',
+            field=models.PositiveIntegerField(blank=True, help_text='Compradores admitidos por minuto. Vacío usa WAITING_ROOM_RATE_PER_MINUTE.', null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0010_event_waiting_room'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='inventory_shard',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Fragmento de inventario donde se contó el ticket (NULL: la fila de TicketTypeEvent).', null=True),
+        ),
+        migrations.AddField(
+            model_name='tickettypeevent',
+            name='counter_shards',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Contadores de inventario repartidos (0 = contador único en esta fila).'),
+        ),
+        migrations.CreateModel(
+            name='InventoryShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('maximun_capacity', models.PositiveIntegerField(default=0, help_text='Aforo asignado a este fragmento.')),
+                ('capacity_sold', models.PositiveIntegerField(default=0)),
+                ('capacity_held', models.PositiveIntegerField(default=0)),
+                ('config_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_shards', to='eventos.tickettypeevent')),
+            ],
+            options={
+                'verbose_name': 'Inventory shard',
+                'db_table': 'events_inventory_shard',
+                'unique_together': {('config_type', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0011_inventory_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='payment_reference',
+            field=models.CharField(blank=True, db_index=True, help_text='Referencia de pago de la orden (carrito) a la que pertenece el ticket.', max_length=64, null=True),
+        ),
+    ]
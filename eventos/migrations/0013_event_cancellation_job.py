@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0012_ticket_payment_reference'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCancellationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_progreso', 'En progreso'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=16)),
+                ('total_tickets', models.PositiveIntegerField(default=0, help_text='Tickets activos al iniciar la cancelación.')),
+                ('processed_tickets', models.PositiveIntegerField(default=0)),
+                ('refunds_marked', models.PositiveIntegerField(default=0, help_text='Transacciones aprobadas marcadas para reembolso.')),
+                ('emails_queued', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cancellation_jobs', to='eventos.event')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'events_cancellation_job',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
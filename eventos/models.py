@@ -3,7 +3,8 @@ eventos/models.py
 Modelos principales del módulo de eventos. Clean code, docstrings y auditoría.
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 
@@ -75,6 +76,13 @@ class City(models.Model):
     def __str__(self):
         return f"{self.name} ({self.department.name})"
 
+def _add_update_field(save_kwargs, field_name):
+    """Agrega un campo a update_fields cuando save() se llamó con una lista parcial."""
+    update_fields = save_kwargs.get("update_fields")
+    if update_fields is not None and field_name not in update_fields:
+        save_kwargs["update_fields"] = [*update_fields, field_name]
+
+
 class TicketAccessLog(models.Model):
     """Auditoría de accesos a tickets."""
     ticket = models.ForeignKey('Ticket', on_delete=models.CASCADE, related_name='access_logs')
@@ -89,6 +97,7 @@ class TicketAccessLog(models.Model):
     def __str__(self):
         return f"Acceso a ticket {self.ticket.id} por {self.accessed_by} en {self.access_time}"
 
+from usuarios.audit import AuditSnapshotMixin
 from usuarios.models import CustomUser
 from django.conf import settings
 
@@ -105,7 +114,9 @@ class TicketType(models.Model):
     def __str__(self):
         return self.ticket_name
 
-class Event(models.Model): 
+class Event(AuditSnapshotMixin, models.Model): 
+    # Campos cuyo cambio queda en EventChangeLog
+    AUDIT_FIELDS = ("event_name", "description", "start_datetime", "end_datetime", "status", "category", "image", "organizer")
     creator = models.ForeignKey(
         settings.AUTH_USER_MODEL, # Apunta a tu modelo CustomUser
         on_delete=models.SET_NULL,  # Si se borra el usuario, el evento no se borra (se pone en NULL)
@@ -137,6 +148,8 @@ class Event(models.Model):
     min_age = models.PositiveIntegerField(blank=True, null=True, help_text="Edad mínima requerida para asistir al evento. Dejar vacío si no hay restricción.")
     max_capacity = models.PositiveIntegerField(blank=True, null=True, help_text="Aforo máximo permitido para el evento.")
     sales_open_datetime = models.DateTimeField(blank=True, null=True, help_text="Fecha y hora en que se habilitan las ventas de tickets.")
+    waiting_room_enabled = models.BooleanField(default=False, help_text="Exige pasar por la sala de espera virtual antes de comprar.")
+    waiting_room_rate_per_minute = models.PositiveIntegerField(blank=True, null=True, help_text="Compradores admitidos por minuto. Vacío usa WAITING_ROOM_RATE_PER_MINUTE.")
 
 
     # Relación con tipos de boletos disponibles para este evento
@@ -176,6 +189,18 @@ class Event(models.Model):
             if qs.exists():
                 raise ValidationError("Ya existe un evento con el mismo nombre, lugar y fecha/hora.")
 
+class TicketTypeEventQuerySet(models.QuerySet):
+    def with_inventory(self):
+        """Anota vendidos y retenidos totales: la fila más la suma de sus fragmentos."""
+        shard_totals = InventoryShard.objects.filter(config_type=models.OuterRef("pk")).values("config_type")
+        sold = shard_totals.annotate(total=models.Sum("capacity_sold")).values("total")
+        held = shard_totals.annotate(total=models.Sum("capacity_held")).values("total")
+        return self.annotate(
+            inventory_sold=models.F("capacity_sold") + Coalesce(models.Subquery(sold), 0),
+            inventory_held=models.F("capacity_held") + Coalesce(models.Subquery(held), 0),
+        )
+
+
 # Intermediario para configurar capacidades y precios por tipo por evento
 class TicketTypeEvent(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
@@ -183,6 +208,10 @@ class TicketTypeEvent(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Specfic price for this event.")
     maximun_capacity = models.PositiveIntegerField(help_text="Maximun capacity for this event.")
     capacity_sold = models.PositiveIntegerField(default=0, editable=False)  # Actualízalo en views
+    capacity_held = models.PositiveIntegerField(default=0, editable=False, help_text="Boletos retenidos por tickets pendientes de pago.")
+    counter_shards = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Contadores de inventario repartidos (0 = contador único en esta fila).")
+
+    objects = TicketTypeEventQuerySet.as_manager()
 
     class Meta:
         unique_together = ('event', 'ticket_type')  # Un tipo por evento
@@ -192,6 +221,55 @@ class TicketTypeEvent(models.Model):
     def __str__(self):
         return f"{self.ticket_type.ticket_name} para {self.event.event_name}"
 
+    @property
+    def is_sharded(self) -> bool:
+        return self.counter_shards > 1
+
+    def _inventory_totals(self) -> tuple[int, int]:
+        if hasattr(self, "inventory_sold"):
+            return self.inventory_sold, self.inventory_held
+        if not self.is_sharded:
+            return self.capacity_sold, self.capacity_held
+        totals = self.inventory_shards.aggregate(
+            sold=models.Sum("capacity_sold"),
+            held=models.Sum("capacity_held"),
+        )
+        return self.capacity_sold + (totals["sold"] or 0), self.capacity_held + (totals["held"] or 0)
+
+    @property
+    def total_sold(self) -> int:
+        return self._inventory_totals()[0]
+
+    @property
+    def total_held(self) -> int:
+        return self._inventory_totals()[1]
+
+    @property
+    def remaining_capacity(self) -> int:
+        """Aforo disponible descontando vendidos y retenciones vigentes."""
+        sold, held = self._inventory_totals()
+        return max(0, self.maximun_capacity - sold - held)
+
+
+class InventoryShard(models.Model):
+    """
+    Fragmento del contador de inventario de un TicketTypeEvent de alta demanda.
+    Reparte el aforo en varias filas para que las compras no compitan por el mismo bloqueo.
+    """
+    config_type = models.ForeignKey(TicketTypeEvent, on_delete=models.CASCADE, related_name="inventory_shards")
+    index = models.PositiveSmallIntegerField()
+    maximun_capacity = models.PositiveIntegerField(default=0, help_text="Aforo asignado a este fragmento.")
+    capacity_sold = models.PositiveIntegerField(default=0)
+    capacity_held = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("config_type", "index")
+        verbose_name = "Inventory shard"
+        db_table = "events_inventory_shard"
+
+    def __str__(self):
+        return f"Fragmento {self.index} de {self.config_type_id}"
+
 # Modelo para boletas individuales (reemplaza o suplementa inscritos)
 class Ticket(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="user_tickets")
@@ -205,68 +283,119 @@ class Ticket(models.Model):
     )
     # Campo para código QR o ID único si se integra con escaneo
     unique_code = models.CharField(max_length=100, unique=True, blank=True)
+    # Referencia de pago compartida por los tickets de una misma orden de carrito
+    payment_reference = models.CharField(max_length=64, blank=True, null=True, db_index=True, help_text="Referencia de pago de la orden (carrito) a la que pertenece el ticket.")
+    # Mientras no sea NULL, el amount del ticket está contado en config_type.capacity_held
+    hold_expires_at = models.DateTimeField(blank=True, null=True, help_text="Vencimiento de la retención de inventario del ticket pendiente.")
+    inventory_shard = models.PositiveSmallIntegerField(blank=True, null=True, help_text="Fragmento de inventario donde se contó el ticket (NULL: la fila de TicketTypeEvent).")
 
     class Meta:
         verbose_name = "ticket per user"
         verbose_name_plural = "Tickets per users"
         db_table = "events_ticket"
+        indexes = [
+            models.Index(fields=["status", "hold_expires_at"]),
+            models.Index(fields=["user", "config_type", "status"]),
+        ]
 
     def __str__(self):
         return f"Boleta {self.unique_code} para {self.event.event_name} ({self.config_type.ticket_type.ticket_name})"
 
+    # Campos que mueven contadores de aforo; se recuerdan al cargar el ticket
+    INVENTORY_FIELDS = ("status", "amount", "config_type_id", "hold_expires_at", "inventory_shard")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.INVENTORY_FIELDS
+        }
+        return instance
+
+    def _previous_values(self) -> "dict | None":
+        """Valores guardados en la base antes de este save, sin consultar si el ticket se cargó completo."""
+        if self._state.adding:
+            return None
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is not None and len(loaded) == len(self.INVENTORY_FIELDS):
+            return loaded
+        return Ticket.objects.filter(pk=self.pk).values(*self.INVENTORY_FIELDS).first()
+
     def save(self, *args, **kwargs):
-        previous: "Ticket | None" = None
-        if self.pk:
-            try:
-                previous = Ticket.objects.select_related("config_type").get(pk=self.pk)
-            except Ticket.DoesNotExist:
-                previous = None
-
-        super().save(*args, **kwargs)
-
-        if previous and previous.config_type_id != self.config_type_id:
-            if previous.status == "comprada":
-                previous.config_type.capacity_sold = max(0, previous.config_type.capacity_sold - previous.amount)
-                previous.config_type.save(update_fields=["capacity_sold"])
-            if self.status == "comprada":
-                self.config_type.refresh_from_db(fields=["capacity_sold", "maximun_capacity"])
-                self.config_type.capacity_sold = min(
-                    self.config_type.maximun_capacity,
-                    self.config_type.capacity_sold + self.amount,
+        count_inventory = kwargs.pop("count_inventory", True)
+        previous = self._previous_values()
+
+        config_changed = previous is not None and previous["config_type_id"] != self.config_type_id
+        if config_changed and self.inventory_shard is not None:
+            # El fragmento pertenece a la configuración anterior; el nuevo conteo va a la fila
+            self.inventory_shard = None
+            _add_update_field(kwargs, "inventory_shard")
+
+        releases_hold = bool(
+            previous
+            and previous["hold_expires_at"] is not None
+            and previous["status"] == "pendiente"
+            and (
+                self.status != "pendiente"
+                or previous["amount"] != self.amount
+                or config_changed
+            )
+        )
+        if releases_hold and self.status != "pendiente":
+            self.hold_expires_at = None
+            _add_update_field(kwargs, "hold_expires_at")
+
+        from .services import InventoryUnavailable, adjust_hold, adjust_sold, move_hold
+
+        was_sold = previous is not None and previous["status"] == "comprada"
+        is_sold = self.status == "comprada"
+        changed = previous is None or config_changed or previous["amount"] != self.amount
+        # Sigue pendiente con otra cantidad o configuración: la retención se mueve validando aforo
+        moves_hold = count_inventory and releases_hold and self.hold_expires_at is not None
+
+        with transaction.atomic():
+            if moves_hold:
+                acquired, shard = move_hold(
+                    previous["config_type_id"],
+                    previous["amount"],
+                    previous["inventory_shard"],
+                    self.config_type,
+                    self.amount,
                 )
-                self.config_type.save(update_fields=["capacity_sold"])
+                if not acquired:
+                    raise InventoryUnavailable(
+                        f"No hay suficiente aforo disponible para {self.config_type.ticket_type.ticket_name}."
+                    )
+                if shard != self.inventory_shard:
+                    self.inventory_shard = shard
+                    _add_update_field(kwargs, "inventory_shard")
+            super().save(*args, **kwargs)
+            if count_inventory:
+                # Primero se suma y luego se libera, para no abrir aforo de más entre UPDATEs
+                if is_sold and (not was_sold or changed):
+                    adjust_sold(self.config_type_id, self.amount, self.inventory_shard)
+                if releases_hold and not moves_hold:
+                    adjust_hold(previous["config_type_id"], -previous["amount"], previous["inventory_shard"])
+                if was_sold and (not is_sold or changed):
+                    adjust_sold(previous["config_type_id"], -previous["amount"], previous["inventory_shard"])
+
+        self._remember_values(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_values(fields)
+
+    def _remember_values(self, fields=None) -> None:
+        """Actualiza la foto de campos de aforo con lo que ya quedó en la base."""
+        if fields is None:
+            self._loaded_values = {name: getattr(self, name) for name in self.INVENTORY_FIELDS}
             return
-
-        if previous:
-            if previous.status == "comprada" and (
-                self.status != "comprada"
-                or previous.amount != self.amount
-            ):
-                previous.config_type.capacity_sold = max(
-                    0,
-                    previous.config_type.capacity_sold - previous.amount,
-                )
-                previous.config_type.save(update_fields=["capacity_sold"])
-
-            if self.status == "comprada" and (
-                previous.status != "comprada"
-                or previous.amount != self.amount
-            ):
-                self.config_type.refresh_from_db(fields=["capacity_sold", "maximun_capacity"])
-                self.config_type.capacity_sold = min(
-                    self.config_type.maximun_capacity,
-                    self.config_type.capacity_sold + self.amount,
-                )
-                self.config_type.save(update_fields=["capacity_sold"])
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is None:
             return
-
-        if self.status == "comprada":
-            self.config_type.refresh_from_db(fields=["capacity_sold", "maximun_capacity"])
-            self.config_type.capacity_sold = min(
-                self.config_type.maximun_capacity,
-                self.config_type.capacity_sold + self.amount,
-            )
-            self.config_type.save(update_fields=["capacity_sold"])
+        for name in self.INVENTORY_FIELDS:
+            if name in fields or name.removesuffix("_id") in fields:
+                loaded[name] = getattr(self, name)
 
     def get_qr_base64(self):
         """
@@ -291,4 +420,36 @@ class Ticket(models.Model):
         buffered = BytesIO()
         img.save(buffered, format="PNG")
         img_str = base64.b64encode(buffered.getvalue()).decode()
-        return img_str
\ No newline at end of file
+        return img_str
+
+
+class EventCancellationJob(models.Model):
+    """
+    Cancelación masiva de los tickets de un evento, procesada por lotes fuera de la petición.
+    Los contadores reflejan el progreso para que el administrador pueda consultarlo.
+    """
+
+    class Status(models.TextChoices):
+        PENDIENTE = "pendiente", "Pendiente"
+        EN_PROGRESO = "en_progreso", "En progreso"
+        COMPLETADO = "completado", "Completado"
+        FALLIDO = "fallido", "Fallido"
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="cancellation_jobs")
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDIENTE)
+    total_tickets = models.PositiveIntegerField(default=0, help_text="Tickets activos al iniciar la cancelación.")
+    processed_tickets = models.PositiveIntegerField(default=0)
+    refunds_marked = models.PositiveIntegerField(default=0, help_text="Transacciones aprobadas marcadas para reembolso.")
+    emails_queued = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "events_cancellation_job"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Cancelación de {self.event_id} ({self.status})"
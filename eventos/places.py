@@ -0,0 +1,135 @@
+"""
+eventos/places.py
+Índice en memoria para reconocer ciudades, departamentos y categorías en
+los mensajes del chatbot.
+
+Los nombres del fixture ``departamentos_ciudades.json`` se normalizan y se
+indexan una sola vez por proceso (``get_place_index``). Cada búsqueda da el
+mismo resultado que ``difflib.get_close_matches(palabra, nombres, n=1,
+cutoff=0.7)``, pero descarta candidatos por longitud y por conteo de
+caracteres antes de calcular el ``ratio`` completo, y memoriza el resultado
+por palabra.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "departamentos_ciudades.json")
+DEFAULT_CUTOFF = 0.7
+WORD_CACHE_SIZE = 4096
+
+# Categoría -> variantes con las que el usuario suele escribirla
+CATEGORY_VARIANTS = {
+    "musica": ["musica", "música"],
+    "deporte": ["deporte", "deportes"],
+    "educacion": ["educacion", "educación"],
+    "tecnologia": ["tecnologia", "tecnología"],
+    "arte": ["arte"],
+    "otros": ["otros"],
+}
+
+
+def normalizar(texto: str) -> str:
+    """Normaliza texto removiendo acentos y convirtiendo a minúsculas"""
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("utf-8").lower()
+
+
+class FuzzyNameIndex:
+    """
+    Nombres normalizados agrupados por longitud, con su conteo de caracteres
+    precalculado y el nombre original de cada uno.
+    """
+
+    def __init__(self, names: Iterable[str], cutoff: float = DEFAULT_CUTOFF):
+        self.cutoff = cutoff
+        self.canonical: Dict[str, str] = {}
+        for name in names:
+            self.canonical.setdefault(normalizar(name), name)
+        self._by_length: Dict[int, List[Tuple[str, Counter]]] = defaultdict(list)
+        for key in self.canonical:
+            self._by_length[len(key)].append((key, Counter(key)))
+        self._lengths = sorted(self._by_length)
+        self.match = lru_cache(maxsize=WORD_CACHE_SIZE)(self._match)
+
+    def __len__(self) -> int:
+        return len(self.canonical)
+
+    def _match(self, word: str) -> Optional[str]:
+        """Nombre normalizado más parecido a ``word`` con ratio >= cutoff, o None."""
+        if word in self.canonical:
+            return word
+        size = len(word)
+        if not size:
+            return None
+        counts = Counter(word)
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        best: Optional[Tuple[float, str]] = None
+        for length in self._lengths:
+            # Cota de real_quick_ratio: 2 * min(a, b) / (a + b)
+            if 2 * min(length, size) < self.cutoff * (length + size):
+                continue
+            for key, key_counts in self._by_length[length]:
+                # Cota de quick_ratio: caracteres en común sin importar el orden
+                common = sum((counts & key_counts).values())
+                if 2 * common < self.cutoff * (length + size):
+                    continue
+                matcher.set_seq1(key)
+                score = matcher.ratio()
+                if score >= self.cutoff and (best is None or (score, key) > best):
+                    best = (score, key)
+        return best[1] if best else None
+
+    def first_match(self, words: Iterable[str]) -> Optional[str]:
+        """Coincidencia de la primera palabra que se parezca a algún nombre."""
+        for word in words:
+            found = self.match(word)
+            if found:
+                return found
+        return None
+
+
+class PlaceIndex:
+    """Índices de ciudades, departamentos y categorías de un proceso."""
+
+    def __init__(self, cities: Iterable[str], departments: Iterable[str]):
+        self.cities = FuzzyNameIndex(cities)
+        self.departments = FuzzyNameIndex(departments)
+        self.categories = [(key, FuzzyNameIndex(variants)) for key, variants in CATEGORY_VARIANTS.items()]
+
+    def category(self, words: Iterable[str]) -> Optional[str]:
+        """Primera categoría reconocida, revisando las palabras en orden."""
+        for word in words:
+            for key, index in self.categories:
+                if index.match(word):
+                    return key
+        return None
+
+    @classmethod
+    def from_fixture(cls, path: str = FIXTURE_PATH) -> "PlaceIndex":
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error cargando fixture: {str(e)}")
+            data = []
+        return cls(
+            cities=[x["fields"]["name"] for x in data if x["model"].endswith("city")],
+            departments=[x["fields"]["name"] for x in data if x["model"].endswith("department")],
+        )
+
+
+@lru_cache(maxsize=None)
+def get_place_index() -> PlaceIndex:
+    """Índice compartido por el proceso; se construye en el primer uso."""
+    return PlaceIndex.from_fixture()
@@ -5,6 +5,7 @@ from decimal import Decimal
 from typing import Any, Dict, List, Optional
 import json
 
+from django.db import transaction
 from django.db.models import Sum
 from django.utils import timezone
 from rest_framework import serializers
@@ -16,8 +17,10 @@ from .models import (
     City,
     Department,
     Event,
+    EventCancellationJob,
     Ticket,
     TicketAccessLog,
+    TicketStatusChoices,
     TicketType,
     TicketTypeEvent,
 )
@@ -44,6 +47,8 @@ class TicketTypeEventSerializer(serializers.ModelSerializer):
     """Configuración específica de un tipo de ticket para un evento."""
 
     ticket_type = TicketTypeSerializer(read_only=True)
+    capacity_sold = serializers.IntegerField(source="total_sold", read_only=True)
+    capacity_held = serializers.IntegerField(source="total_held", read_only=True)
     remaining_capacity = serializers.SerializerMethodField()
 
     class Meta:
@@ -54,12 +59,13 @@ class TicketTypeEventSerializer(serializers.ModelSerializer):
             "price",
             "maximun_capacity",
             "capacity_sold",
+            "capacity_held",
             "remaining_capacity",
         ]
-        read_only_fields = ["id", "capacity_sold", "remaining_capacity"]
+        read_only_fields = ["id", "capacity_sold", "capacity_held", "remaining_capacity"]
 
     def get_remaining_capacity(self, obj: TicketTypeEvent) -> int:
-        return max(0, obj.maximun_capacity - obj.capacity_sold)
+        return obj.remaining_capacity
 
 
 class TicketSerializer(serializers.ModelSerializer):
@@ -80,7 +86,7 @@ class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = "__all__"
-        read_only_fields = ["id", "date_of_purchase", "event", "unique_code", "qr_base64"]
+        read_only_fields = ["id", "date_of_purchase", "event", "unique_code", "qr_base64", "hold_expires_at", "inventory_shard", "payment_reference"]
 
     def get_qr_base64(self, obj) -> Optional[str]:
         if hasattr(obj, "get_qr_base64"):
@@ -97,19 +103,34 @@ class TicketSerializer(serializers.ModelSerializer):
         if config_type is None:
             raise serializers.ValidationError("Config type debe estar presente en el contexto.")
 
-        if config_type.capacity_sold + validated_data.get("amount", 0) > config_type.maximun_capacity:
-            raise serializers.ValidationError("No hay suficiente aforo disponible para este tipo de ticket.")
+        from .services import acquire_inventory, hold_expiry
+
+        amount = validated_data.get("amount", 1)
+        is_pending = validated_data.get("status", TicketStatusChoices.PENDIENTE) == TicketStatusChoices.PENDIENTE
 
         if "unique_code" not in validated_data:
             import uuid
 
             validated_data["unique_code"] = str(uuid.uuid4())
 
-        ticket = Ticket.objects.create(
-            **validated_data,
-            event=config_type.event,
-            config_type=config_type,
-        )
+        with transaction.atomic():
+            # El aforo se toma con un UPDATE condicional para no sobrevender
+            acquired, shard = acquire_inventory(
+                config_type,
+                amount,
+                "capacity_held" if is_pending else "capacity_sold",
+            )
+            if not acquired:
+                raise serializers.ValidationError("No hay suficiente aforo disponible para este tipo de ticket.")
+            if is_pending:
+                validated_data["hold_expires_at"] = hold_expiry()
+            ticket = Ticket(
+                **validated_data,
+                event=config_type.event,
+                config_type=config_type,
+                inventory_shard=shard,
+            )
+            ticket.save(force_insert=True, count_inventory=False)
         return ticket
 
 
@@ -214,6 +235,8 @@ class EventSerializer(serializers.ModelSerializer):
             "min_age",
             "max_capacity",
             "sales_open_datetime",
+            "waiting_room_enabled",
+            "waiting_room_rate_per_minute",
             "tickets",
             "types_of_tickets_available",
             "maximun_capacity_remaining",
@@ -276,7 +299,8 @@ class EventSerializer(serializers.ModelSerializer):
         return data
     def get_types_of_tickets_available(self, obj: Event) -> List[Dict[str, Any]]:
         types = (
-            TicketTypeEvent.objects.select_related("ticket_type")
+            TicketTypeEvent.objects.with_inventory()
+            .select_related("ticket_type")
             .filter(event=obj)
             .order_by("ticket_type__ticket_name")
         )
@@ -284,12 +308,12 @@ class EventSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_maximun_capacity_remaining(self, obj: Event) -> int:
-        total_capacity = (
-            TicketTypeEvent.objects.filter(event=obj).aggregate(total=Sum("maximun_capacity"))["total"]
-            or 0
+        totals = TicketTypeEvent.objects.with_inventory().filter(event=obj).aggregate(
+            capacity=Sum("maximun_capacity"),
+            sold=Sum("inventory_sold"),
+            held=Sum("inventory_held"),
         )
-        sold = Ticket.objects.filter(event=obj).aggregate(total=Sum("amount"))["total"] or 0
-        return max(0, total_capacity - sold)
+        return max(0, (totals["capacity"] or 0) - (totals["sold"] or 0) - (totals["held"] or 0))
 
 
     def create(self, validated_data: Dict[str, Any]) -> Event:
@@ -385,6 +409,38 @@ class AttendeeTicketSerializer(serializers.Serializer):
     price_paid = serializers.DecimalField(max_digits=10, decimal_places=2)
 
 
+class AttendeeUserSerializer(serializers.ModelSerializer):
+    """Datos del asistente; requiere select_related de documento, departamento y ciudad y prefetch de grupos."""
+    document_type = serializers.StringRelatedField()
+    department_name = serializers.CharField(source="department.name", default=None)
+    city_name = serializers.CharField(source="city.name", default=None)
+    role = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CustomUser
+        fields = [
+            "id", "email", "first_name", "last_name", "phone", "document_type", "document",
+            "birth_date", "country", "department_name", "city_name", "city_text", "department_text", "role",
+        ]
+        read_only_fields = fields
+
+    def get_role(self, obj) -> List[str]:
+        return [group.name for group in obj.groups.all()]
+
+
+class AttendeeListSerializer(serializers.ModelSerializer):
+    """Serializador de un ticket en la lista paginada de asistentes (EventAttendeeListAPIView)."""
+    ticket_id = serializers.IntegerField(source="id")
+    user = AttendeeUserSerializer()
+    ticket_type = serializers.CharField(source="config_type.ticket_type.ticket_name")
+    price_paid = serializers.DecimalField(source="config_type.price", max_digits=10, decimal_places=2)
+
+    class Meta:
+        model = Ticket
+        fields = ["ticket_id", "user", "ticket_type", "amount", "status", "unique_code", "date_of_purchase", "price_paid"]
+        read_only_fields = fields
+
+
 class MyTicketDetailSerializer(serializers.Serializer):
     """Serializador para un ticket en la lista de 'mis eventos' (MyEventsAPIView)."""
     ticket_id = serializers.IntegerField()
@@ -433,6 +489,16 @@ class PayUPaymentDataSerializer(serializers.Serializer):
     responseUrl = serializers.URLField()
 
 
+class QueueStatusSerializer(serializers.Serializer):
+    """Serializador para la respuesta de la sala de espera (WaitingRoomAPIView)."""
+    queue_token = serializers.CharField(required=False)
+    position = serializers.IntegerField()
+    ahead = serializers.IntegerField()
+    admitted = serializers.BooleanField()
+    admission_token = serializers.CharField(allow_null=True)
+    estimated_wait_seconds = serializers.IntegerField()
+
+
 class BuyTicketResponseSerializer(serializers.Serializer):
     """Serializador para la *respuesta* de BuyTicketAPIView."""
     message = serializers.CharField()
@@ -440,6 +506,64 @@ class BuyTicketResponseSerializer(serializers.Serializer):
     config_type_id = serializers.IntegerField()
     amount = serializers.IntegerField()
     total_a_pagar = serializers.CharField()
+    hold_expires_at = serializers.DateTimeField(allow_null=True)
     payment = PayUPaymentDataSerializer()
 
+
+
+class CheckoutItemSerializer(serializers.Serializer):
+    """Línea del carrito: una configuración y su cantidad."""
+    config_type_id = serializers.IntegerField(help_text="ID de la configuración (TicketTypeEvent) a comprar.")
+    amount = serializers.IntegerField(min_value=1, default=1, help_text="Cantidad de boletos de esta configuración.")
+
+
+class CheckoutRequestSerializer(serializers.Serializer):
+    """Serializador para el *request* de CheckoutAPIView."""
+    items = CheckoutItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        # Agrupa líneas repetidas de la misma configuración
+        lines = {}
+        for item in items:
+            lines[item["config_type_id"]] = lines.get(item["config_type_id"], 0) + item["amount"]
+        return lines
+
+
+class CheckoutTicketSerializer(serializers.Serializer):
+    """Ticket creado dentro de una orden de carrito."""
+    ticket_id = serializers.IntegerField(source="id")
+    config_type_id = serializers.IntegerField()
+    amount = serializers.IntegerField()
+    status = serializers.CharField()
+    unique_code = serializers.CharField()
+
+
+class CheckoutResponseSerializer(serializers.Serializer):
+    """Serializador para la *respuesta* de CheckoutAPIView."""
+    message = serializers.CharField()
+    payment_reference = serializers.CharField(allow_null=True)
+    tickets = CheckoutTicketSerializer(many=True)
+    total_a_pagar = serializers.CharField()
+    hold_expires_at = serializers.DateTimeField(allow_null=True)
+    payment = PayUPaymentDataSerializer(allow_null=True)
+
+
+class EventCancellationJobSerializer(serializers.ModelSerializer):
+    """Progreso de la cancelación masiva de un evento."""
+    class Meta:
+        model = EventCancellationJob
+        fields = [
+            "id", "status", "total_tickets", "processed_tickets", "refunds_marked",
+            "emails_queued", "error", "created_at", "started_at", "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class EventCancelResponseSerializer(serializers.Serializer):
+    """Serializador para la *respuesta* de la acción cancelar."""
+    id = serializers.IntegerField()
+    status = serializers.CharField()
+    message = serializers.CharField()
+    job = EventCancellationJobSerializer()
+
 # --- FIN DE NUEVOS SERIALIZERS ---
\ No newline at end of file
@@ -0,0 +1,440 @@
+"""Servicios de inventario: retenciones de tickets pendientes y contadores fragmentados."""
+
+from __future__ import annotations
+
+import logging
+import random
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import InventoryShard, Ticket, TicketStatusChoices, TicketTypeEvent
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_HOLD_MINUTES = 15
+DEFAULT_SWEEP_BATCH_SIZE = 500
+
+
+class InventoryUnavailable(Exception):
+    """No hay aforo suficiente para una línea de la compra."""
+
+
+def hold_expiry(now: Optional[datetime] = None) -> datetime:
+    """Calcula el vencimiento de una retención a partir de TICKET_HOLD_MINUTES."""
+    minutes = getattr(settings, "TICKET_HOLD_MINUTES", DEFAULT_HOLD_MINUTES)
+    return (now or timezone.now()) + timedelta(minutes=minutes)
+
+
+def _counter(config_type_id: int, shard: Optional[int] = None):
+    """Fila que guarda el contador: la configuración o uno de sus fragmentos."""
+    if shard is None:
+        return TicketTypeEvent.objects.filter(pk=config_type_id)
+    return InventoryShard.objects.filter(config_type_id=config_type_id, index=shard)
+
+
+def _try_acquire(counter, amount: int, field: str) -> bool:
+    """UPDATE condicional: solo suma ``amount`` a ``field`` si queda aforo."""
+    updated = counter.filter(
+        maximun_capacity__gte=F("capacity_sold") + F("capacity_held") + amount,
+    ).update(**{field: F(field) + amount})
+    return bool(updated)
+
+
+def acquire_inventory(
+    config_type: TicketTypeEvent,
+    amount: int,
+    field: str = "capacity_held",
+) -> Tuple[bool, Optional[int]]:
+    """
+    Reserva ``amount`` boletos sin sobrevender. Devuelve si se logró y el
+    fragmento donde quedó contado (None cuando se usó la fila de la configuración).
+    """
+    if not config_type.is_sharded:
+        return _try_acquire(_counter(config_type.id), amount, field), None
+
+    first = random.randrange(config_type.counter_shards)
+    if _try_acquire(_counter(config_type.id, first), amount, field):
+        return True, first
+
+    candidates = list(
+        InventoryShard.objects.filter(config_type_id=config_type.id)
+        .exclude(index=first)
+        .annotate(free=F("maximun_capacity") - F("capacity_sold") - F("capacity_held"))
+        .filter(free__gte=amount)
+        .values_list("index", flat=True)
+    )
+    random.shuffle(candidates)
+    for index in candidates:
+        if _try_acquire(_counter(config_type.id, index), amount, field):
+            return True, index
+
+    index = rebalance_shards(config_type, amount)
+    if index is None:
+        return False, None
+    return _try_acquire(_counter(config_type.id, index), amount, field), index
+
+
+def rebalance_shards(config_type: TicketTypeEvent, amount: int) -> Optional[int]:
+    """
+    Mueve aforo libre entre fragmentos hasta que uno pueda atender ``amount``.
+    Devuelve el índice del fragmento preparado o None si el total libre no alcanza.
+    """
+    with transaction.atomic():
+        shards = list(
+            InventoryShard.objects.select_for_update()
+            .filter(config_type_id=config_type.id)
+            .order_by("index")
+        )
+        free = {shard.index: shard.maximun_capacity - shard.capacity_sold - shard.capacity_held for shard in shards}
+        if sum(free.values()) < amount:
+            return None
+
+        target = max(shards, key=lambda shard: free[shard.index])
+        missing = amount - free[target.index]
+        changed = [target]
+        for shard in shards:
+            if missing <= 0:
+                break
+            if shard is target or free[shard.index] <= 0:
+                continue
+            moved = min(free[shard.index], missing)
+            shard.maximun_capacity -= moved
+            target.maximun_capacity += moved
+            missing -= moved
+            changed.append(shard)
+        InventoryShard.objects.bulk_update(changed, ["maximun_capacity"])
+    logger.info("Fragmentos de inventario rebalanceados para la configuración %s", config_type.id)
+    return target.index
+
+
+def adjust_hold(config_type_id: int, delta: int, shard: Optional[int] = None) -> None:
+    """Suma (o resta) ``delta`` a capacity_held sin bajar de cero ni validar aforo."""
+    if not delta:
+        return
+    _counter(config_type_id, shard).update(capacity_held=Greatest(F("capacity_held") + delta, 0))
+
+
+def move_hold(
+    from_config_type_id: int,
+    from_amount: int,
+    from_shard: Optional[int],
+    config_type: TicketTypeEvent,
+    amount: int,
+) -> Tuple[bool, Optional[int]]:
+    """
+    Cambia la cantidad o la configuración de una retención. Las reducciones se
+    restan sin más; los aumentos pasan por el UPDATE condicional y la retención
+    anterior solo se suelta si la nueva se logró. Devuelve si se logró y el fragmento.
+    """
+    if config_type.id == from_config_type_id:
+        delta = amount - from_amount
+        if delta <= 0:
+            adjust_hold(config_type.id, delta, from_shard)
+            return True, from_shard
+        if _try_acquire(_counter(config_type.id, from_shard), delta, "capacity_held"):
+            return True, from_shard
+        if not config_type.is_sharded:
+            return False, None
+    acquired, shard = acquire_inventory(config_type, amount)
+    if not acquired:
+        return False, None
+    adjust_hold(from_config_type_id, -from_amount, from_shard)
+    return True, shard
+
+
+def adjust_sold(config_type_id: int, delta: int, shard: Optional[int] = None) -> None:
+    """Suma (o resta) ``delta`` a capacity_sold acotado entre cero y el aforo del contador."""
+    if not delta:
+        return
+    _counter(config_type_id, shard).update(
+        capacity_sold=Greatest(Least(F("capacity_sold") + delta, F("maximun_capacity")), 0)
+    )
+
+
+def enable_sharding(config_type: TicketTypeEvent, shards: int) -> None:
+    """
+    Reparte el aforo libre de la configuración en ``shards`` contadores.
+    Lo ya vendido o retenido sigue contado en la fila; las lecturas suman ambos.
+    """
+    if shards < 2:
+        raise ValueError("Se necesitan al menos 2 fragmentos.")
+    with transaction.atomic():
+        disable_sharding(config_type)
+        locked = TicketTypeEvent.objects.select_for_update().get(pk=config_type.pk)
+        free = max(0, locked.maximun_capacity - locked.capacity_sold - locked.capacity_held)
+        base, extra = divmod(free, shards)
+        InventoryShard.objects.bulk_create(
+            [
+                InventoryShard(
+                    config_type=locked,
+                    index=index,
+                    maximun_capacity=base + (1 if index < extra else 0),
+                )
+                for index in range(shards)
+            ]
+        )
+        TicketTypeEvent.objects.filter(pk=locked.pk).update(counter_shards=shards)
+    config_type.counter_shards = shards
+
+
+def disable_sharding(config_type: TicketTypeEvent) -> None:
+    """Devuelve los contadores de los fragmentos a la fila y elimina los fragmentos."""
+    with transaction.atomic():
+        locked = TicketTypeEvent.objects.select_for_update().get(pk=config_type.pk)
+        totals = InventoryShard.objects.filter(config_type=locked).aggregate(
+            sold=Sum("capacity_sold"),
+            held=Sum("capacity_held"),
+        )
+        TicketTypeEvent.objects.filter(pk=locked.pk).update(
+            capacity_sold=F("capacity_sold") + (totals["sold"] or 0),
+            capacity_held=F("capacity_held") + (totals["held"] or 0),
+            counter_shards=0,
+        )
+        Ticket.objects.filter(config_type=locked, inventory_shard__isnull=False).update(inventory_shard=None)
+        InventoryShard.objects.filter(config_type=locked).delete()
+    config_type.counter_shards = 0
+
+
+def find_pending_ticket(user, config_type: TicketTypeEvent) -> Optional[Ticket]:
+    """
+    Devuelve el ticket pendiente más reciente del usuario para la configuración.
+    Los tickets de una orden de carrito se pagan con la referencia de la orden y no se reutilizan.
+    """
+    return (
+        Ticket.objects.filter(
+            user=user,
+            config_type=config_type,
+            status=TicketStatusChoices.PENDIENTE,
+            payment_reference__isnull=True,
+        )
+        .order_by("-id")
+        .first()
+    )
+
+
+def renew_pending_ticket(ticket: Ticket, config_type: TicketTypeEvent, amount: int) -> bool:
+    """
+    Reutiliza un ticket pendiente: ajusta su cantidad y renueva la retención.
+    Devuelve False si el ticket ya no está pendiente o no hay aforo para el aumento.
+    """
+    with transaction.atomic():
+        locked = (
+            Ticket.objects.select_for_update()
+            .filter(pk=ticket.pk, status=TicketStatusChoices.PENDIENTE, payment_reference__isnull=True)
+            .values("amount", "hold_expires_at", "inventory_shard")
+            .first()
+        )
+        if locked is None:
+            return False
+        # Una retención vencida sigue contada hasta que el barrido la libere.
+        held = locked["amount"] if locked["hold_expires_at"] is not None else 0
+        shard = locked["inventory_shard"]
+        delta = amount - held
+        if delta > 0 and not _try_acquire(_counter(config_type.id, shard), delta, "capacity_held"):
+            # El contador actual no alcanza: se retiene todo en otro fragmento y se suelta el anterior
+            acquired, new_shard = acquire_inventory(config_type, amount) if config_type.is_sharded else (False, None)
+            if not acquired:
+                return False
+            adjust_hold(config_type.id, -held, shard)
+            shard = new_shard
+        elif delta < 0:
+            adjust_hold(config_type.id, delta, shard)
+        expires_at = hold_expiry()
+        Ticket.objects.filter(pk=ticket.pk).update(amount=amount, hold_expires_at=expires_at, inventory_shard=shard)
+
+    ticket.amount = amount
+    ticket.hold_expires_at = expires_at
+    ticket.inventory_shard = shard
+    return True
+
+
+def _subtract_counters(per_counter: Dict[Tuple[int, Optional[int]], int], field: str) -> None:
+    """Resta de ``field`` por contador con un UPDATE para filas y otro para fragmentos."""
+    rows = {config_type_id: total for (config_type_id, shard), total in per_counter.items() if shard is None}
+    shards = {key: total for key, total in per_counter.items() if key[1] is not None}
+    if rows:
+        TicketTypeEvent.objects.filter(id__in=rows).update(
+            **{
+                field: Case(
+                    *[
+                        When(id=config_type_id, then=Greatest(F(field) - total, 0))
+                        for config_type_id, total in rows.items()
+                    ],
+                    output_field=IntegerField(),
+                )
+            }
+        )
+    if shards:
+        shard_filter = Q()
+        whens = []
+        for (config_type_id, index), total in shards.items():
+            shard_filter |= Q(config_type_id=config_type_id, index=index)
+            whens.append(
+                When(config_type_id=config_type_id, index=index, then=Greatest(F(field) - total, 0))
+            )
+        InventoryShard.objects.filter(shard_filter).update(**{field: Case(*whens, output_field=IntegerField())})
+
+
+def _release_held(per_counter: Dict[Tuple[int, Optional[int]], int]) -> None:
+    """Resta retenciones por contador."""
+    _subtract_counters(per_counter, "capacity_held")
+
+
+def _release_sold(per_counter: Dict[Tuple[int, Optional[int]], int]) -> None:
+    """Resta boletos vendidos por contador."""
+    _subtract_counters(per_counter, "capacity_sold")
+
+
+def reserve_cart(user, event, lines: Dict[int, int]) -> Tuple[Optional[str], List[Ticket]]:
+    """
+    Reserva varias configuraciones de un evento en una sola transacción.
+
+    Las filas no fragmentadas se bloquean juntas y se actualizan con un único
+    UPDATE; los tickets se insertan con ``bulk_create`` y los pagos comparten
+    una referencia. Devuelve la referencia (None si todo es gratuito) y los tickets.
+    Lanza ``InventoryUnavailable`` si alguna línea no cabe; no queda nada reservado.
+    """
+    config_types = {
+        config_type.id: config_type
+        for config_type in TicketTypeEvent.objects.filter(event=event, id__in=lines).select_related("ticket_type")
+    }
+    missing = set(lines) - set(config_types)
+    if missing:
+        raise InventoryUnavailable(f"Configuraciones inexistentes para este evento: {sorted(missing)}.")
+
+    payment_reference = None
+    if any(config_types[config_type_id].price != 0 for config_type_id in lines):
+        payment_reference = str(uuid.uuid4())
+
+    with transaction.atomic():
+        plain_ids = [config_type_id for config_type_id in lines if not config_types[config_type_id].is_sharded]
+        locked = {
+            row["id"]: row
+            for row in TicketTypeEvent.objects.select_for_update()
+            .filter(id__in=plain_ids)
+            .order_by("id")
+            .values("id", "maximun_capacity", "capacity_sold", "capacity_held")
+        }
+
+        held: Dict[int, int] = {}
+        sold: Dict[int, int] = {}
+        shards: Dict[int, Optional[int]] = {}
+        for config_type_id, amount in lines.items():
+            config_type = config_types[config_type_id]
+            field = "capacity_held" if config_type.price != 0 else "capacity_sold"
+            if config_type.is_sharded:
+                acquired, shards[config_type_id] = acquire_inventory(config_type, amount, field)
+            else:
+                row = locked[config_type_id]
+                acquired = row["maximun_capacity"] - row["capacity_sold"] - row["capacity_held"] >= amount
+                (held if field == "capacity_held" else sold)[config_type_id] = amount
+            if not acquired:
+                raise InventoryUnavailable(
+                    f"No hay suficiente aforo disponible para {config_type.ticket_type.ticket_name}."
+                )
+
+        if held or sold:
+            TicketTypeEvent.objects.filter(id__in=[*held, *sold]).update(
+                capacity_held=Case(
+                    *[When(id=config_type_id, then=F("capacity_held") + amount) for config_type_id, amount in held.items()],
+                    default=F("capacity_held"),
+                    output_field=IntegerField(),
+                ),
+                capacity_sold=Case(
+                    *[When(id=config_type_id, then=F("capacity_sold") + amount) for config_type_id, amount in sold.items()],
+                    default=F("capacity_sold"),
+                    output_field=IntegerField(),
+                ),
+            )
+
+        expires_at = hold_expiry()
+        tickets = Ticket.objects.bulk_create(
+            [
+                Ticket(
+                    user=user,
+                    event=event,
+                    config_type=config_types[config_type_id],
+                    amount=amount,
+                    status=TicketStatusChoices.PENDIENTE if config_types[config_type_id].price != 0 else TicketStatusChoices.COMPRADA,
+                    unique_code=str(uuid.uuid4()),
+                    payment_reference=payment_reference if config_types[config_type_id].price != 0 else None,
+                    hold_expires_at=expires_at if config_types[config_type_id].price != 0 else None,
+                    inventory_shard=shards.get(config_type_id),
+                )
+                for config_type_id, amount in lines.items()
+            ]
+        )
+    return payment_reference, tickets
+
+
+def release_expired_holds(
+    *,
+    now: Optional[datetime] = None,
+    stale_after: Optional[timedelta] = None,
+    batch_size: int = DEFAULT_SWEEP_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Cancela en lotes los tickets pendientes con retención vencida y libera su aforo.
+
+    Cada lote usa un UPDATE para los tickets, uno para las configuraciones
+    afectadas y uno para marcar como ``expirada`` la transacción iniciada
+    (la del ticket o la de su orden de carrito).
+    Si se indica ``stale_after`` también se cancelan los pendientes sin
+    retención (creados antes de existir las retenciones) más antiguos que ese plazo.
+    """
+    from payments.models import PaymentTransaction
+
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Ticket.objects.select_for_update(skip_locked=True)
+                .filter(status=TicketStatusChoices.PENDIENTE, hold_expires_at__lt=now)
+                .order_by("id")
+                .values_list("id", "config_type_id", "inventory_shard", "amount", "unique_code", "payment_reference")[
+                    :batch_size
+                ]
+            )
+            if not rows:
+                break
+
+            per_counter: Dict[Tuple[int, Optional[int]], int] = defaultdict(int)
+            for _, config_type_id, shard, amount, _, _ in rows:
+                per_counter[(config_type_id, shard)] += amount
+
+            Ticket.objects.filter(id__in=[row[0] for row in rows]).update(
+                status=TicketStatusChoices.CANCELADA,
+                hold_expires_at=None,
+            )
+            _release_held(per_counter)
+            # Los tickets sueltos se pagan con su unique_code y los de carrito con la referencia de la orden
+            references = {row[5] or row[4] for row in rows}
+            PaymentTransaction.objects.filter(
+                reference_code__in=references,
+                status="iniciada",
+            ).update(status="expirada", updated_at=now)
+        released += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    stale = 0
+    if stale_after is not None:
+        stale = Ticket.objects.filter(
+            status=TicketStatusChoices.PENDIENTE,
+            hold_expires_at__isnull=True,
+            date_of_purchase__lt=now - stale_after,
+        ).update(status=TicketStatusChoices.CANCELADA)
+
+    if released or stale:
+        logger.info("Barrido de retenciones: %s liberadas, %s pendientes antiguos cancelados", released, stale)
+    return {"released": released, "stale": stale}
@@ -1,26 +1,32 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from .models import Event, EventChangeLog
-from django.contrib.auth import get_user_model
+from .waiting_room import invalidate_room_settings
+from usuarios.audit import collect_changes, remember_values, write_change_logs
 
 @receiver(pre_save, sender=Event)
-def log_event_changes(sender, instance, **kwargs):
-    if not instance.pk:
-        return  # Solo para actualizaciones, no creación
-    try:
-        old_event = Event.objects.get(pk=instance.pk)
-    except Event.DoesNotExist:
-        return
-    fields_to_track = ["event_name", "description", "date", "start_datetime", "end_datetime", "status", "category", "image", "organizer"]
-    for field in fields_to_track:
-        old_value = getattr(old_event, field, None)
-        new_value = getattr(instance, field, None)
-        if old_value != new_value:
-            EventChangeLog.objects.create(
-                event=instance,
-                changed_by=getattr(instance, '_changed_by', None),
-                change_type="datos evento" if field not in ["status"] else "estado",
-                field_changed=field,
-                old_value=str(old_value),
-                new_value=str(new_value)
-            )
+def log_event_changes(sender, instance, update_fields=None, **kwargs):
+    # Solo para actualizaciones; compara contra los valores cargados del evento
+    instance._audit_changes = collect_changes(instance, update_fields)
+
+@receiver(post_save, sender=Event)
+def write_event_change_logs(sender, instance, update_fields=None, **kwargs):
+    changes = getattr(instance, '_audit_changes', None) or []
+    instance._audit_changes = None
+    changed_by = getattr(instance, '_changed_by', None)
+    write_change_logs(EventChangeLog, [
+        EventChangeLog(
+            event=instance,
+            changed_by=changed_by,
+            change_type="datos evento" if field not in ["status"] else "estado",
+            field_changed=field,
+            old_value=str(old_value),
+            new_value=str(new_value)
+        )
+        for field, old_value, new_value in changes
+    ])
+    remember_values(instance, update_fields)
+
+@receiver(post_save, sender=Event)
+def refresh_waiting_room_settings(sender, instance, **kwargs):
+    invalidate_room_settings(instance.pk)
@@ -1,3 +1,785 @@
-from django.test import TestCase
+import csv
+import json
+import uuid
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from difflib import get_close_matches
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.utils import timezone
+
+from payments.models import PaymentLedgerEntry, PaymentTransaction
+from usuarios.models import CustomUser, EmailOutbox
+
+from .ai_cache import answer_cache
+from .cancellation import _cancel_batch, _close_payments, process_cancellation_job, start_event_cancellation
+from .management.commands.loadtest_purchases import Command as LoadTestCommand, check_database
+from .models import (
+    Event,
+    EventCancellationJob,
+    EventChangeLog,
+    InventoryShard,
+    Ticket,
+    TicketStatusChoices,
+    TicketType,
+    TicketTypeEvent,
+)
+from .places import FuzzyNameIndex, PlaceIndex, get_place_index, normalizar
+from .services import (
+    InventoryUnavailable,
+    acquire_inventory,
+    disable_sharding,
+    enable_sharding,
+    hold_expiry,
+    rebalance_shards,
+    release_expired_holds,
+    reserve_cart,
+)
+from .views.ia_assistant import UpstreamBusy
+
+
+def admin_client():
+    admin = CustomUser.objects.create_user(
+        username="admin", email="admin@example.com", password="x", first_name="A", last_name="D"
+    )
+    admin.groups.add(Group.objects.get_or_create(name="Administrador")[0])
+    client = APIClient()
+    client.force_authenticate(admin)
+    return client
+
+
+class InventoryTestMixin:
+    """Evento con una configuración de aforo 5 y un comprador."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="comprador", email="comprador@example.com", password="x", first_name="C", last_name="P"
+        )
+        self.event = Event.objects.create(event_name="Concierto", description="d", status="activo")
+        self.config_type = TicketTypeEvent.objects.create(
+            event=self.event,
+            ticket_type=TicketType.objects.create(ticket_name="General"),
+            price=Decimal("50000"),
+            maximun_capacity=5,
+        )
+
+    def hold(self, amount):
+        acquired, shard = acquire_inventory(self.config_type, amount)
+        self.assertTrue(acquired)
+        return Ticket.objects.create(
+            user=self.user,
+            event=self.event,
+            config_type=self.config_type,
+            amount=amount,
+            unique_code=str(uuid.uuid4()),
+            hold_expires_at=hold_expiry(),
+            inventory_shard=shard,
+        )
+
+    def counters(self):
+        return TicketTypeEvent.objects.values("capacity_sold", "capacity_held").get(pk=self.config_type.pk)
+
+    def expire(self, *tickets):
+        Ticket.objects.filter(pk__in=[ticket.pk for ticket in tickets]).update(
+            hold_expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+
+class HoldTests(InventoryTestMixin, TestCase):
+    def test_acquire_stops_at_capacity(self):
+        self.hold(4)
+
+        acquired, _shard = acquire_inventory(self.config_type, 2)
+
+        self.assertFalse(acquired)
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 4})
+
+    def test_purchase_moves_the_hold_to_sold(self):
+        ticket = self.hold(3)
+
+        ticket.status = TicketStatusChoices.COMPRADA
+        ticket.save()
+
+        self.assertEqual(self.counters(), {"capacity_sold": 3, "capacity_held": 0})
+
+    def test_amount_decrease_releases_part_of_the_hold(self):
+        ticket = self.hold(3)
+
+        ticket.amount = 1
+        ticket.save()
+
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 1})
+
+    def test_amount_increase_within_capacity_extends_the_hold(self):
+        ticket = self.hold(2)
+
+        ticket.amount = 5
+        ticket.save()
+
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 5})
+
+    def test_amount_increase_beyond_capacity_is_rejected(self):
+        ticket = self.hold(2)
+        self.hold(2)
+
+        ticket.amount = 4
+        with self.assertRaises(InventoryUnavailable):
+            ticket.save()
+
+        self.assertEqual(Ticket.objects.get(pk=ticket.pk).amount, 2)
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 4})
+
+    def test_sweeper_releases_expired_holds_and_expires_their_payment(self):
+        ticket = self.hold(2)
+        kept = self.hold(1)
+        payment = PaymentTransaction.objects.create(
+            reference_code=ticket.unique_code, status="iniciada", amount=Decimal("100000"), ticket=ticket
+        )
+        self.expire(ticket)
+
+        result = release_expired_holds()
+
+        self.assertEqual(result, {"released": 1, "stale": 0})
+        ticket.refresh_from_db()
+        kept.refresh_from_db()
+        payment.refresh_from_db()
+        self.assertEqual(ticket.status, TicketStatusChoices.CANCELADA)
+        self.assertEqual(kept.status, TicketStatusChoices.PENDIENTE)
+        self.assertEqual(payment.status, "expirada")
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 1})
+
+    def test_sweeper_expires_the_payment_of_a_cart_order(self):
+        reference, tickets = reserve_cart(self.user, self.event, {self.config_type.id: 3})
+        payment = PaymentTransaction.objects.create(
+            reference_code=reference, status="iniciada", amount=Decimal("150000"), ticket=tickets[0]
+        )
+        self.expire(*tickets)
+
+        release_expired_holds()
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "expirada")
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 0})
+
+    def test_sweeper_command_works_in_batches_and_cancels_stale_pending_tickets(self):
+        expired = [self.hold(1) for _ in range(3)]
+        self.expire(*expired)
+        stale = Ticket.objects.create(
+            user=self.user, event=self.event, config_type=self.config_type, amount=1, unique_code=str(uuid.uuid4())
+        )
+        Ticket.objects.filter(pk=stale.pk).update(date_of_purchase=timezone.now() - timedelta(hours=2))
+        out = StringIO()
+
+        call_command("release_expired_holds", batch_size=1, stale_hours=1, stdout=out)
+
+        self.assertIn("Retenciones liberadas: 3. Pendientes antiguos cancelados: 1.", out.getvalue())
+        self.assertFalse(Ticket.objects.filter(status=TicketStatusChoices.PENDIENTE).exists())
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 0})
+
+    def test_sweeper_keeps_holds_that_have_not_expired(self):
+        ticket = self.hold(2)
+
+        result = release_expired_holds(now=ticket.hold_expires_at - timedelta(seconds=1))
+
+        self.assertEqual(result, {"released": 0, "stale": 0})
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 2})
+
+    def test_cart_is_all_or_nothing(self):
+        self.hold(4)
+
+        with self.assertRaises(InventoryUnavailable):
+            reserve_cart(self.user, self.event, {self.config_type.id: 2})
+
+        self.assertEqual(Ticket.objects.count(), 1)
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 4})
+
+
+class TicketSnapshotTests(InventoryTestMixin, TestCase):
+    def ticket_selects(self, captured):
+        return [query["sql"] for query in captured if query["sql"].startswith('SELECT "events_ticket"')]
+
+    def test_loaded_ticket_saves_without_reading_itself_again(self):
+        ticket = Ticket.objects.get(pk=self.hold(2).pk)
+        ticket.status = TicketStatusChoices.COMPRADA
+
+        with CaptureQueriesContext(connection) as captured:
+            ticket.save()
+
+        self.assertEqual(self.ticket_selects(captured), [])
+        self.assertEqual(self.counters(), {"capacity_sold": 2, "capacity_held": 0})
+
+    def test_saving_twice_counts_the_purchase_once(self):
+        ticket = self.hold(2)
+        ticket.status = TicketStatusChoices.COMPRADA
+        ticket.save()
+
+        ticket.save()
+
+        self.assertEqual(self.counters(), {"capacity_sold": 2, "capacity_held": 0})
+
+    def test_partially_loaded_ticket_reads_the_stored_values(self):
+        ticket = Ticket.objects.only("id", "status").get(pk=self.hold(2).pk)
+        ticket.status = TicketStatusChoices.COMPRADA
+
+        ticket.save(update_fields=["status"])
+
+        self.assertEqual(self.counters(), {"capacity_sold": 2, "capacity_held": 0})
+
+
+class EventAuditTests(InventoryTestMixin, TestCase):
+    def save(self, event, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            event.save(**kwargs)
+
+    def logs(self):
+        return list(
+            EventChangeLog.objects.order_by("field_changed").values_list(
+                "field_changed", "change_type", "old_value", "new_value", "changed_by"
+            )
+        )
+
+    def test_one_save_writes_a_row_per_changed_field(self):
+        event = Event.objects.get(pk=self.event.pk)
+        event.event_name = "Concierto aplazado"
+        event.status = "cancelado"
+        event._changed_by = self.user
+
+        self.save(event)
+
+        self.assertEqual(
+            self.logs(),
+            [
+                ("event_name", "datos evento", "Concierto", "Concierto aplazado", self.user.pk),
+                ("status", "estado", "activo", "cancelado", self.user.pk),
+            ],
+        )
+
+    def test_snapshot_is_refreshed_after_each_save(self):
+        event = Event.objects.get(pk=self.event.pk)
+        event.event_name = "Concierto aplazado"
+        self.save(event)
+
+        self.save(event)
+        event.event_name = "Concierto final"
+        self.save(event)
+
+        self.assertEqual(
+            list(EventChangeLog.objects.order_by("id").values_list("old_value", "new_value")),
+            [("Concierto", "Concierto aplazado"), ("Concierto aplazado", "Concierto final")],
+        )
+
+    def test_update_fields_limits_the_audited_fields(self):
+        event = Event.objects.get(pk=self.event.pk)
+        event.event_name = "Sin guardar"
+        event.status = "finalizado"
+
+        self.save(event, update_fields=["status"])
+
+        self.assertEqual([row[0] for row in self.logs()], ["status"])
+
+    def test_new_events_are_not_audited(self):
+        self.save(Event(event_name="Nuevo", description="d", status="activo"))
+
+        self.assertFalse(EventChangeLog.objects.exists())
+
+
+class ShardedInventoryTests(InventoryTestMixin, TestCase):
+    def shard_capacities(self):
+        shards = InventoryShard.objects.filter(config_type=self.config_type).order_by("index")
+        return list(shards.values_list("maximun_capacity", flat=True))
+
+    def totals(self):
+        config_type = TicketTypeEvent.objects.with_inventory().get(pk=self.config_type.pk)
+        return config_type.inventory_sold, config_type.inventory_held
+
+    def test_enable_sharding_splits_only_the_free_capacity(self):
+        self.hold(1)
+
+        enable_sharding(self.config_type, 3)
+
+        self.assertEqual(self.shard_capacities(), [2, 1, 1])
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 1})
+        self.assertEqual(self.totals(), (0, 1))
+
+    def test_sharded_holds_never_exceed_capacity(self):
+        self.hold(1)
+        enable_sharding(self.config_type, 3)
+
+        tickets = [self.hold(1) for _ in range(4)]
+
+        self.assertEqual(acquire_inventory(self.config_type, 1), (False, None))
+        self.assertTrue(all(ticket.inventory_shard is not None for ticket in tickets))
+        self.assertEqual(self.totals(), (0, 5))
+
+    def test_large_request_rebalances_free_capacity_into_one_shard(self):
+        enable_sharding(self.config_type, 3)
+
+        ticket = self.hold(4)
+
+        self.assertEqual(sum(self.shard_capacities()), 5)
+        shard = InventoryShard.objects.get(config_type=self.config_type, index=ticket.inventory_shard)
+        self.assertEqual((shard.maximun_capacity, shard.capacity_held), (4, 4))
+        self.assertIsNone(rebalance_shards(self.config_type, 2))
+
+    def test_purchase_and_disable_keep_the_totals(self):
+        enable_sharding(self.config_type, 2)
+        ticket = self.hold(2)
+        self.hold(1)
+
+        ticket.status = TicketStatusChoices.COMPRADA
+        ticket.save()
+        self.assertEqual(self.totals(), (2, 1))
+
+        disable_sharding(self.config_type)
+
+        self.assertEqual(self.counters(), {"capacity_sold": 2, "capacity_held": 1})
+        self.assertFalse(InventoryShard.objects.exists())
+        self.assertFalse(Ticket.objects.filter(inventory_shard__isnull=False).exists())
+
+
+class BuyAfterCheckoutTests(InventoryTestMixin, TestCase):
+    def test_single_purchase_does_not_reuse_a_cart_ticket(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        checkout = client.post(
+            f"/api/events/{self.event.pk}/checkout/",
+            {"items": [{"config_type_id": self.config_type.pk, "amount": 2}]},
+            format="json",
+        )
+        self.assertEqual(checkout.status_code, 201, checkout.content)
+        cart_ticket = Ticket.objects.get(payment_reference__isnull=False)
+
+        buy = client.post(
+            f"/api/events/{self.event.pk}/buy/", {"config_type_id": self.config_type.pk, "amount": 1}, format="json"
+        )
+
+        self.assertEqual(buy.status_code, 201, buy.content)
+        cart_ticket.refresh_from_db()
+        self.assertEqual(cart_ticket.amount, 2)
+        self.assertEqual(cart_ticket.status, TicketStatusChoices.PENDIENTE)
+        single = Ticket.objects.get(payment_reference__isnull=True)
+        self.assertNotEqual(single.pk, cart_ticket.pk)
+        self.assertEqual(PaymentTransaction.objects.filter(reference_code=cart_ticket.unique_code).count(), 0)
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 3})
+
+
+@override_settings(DEFAULT_FROM_EMAIL="no-reply@gestify.test", FRONTEND_URL="https://gestify.test")
+class EventCancellationTests(InventoryTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sold = self.hold(2)
+        self.sold.status = TicketStatusChoices.COMPRADA
+        self.sold.save()
+        self.pending = self.hold(1)
+        self.approved = PaymentTransaction.objects.create(
+            reference_code=self.sold.unique_code, status="aprobado", amount=Decimal("100000"), ticket=self.sold
+        )
+        self.started = PaymentTransaction.objects.create(
+            reference_code=self.pending.unique_code, status="iniciada", amount=Decimal("50000"), ticket=self.pending
+        )
+
+    def job(self):
+        return EventCancellationJob.objects.create(event=self.event, total_tickets=2)
+
+    def test_job_cancels_tickets_releases_inventory_and_closes_payments(self):
+        job = process_cancellation_job(self.job().pk)
+
+        self.assertEqual(job.status, EventCancellationJob.Status.COMPLETADO)
+        self.assertEqual((job.processed_tickets, job.refunds_marked, job.emails_queued), (2, 1, 1))
+        self.assertFalse(Ticket.objects.exclude(status=TicketStatusChoices.CANCELADA).exists())
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 0})
+        self.approved.refresh_from_db()
+        self.started.refresh_from_db()
+        self.assertEqual(self.approved.status, "reembolso_pendiente")
+        self.assertEqual(self.started.status, "cancelada")
+        self.assertEqual(list(EmailOutbox.objects.values_list("to_email", flat=True)), [self.user.email])
+
+    def test_batch_processes_at_most_batch_size_tickets(self):
+        job = self.job()
+
+        self.assertEqual(_cancel_batch(job, 1), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.processed_tickets, 1)
+        self.assertEqual(Ticket.objects.filter(status=TicketStatusChoices.CANCELADA).count(), 1)
+        self.assertEqual(_cancel_batch(job, 1), 1)
+        self.assertEqual(_cancel_batch(job, 1), 0)
+
+    def test_close_payments_records_each_change_in_the_ledger(self):
+        refunds = _close_payments(self.event, {self.sold.unique_code}, {self.pending.unique_code})
+
+        self.assertEqual(refunds, 1)
+        entries = PaymentLedgerEntry.objects.order_by("payment_id").values_list("from_status", "to_status", "event_id")
+        self.assertEqual(
+            list(entries), [("aprobado", "reembolso_pendiente", self.event.pk), ("iniciada", "cancelada", self.event.pk)]
+        )
+
+    def test_failed_job_is_resumed_by_the_command(self):
+        job = self.job()
+        with mock.patch("eventos.cancellation._close_payments", side_effect=RuntimeError("sin conexión")):
+            with self.assertLogs("eventos.cancellation", "ERROR"):
+                failed = process_cancellation_job(job.pk)
+        self.assertEqual(failed.status, EventCancellationJob.Status.FALLIDO)
+        self.assertEqual(Ticket.objects.filter(status=TicketStatusChoices.CANCELADA).count(), 0)
+
+        call_command("process_cancellation_jobs", stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, EventCancellationJob.Status.COMPLETADO)
+        self.assertEqual(job.error, "")
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 0})
+
+    def test_cancel_endpoint_answers_202_and_leaves_the_tickets_to_the_worker(self):
+        client = admin_client()
+
+        response = client.post(f"/api/events/{self.event.pk}/cancel/")
+
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response.json()["status"], "cancelado")
+        self.assertEqual(response.json()["job"]["status"], EventCancellationJob.Status.PENDIENTE)
+        self.assertEqual(response.json()["job"]["total_tickets"], 2)
+        self.assertEqual(Ticket.objects.filter(status=TicketStatusChoices.CANCELADA).count(), 0)
+        self.assertEqual(client.post(f"/api/events/{self.event.pk}/cancel/").status_code, 400)
+
+    @override_settings(EVENT_CANCELLATION_RUN_IN_THREAD=True)
+    def test_thread_mode_starts_the_job_after_commit(self):
+        with mock.patch("eventos.cancellation._run_in_thread") as run_in_thread:
+            with self.captureOnCommitCallbacks(execute=True):
+                job = start_event_cancellation(self.event)
+
+        run_in_thread.assert_called_once_with(job.pk)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}, WAITING_ROOM_TICK_SECONDS=5
+)
+class WaitingRoomTests(InventoryTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # 12 por minuto con ticks de 5 s: un turno admitido por tick
+        Event.objects.filter(pk=self.event.pk).update(waiting_room_enabled=True, waiting_room_rate_per_minute=12)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/events/{self.event.pk}/queue/"
+        self.other = APIClient()
+        self.other.force_authenticate(
+            CustomUser.objects.create_user(
+                username="segundo", email="segundo@example.com", password="x", first_name="S", last_name="G"
+            )
+        )
+
+    def buy(self, admission_token=None):
+        headers = {"HTTP_X_ADMISSION_TOKEN": admission_token} if admission_token else {}
+        return self.client.post(
+            f"/api/events/{self.event.pk}/buy/",
+            {"config_type_id": self.config_type.pk, "amount": 1},
+            format="json",
+            **headers,
+        )
+
+    def test_admission_token_unlocks_the_purchase(self):
+        self.assertEqual(self.buy().status_code, 403)
+
+        joined = self.client.post(self.url)
+
+        self.assertEqual(joined.status_code, 201, joined.content)
+        self.assertEqual(joined.json()["position"], 1)
+        self.assertTrue(joined.json()["admitted"])
+        self.assertEqual(self.buy(joined.json()["admission_token"]).status_code, 201)
+
+    def test_later_arrivals_wait_for_the_next_tick(self):
+        self.client.post(self.url)
+
+        waiting = self.other.post(self.url).json()
+
+        self.assertEqual((waiting["position"], waiting["ahead"], waiting["admitted"]), (2, 1, False))
+        self.assertEqual(waiting["estimated_wait_seconds"], 5)
+        self.assertIsNone(waiting["admission_token"])
+        cache.delete(f"waiting_room:{self.event.pk}:tick")
+        polled = self.other.get(self.url, {"queue_token": waiting["queue_token"]}).json()
+        self.assertTrue(polled["admitted"])
+        self.assertIsNotNone(polled["admission_token"])
+
+    def test_tokens_only_work_for_their_user(self):
+        joined = self.other.post(self.url).json()
+
+        self.assertEqual(self.client.get(self.url, {"queue_token": joined["queue_token"]}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"queue_token": "manipulado"}).status_code, 400)
+        self.assertEqual(self.buy(joined["admission_token"]).status_code, 403)
+
+    def test_events_without_a_waiting_room_reject_the_queue(self):
+        Event.objects.filter(pk=self.event.pk).update(waiting_room_enabled=False)
+
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+    def test_queue_is_unavailable_without_a_shared_cache(self):
+        self.assertEqual(self.client.post(self.url).status_code, 503)
+        self.assertEqual(self.client.get(self.url, {"queue_token": "x"}).status_code, 503)
+
+
+class AttendeeListTests(InventoryTestMixin, TestCase):
+    def add_buyer(self, index):
+        buyer = CustomUser.objects.create_user(
+            username=f"asistente{index}", email=f"asistente{index}@example.com", password="x", first_name="A", last_name="B"
+        )
+        Ticket.objects.create(
+            user=buyer, event=self.event, config_type=self.config_type, amount=1, unique_code=str(uuid.uuid4())
+        )
+
+    def queries(self, client, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, len(captured)
+
+    def test_full_list_runs_the_same_queries_for_any_number_of_attendees(self):
+        client = admin_client()
+        url = f"/api/events/{self.event.pk}/attendees/"
+        self.add_buyer(1)
+        client.get(url)  # carga los roles del administrador
+        _response, one = self.queries(client, url)
+
+        for index in range(2, 6):
+            self.add_buyer(index)
+        response, five = self.queries(client, url)
+
+        self.assertEqual(five, one)
+        self.assertEqual(len(response.json()), 5)
+        first = response.json()[0]
+        self.assertEqual(first["user"]["email"], "asistente1@example.com")
+        self.assertEqual([event["id"] for event in first["user"]["eventos_inscritos"]], [self.event.pk])
+        self.assertEqual(first["price_paid"], "50000.00")
+
+
+    def test_paginated_list_pages_in_ticket_order(self):
+        for index in range(1, 6):
+            self.add_buyer(index)
+        client = admin_client()
+        url = f"/api/events/{self.event.pk}/attendees/paginated/"
+
+        first = client.get(url, {"page_size": 2}).json()
+        last = client.get(url, {"page_size": 2, "page": 3}).json()
+
+        self.assertEqual(first["count"], 5)
+        self.assertIsNotNone(first["next"])
+        self.assertEqual(
+            [row["user"]["email"] for row in first["results"]], ["asistente1@example.com", "asistente2@example.com"]
+        )
+        self.assertEqual([row["user"]["email"] for row in last["results"]], ["asistente5@example.com"])
+        self.assertIsNone(last["next"])
+        self.assertEqual(last["results"][0]["price_paid"], "50000.00")
+
+    def test_paginated_list_runs_the_same_queries_for_any_page_size(self):
+        for index in range(1, 6):
+            self.add_buyer(index)
+        client = admin_client()
+        url = f"/api/events/{self.event.pk}/attendees/paginated/"
+        client.get(url)  # carga los roles del administrador
+
+        _response, small = self.queries(client, f"{url}?page_size=1")
+        _response, large = self.queries(client, f"{url}?page_size=5")
+
+        self.assertEqual(large, small)
+
+    def test_paginated_list_requires_an_administrator(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        self.assertEqual(client.get(f"/api/events/{self.event.pk}/attendees/paginated/").status_code, 403)
+        self.assertEqual(admin_client().get("/api/events/999999/attendees/paginated/").status_code, 404)
+
+
+class AttendeeExportTests(InventoryTestMixin, TestCase):
+    def export(self, export_format):
+        response = admin_client().get(f"/api/events/{self.event.pk}/attendees/export/", {"format": export_format})
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_csv_has_the_header_and_a_row_per_ticket(self):
+        first = self.hold(2)
+        second = self.hold(1)
+
+        header, *rows = csv.reader(self.export("csv").splitlines())
+
+        self.assertEqual(header[:3], ["ticket_id", "unique_code", "status"])
+        self.assertEqual([row[0] for row in rows], [str(first.pk), str(second.pk)])
+        values = dict(zip(header, rows[0]))
+        self.assertEqual(values["amount"], "2")
+        self.assertEqual(values["ticket_type"], "General")
+        self.assertEqual(values["unit_price"], "50000.00")
+        self.assertEqual(values["status"], TicketStatusChoices.PENDIENTE)
+
+    def test_ndjson_has_one_object_per_ticket(self):
+        ticket = self.hold(2)
+
+        lines = self.export("ndjson").splitlines()
+
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(row["ticket_id"], ticket.pk)
+        self.assertEqual(row["unique_code"], ticket.unique_code)
+        self.assertEqual(row["email"], "comprador@example.com")
+        self.assertEqual(row["unit_price"], "50000.00")
+
+    def test_unknown_format_is_rejected(self):
+        response = admin_client().get(f"/api/events/{self.event.pk}/attendees/export/", {"format": "xlsx"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("csv", response.json()["error"])
+
+    def test_csv_neutralizes_formulas_in_user_data(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            first_name='=HYPERLINK("http://malicioso.test")', last_name="@SUM(A1)", phone="+573001234567"
+        )
+        self.hold(1)
+
+        header, row = csv.reader(self.export("csv").splitlines())
+        values = dict(zip(header, row))
+
+        self.assertEqual(values["first_name"], '\'=HYPERLINK("http://malicioso.test")')
+        self.assertEqual(values["last_name"], "'@SUM(A1)")
+        self.assertEqual(values["phone"], "'+573001234567")
+        self.assertEqual(values["email"], "comprador@example.com")
+
+
+class LoadTestVerificationTests(InventoryTestMixin, TestCase):
+    def verify(self, codes, amount=1):
+        LoadTestCommand(stdout=StringIO())._verify(self.config_type, 5, Counter(codes), amount)
+
+    def test_server_errors_fail_the_run(self):
+        with self.assertRaisesMessage(CommandError, "500: 10"):
+            self.verify({500: 10})
+
+    def test_run_without_successes_fails(self):
+        with self.assertRaisesMessage(CommandError, "ninguna compra tuvo éxito"):
+            self.verify({400: 10})
+
+    def test_successes_must_match_the_counted_tickets(self):
+        self.hold(2)
+
+        with self.assertRaisesMessage(CommandError, "3 compras exitosas"):
+            self.verify({201: 3, 400: 7})
+
+    def test_consistent_run_passes(self):
+        self.hold(1)
+        self.hold(1)
+
+        self.verify({201: 2, 400: 8})
+
+
+class LoadTestRunTests(TransactionTestCase):
+    def test_run_against_the_test_database_cleans_up_what_it_seeds(self):
+        out = StringIO()
+
+        call_command("loadtest_purchases", requests=4, concurrency=1, capacity=2, stdout=out)
+
+        self.assertIn("Inventario consistente", out.getvalue())
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(Ticket.objects.exists())
+        self.assertFalse(CustomUser.objects.filter(username__startswith="loadtest-").exists())
+        self.assertFalse(TicketType.objects.filter(ticket_name="Prueba de carga").exists())
+
+    @override_settings(DEBUG=False)
+    def test_refuses_a_database_that_is_not_local_or_for_tests(self):
+        with mock.patch("eventos.management.commands.loadtest_purchases.connection") as connection:
+            connection.vendor = "postgresql"
+            connection.settings_dict = {"NAME": "gestify"}
+            with self.assertRaisesMessage(CommandError, "--i-know"):
+                check_database(allow_any=False)
+            check_database(allow_any=True)
+            connection.settings_dict = {"NAME": "test_gestify"}
+            check_database(allow_any=False)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+@mock.patch.dict("os.environ", {"GEMINI_API_KEY": "k"})
+class EventQAViewTests(InventoryTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        answer_cache.clear()
+        self.url = f"/api/events/{self.event.pk}/ask-ai/"
+
+    @mock.patch("eventos.views.ia_assistant.generate_answer", return_value="Empieza a las 8.")
+    def test_same_question_reuses_the_answer(self, generate_answer):
+        first = self.client.post(self.url, {"question": "¿A qué hora empieza?"}, content_type="application/json")
+        second = self.client.post(self.url, {"question": "a que hora empieza"}, content_type="application/json")
+
+        self.assertEqual(first.status_code, 200, first.content)
+        self.assertEqual(second.json(), {"answer": "Empieza a las 8."})
+        self.assertEqual(generate_answer.call_count, 1)
+
+    @mock.patch("eventos.views.ia_assistant.generate_answer", side_effect=UpstreamBusy)
+    def test_busy_upstream_answers_503(self, generate_answer):
+        response = self.client.post(self.url, {"question": "¿Hay parqueadero?"}, content_type="application/json")
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_unknown_event_uses_the_api_error_format(self):
+        response = self.client.post(
+            "/api/events/999999/ask-ai/", {"question": "¿Hay parqueadero?"}, content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("detail", response.json())
+
+
+class PlaceIndexTests(SimpleTestCase):
+    def test_matches_agree_with_difflib(self):
+        index = get_place_index()
+        names = list(index.cities.canonical)
+        words = [name.split()[0] for name in names]
+        words += [word[:-1] for word in words if len(word) > 4] + [word + "s" for word in words]
+        words += ["hola", "eventos", "x", ""]
+
+        for word in words:
+            expected = get_close_matches(word, names, n=1, cutoff=0.7)
+            with self.subTest(word=word):
+                self.assertEqual(index.cities.match(word), expected[0] if expected else None)
+
+    def test_accents_and_typos_resolve_to_the_original_name(self):
+        index = PlaceIndex(cities=["Bogotá", "Medellín"], departments=["Atlántico", "Bolívar"])
+        palabras = normalizar("Conciertos en medelin atlantico").split()
+
+        self.assertEqual(index.cities.first_match(palabras), "medellin")
+        self.assertEqual(index.departments.canonical[index.departments.first_match(palabras)], "Atlántico")
+        self.assertIsNone(index.cities.first_match(["hola", "que", "hay"]))
+
+    def test_category_follows_word_order(self):
+        index = PlaceIndex(cities=[], departments=[])
+
+        self.assertEqual(index.category(["tecnologia", "y", "musica"]), "tecnologia")
+        self.assertEqual(index.category(["deportes"]), "deporte")
+        self.assertIsNone(index.category(["hola"]))
+
+    def test_words_are_memoized(self):
+        index = FuzzyNameIndex(["Cartagena"])
+
+        index.match("cartajena")
+        index.match("cartajena")
+
+        self.assertEqual(index.match.cache_info().hits, 1)
+
+    def test_missing_fixture_builds_an_empty_index(self):
+        with self.assertLogs("eventos.places", "ERROR"):
+            index = PlaceIndex.from_fixture("/nonexistent/places.json")
+
+        self.assertEqual((len(index.cities), len(index.departments)), (0, 0))
+
+    def test_benchmark_checks_results_against_difflib(self):
+        out = StringIO()
+
+        call_command("benchmark_place_matching", messages=50, rounds=1, stdout=out)
+
+        self.assertIn("50 mensajes reconocidos igual que con difflib", out.getvalue())
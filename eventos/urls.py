@@ -8,6 +8,10 @@ from .views import (
     TicketTypeViewSet,
     TicketValidationAPIView,
     BuyTicketAPIView,
+    CheckoutAPIView,
+    EventAttendeeListAPIView,
+    EventAttendeeExportAPIView,
+    EventCancellationStatusAPIView,
     MyCreatedEventsAPIView,
     MyEventsAPIView,
     EventInscritosAPIView,
@@ -18,6 +22,7 @@ from .views import (
     ResendTicketEmailAPIView,
     TicketDetailAPIView,
     EventQAView,
+    WaitingRoomAPIView,
 )
 from .views.ia_assistant import ChatBotView
 from .views.chat_history import ChatHistoryView
@@ -38,8 +43,13 @@ urlpatterns = [
     path('events/<int:pk>/ticket-types/', EventViewSet.as_view({'get': 'ticket_types_available'}), name='event-ticket-types'),
     path('events/<int:pk>/availability/', EventViewSet.as_view({'get': 'availability'}), name='event-availability'),
     path('events/<int:pk>/buy/', BuyTicketAPIView.as_view(), name='event-buy-ticket'),
+    path('events/<int:pk>/checkout/', CheckoutAPIView.as_view(), name='event-checkout'),
+    path('events/<int:pk>/queue/', WaitingRoomAPIView.as_view(), name='event-waiting-room'),
     path('events/<int:pk>/cancel/', EventViewSet.as_view({'post': 'cancelar'}), name='event-cancel'),
+    path('events/<int:pk>/cancel/status/', EventCancellationStatusAPIView.as_view(), name='event-cancel-status'),
     path('events/<int:pk>/attendees/', EventInscritosAPIView.as_view(), name='event-attendees'),
+    path('events/<int:pk>/attendees/paginated/', EventAttendeeListAPIView.as_view(), name='event-attendees-paginated'),
+    path('events/<int:pk>/attendees/export/', EventAttendeeExportAPIView.as_view(), name='event-attendees-export'),
     path('events/my-events/', MyEventsAPIView.as_view(), name='event-my-events'),
     path('organizer/my-events/', MyCreatedEventsAPIView.as_view(), name='organizer-my-events'),
     # --- Tickets del usuario ---
@@ -1,7 +1,17 @@
 """Punto de entrada para exponer las vistas del módulo de eventos."""
 
 from .catalogs import CityListView, DepartmentListView
-from .events import BuyTicketAPIView, EventInscritosAPIView, EventViewSet, MyEventsAPIView, MyCreatedEventsAPIView
+from .events import (
+	BuyTicketAPIView,
+	CheckoutAPIView,
+	EventAttendeeListAPIView,
+	EventCancellationStatusAPIView,
+	EventInscritosAPIView,
+	EventViewSet,
+	MyEventsAPIView,
+	MyCreatedEventsAPIView,
+)
+from .exports import EventAttendeeExportAPIView
 from .ticket_types import TicketTypeViewSet
 from .tickets import (
 	MyTicketsAPIView,
@@ -11,10 +21,15 @@ from .tickets import (
 	TicketDetailAPIView,
 )
 from .ia_assistant import EventQAView # <-- AÑADIR ESTO
+from .waiting_room import WaitingRoomAPIView
 __all__ = [
 	"EventViewSet",
 	"BuyTicketAPIView",
+	"CheckoutAPIView",
 	"EventInscritosAPIView",
+	"EventAttendeeListAPIView",
+	"EventCancellationStatusAPIView",
+	"EventAttendeeExportAPIView",
 	"MyEventsAPIView",
 	"MyTicketsAPIView",
 	"ResendTicketEmailAPIView",
@@ -26,4 +41,5 @@ __all__ = [
 	"DepartmentListView",
 	"CityListView",
 	"EventQAView", # <-- AÑADIR ESTO
+	"WaitingRoomAPIView",
 ]
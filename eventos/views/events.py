@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from datetime import date
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 from typing import Dict, List, Optional
 
 from django.core.exceptions import ImproperlyConfigured
@@ -11,26 +11,38 @@ from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import status, viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.generics import ListAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from drf_spectacular.utils import extend_schema
 
+from gestify.pagination import StandardResultsSetPagination
+from payments.idempotency import IDEMPOTENCY_PARAMETER, idempotent
+from usuarios.authentication import AccessTokenAuthentication
 from usuarios.permissions import IsAdminGroup
-from usuarios.serializers import CustomUserSerializer
+from usuarios.serializers import CustomUserSerializer, events_by_user
 
-from ..models import Event, Ticket, TicketTypeEvent
+from ..cancellation import start_event_cancellation
+from ..models import Event, EventCancellationJob, Ticket, TicketTypeEvent
+from ..services import InventoryUnavailable, find_pending_ticket, renew_pending_ticket, reserve_cart
+from ..waiting_room import has_valid_admission
 from ..serializers import (
     EventSerializer, 
     TicketSerializer, 
     TicketTypeEventSerializer, 
     AttendeeTicketSerializer, 
+    AttendeeListSerializer,
     MyEventSerializer, 
     BuyTicketRequestSerializer, 
     BuyTicketResponseSerializer,
+    CheckoutRequestSerializer,
+    CheckoutResponseSerializer,
+    CheckoutTicketSerializer,
+    EventCancellationJobSerializer,
+    EventCancelResponseSerializer,
 )
 
 
@@ -53,26 +65,41 @@ def _validate_user_age_for_event(user, event) -> Optional[Dict[str, str]]:
 
 
 class EventInscritosAPIView(APIView):
-    """Lista los asistentes registrados a un evento."""
+    """
+    Lista completa de asistentes de un evento. Obsoleta: usar la versión
+    paginada (EventAttendeeListAPIView); se mantiene con consultas fijas.
+    """
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated, IsAdminGroup]
 
     @extend_schema(
             tags=["Eventos"], 
             operation_id="event_attendees", 
             responses=AttendeeTicketSerializer(many=True),
+            deprecated=True,
+            description="Obsoleto: usa /api/events/{id}/attendees/paginated/.",
     )
 
     def get(self, request, pk: int) -> Response:
-        event = get_object_or_404(Event, pk=pk)
-        tickets = Ticket.objects.filter(event=event).select_related("user", "config_type__ticket_type")
+        event = get_object_or_404(Event.objects.only("id"), pk=pk)
+        tickets = list(
+            Ticket.objects.filter(event=event)
+            .select_related("user__document_type", "user__department", "user__city", "config_type__ticket_type")
+            .prefetch_related("user__groups", "user__user_permissions")
+            .only(
+                "id", "amount", "status", "unique_code", "date_of_purchase", "user", "config_type__price",
+                "config_type__ticket_type__ticket_name",
+            )
+        )
+        # Los eventos inscritos de todos los asistentes salen de una sola consulta
+        context = {"events_by_user": events_by_user({ticket.user_id for ticket in tickets})}
         data: List[Dict[str, object]] = []
         for ticket in tickets:
             data.append(
                 {
                     "ticket_id": ticket.id,
-                    "user": CustomUserSerializer(ticket.user).data,
+                    "user": CustomUserSerializer(ticket.user, context=context).data,
                     "ticket_type": ticket.config_type.ticket_type.ticket_name,
                     "amount": ticket.amount,
                     "status": ticket.status,
@@ -84,10 +111,53 @@ class EventInscritosAPIView(APIView):
         return Response(data, status=status.HTTP_200_OK)
 
 
+class EventCancellationStatusAPIView(APIView):
+    """Progreso de la cancelación más reciente de un evento."""
+
+    authentication_classes = [AccessTokenAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminGroup]
+
+    @extend_schema(tags=["Eventos"], operation_id="event_cancel_status", responses=EventCancellationJobSerializer)
+    def get(self, request, pk: int) -> Response:
+        job = EventCancellationJob.objects.filter(event_id=pk).order_by("-created_at").first()
+        if job is None:
+            return Response(
+                {"error": "El evento no tiene una cancelación registrada."}, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(EventCancellationJobSerializer(job).data)
+
+
+class EventAttendeeListAPIView(ListAPIView):
+    """Lista paginada de asistentes de un evento, con un número fijo de consultas por página."""
+
+    authentication_classes = [AccessTokenAuthentication]
+    permission_classes = [IsAuthenticated, IsAdminGroup]
+    serializer_class = AttendeeListSerializer
+    pagination_class = StandardResultsSetPagination
+
+    @extend_schema(tags=["Eventos"], operation_id="event_attendees_paginated")
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        event = get_object_or_404(Event.objects.only("id"), pk=self.kwargs["pk"])
+        return (
+            Ticket.objects.filter(event=event)
+            .select_related(
+                "config_type__ticket_type",
+                "user__document_type",
+                "user__department",
+                "user__city",
+            )
+            .prefetch_related("user__groups")
+            .order_by("id")
+        )
+
+
 class MyEventsAPIView(APIView):
     """Eventos a los que el usuario autenticado está inscrito."""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
 
@@ -140,7 +210,7 @@ class EventViewSet(viewsets.ModelViewSet):
         Prefetch("tickets", queryset=Ticket.objects.select_related("user", "config_type__ticket_type"))
     ).select_related("location")
     serializer_class = EventSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     def perform_create(self, serializer):
         # Guarda el evento asignando el usuario actual como creador
         serializer.save(creator=self.request.user)
@@ -188,16 +258,17 @@ class EventViewSet(viewsets.ModelViewSet):
     @extend_schema(tags=["Eventos"], operation_id="event_availability")
     def availability(self, request, pk=None):
         event = self.get_object()
-        types = TicketTypeEvent.objects.select_related("ticket_type").filter(event=event)
+        types = TicketTypeEvent.objects.with_inventory().select_related("ticket_type").filter(event=event)
         data = [
             {
                 "id": item.id,
                 "ticket_type": item.ticket_type.ticket_name,
                 "price": item.price,
                 "maximun_capacity": item.maximun_capacity,
-                "capacity_sold": item.capacity_sold,
-                "remaining_capacity": max(0, item.maximun_capacity - item.capacity_sold),
-                "is_sold_out": item.capacity_sold >= item.maximun_capacity,
+                "capacity_sold": item.total_sold,
+                "capacity_held": item.total_held,
+                "remaining_capacity": item.remaining_capacity,
+                "is_sold_out": item.remaining_capacity == 0,
             }
             for item in types
         ]
@@ -212,21 +283,26 @@ class EventViewSet(viewsets.ModelViewSet):
         #        {"error": "No se pueden consultar tipos para eventos inactivos."},
         #        status=status.HTTP_400_BAD_REQUEST,
         #    )
-        types = TicketTypeEvent.objects.select_related("ticket_type").filter(event=event)
+        types = TicketTypeEvent.objects.with_inventory().select_related("ticket_type").filter(event=event)
         serializer = TicketTypeEventSerializer(types, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=["post"], permission_classes=[IsAuthenticated, IsAdminGroup])
-    @extend_schema(tags=["Eventos"], operation_id="event_cancel")
+    @extend_schema(tags=["Eventos"], operation_id="event_cancel", responses={202: EventCancelResponseSerializer})
     def cancelar(self, request, pk=None):
         event = self.get_object()
         if event.status == "cancelado":
             return Response({"error": "El evento ya está cancelado."}, status=status.HTTP_400_BAD_REQUEST)
-        event.status = "cancelado"
-        event.save(update_fields=["status"])
+        # Los tickets, el aforo, los pagos y los avisos se procesan por lotes fuera de la petición
+        job = start_event_cancellation(event, request.user)
         return Response(
-            {"id": event.id, "status": event.status, "message": "Evento cancelado exitosamente."},
-            status=status.HTTP_200_OK,
+            {
+                "id": event.id,
+                "status": event.status,
+                "message": "Evento cancelado. Los tickets se están anulando en segundo plano.",
+                "job": EventCancellationJobSerializer(job).data,
+            },
+            status=status.HTTP_202_ACCEPTED,
         )
 
     def get_object(self):
@@ -242,17 +318,20 @@ class EventViewSet(viewsets.ModelViewSet):
 class BuyTicketAPIView(APIView):
     """Compra o reserva de tickets para un evento."""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
             tags=["Pagos"], 
             operation_id="buy_ticket",
             request=BuyTicketRequestSerializer,
+            parameters=[IDEMPOTENCY_PARAMETER],
         responses={
+            200: BuyTicketResponseSerializer,
             201: BuyTicketResponseSerializer,
         },
     )
+    @idempotent
     def post(self, request, pk: int) -> Response:
         event = get_object_or_404(Event, pk=pk)
         if event.status != "activo":
@@ -261,6 +340,12 @@ class BuyTicketAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        if event.waiting_room_enabled and not has_valid_admission(request, event.id):
+            return Response(
+                {"error": "Debes pasar por la sala de espera antes de comprar."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
         age_error = _validate_user_age_for_event(request.user, event)
         if age_error:
             return Response(age_error, status=status.HTTP_400_BAD_REQUEST)
@@ -280,20 +365,30 @@ class BuyTicketAPIView(APIView):
         if amount <= 0:
             return Response({"error": "amount debe ser un entero positivo."}, status=status.HTTP_400_BAD_REQUEST)
 
-        config_type = get_object_or_404(TicketTypeEvent, id=config_type_id, event=event)
-        remaining_capacity = config_type.maximun_capacity - config_type.capacity_sold
-        if amount > remaining_capacity:
-            return Response(
-                {"error": f"No hay suficiente aforo disponible. Quedan {remaining_capacity} boletos."},
-                status=status.HTTP_400_BAD_REQUEST,
+        config_type = get_object_or_404(TicketTypeEvent.objects.with_inventory(), id=config_type_id, event=event)
+
+        # Un mismo usuario reutiliza su ticket pendiente en lugar de acumular reservas
+        ticket = None
+        if config_type.price != 0:
+            pending_ticket = find_pending_ticket(request.user, config_type)
+            if pending_ticket and renew_pending_ticket(pending_ticket, config_type, amount):
+                ticket = pending_ticket
+        reused = ticket is not None
+
+        if ticket is None:
+            remaining_capacity = config_type.remaining_capacity
+            if amount > remaining_capacity:
+                return Response(
+                    {"error": f"No hay suficiente aforo disponible. Quedan {remaining_capacity} boletos."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            serializer = TicketSerializer(
+                data={"amount": amount, "status": "comprada" if config_type.price == 0 else "pendiente"},
+                context={"config_type": config_type, "request": request},
             )
-
-        serializer = TicketSerializer(
-            data={"amount": amount, "status": "comprada" if config_type.price == 0 else "pendiente"},
-            context={"config_type": config_type, "request": request},
-        )
-        serializer.is_valid(raise_exception=True)
-        ticket = serializer.save(user=request.user)
+            serializer.is_valid(raise_exception=True)
+            ticket = serializer.save(user=request.user)
 
         if config_type.price == 0:
             return Response(
@@ -305,45 +400,114 @@ class BuyTicketAPIView(APIView):
                 status=status.HTTP_201_CREATED,
             )
 
-        from payments.services import generate_payu_signature, get_payu_config  # Lazy import
+        from payments.services import build_payu_form_data, get_payu_config  # Lazy import
 
         try:
             config = get_payu_config()
         except ImproperlyConfigured as exc:
             return Response({"error": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        total_amount_value = (config_type.price * Decimal(amount)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        total_amount = format(total_amount_value, ".2f")
-        reference_code = ticket.unique_code
-        signature = generate_payu_signature(
-            config["api_key"],
-            config["merchant_id"],
-            reference_code,
-            total_amount,
-            currency=config["currency"],
+        payment_data = build_payu_form_data(
+            config,
+            reference_code=ticket.unique_code,
+            amount_value=config_type.price * Decimal(amount),
+            description=f"{event.event_name} - {config_type.ticket_type.ticket_name}",
+            buyer_email=request.user.email,
         )
-
-        payment_data = {
-            "sandbox": config["sandbox"],
-            "merchantId": config["merchant_id"],
-            "accountId": config["account_id"],
-            "description": f"{event.event_name} - {config_type.ticket_type.ticket_name}",
-            "referenceCode": reference_code,
-            "amount": total_amount,
-            "currency": config["currency"],
-            "signature": signature,
-            "buyerEmail": request.user.email,
-            "confirmationUrl": config["confirmation_url"],
-            "responseUrl": config["response_url"],
-        }
+        total_amount = payment_data["amount"]
 
         return Response(
             {
-                "message": "Ticket creada. Procede al pago.",
+                "message": "Tu ticket pendiente sigue reservada. Procede al pago." if reused else "Ticket creada. Procede al pago.",
                 "ticket_id": ticket.id,
                 "config_type_id": config_type_id,
                 "amount": amount,
                 "total_a_pagar": total_amount,
+                "hold_expires_at": ticket.hold_expires_at,
+                "payment": payment_data,
+            },
+            status=status.HTTP_200_OK if reused else status.HTTP_201_CREATED,
+        )
+
+
+class CheckoutAPIView(APIView):
+    """Compra de varios tipos de ticket de un evento en una sola orden."""
+
+    authentication_classes = [AccessTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        tags=["Pagos"],
+        operation_id="checkout_cart",
+        request=CheckoutRequestSerializer,
+        parameters=[IDEMPOTENCY_PARAMETER],
+        responses={201: CheckoutResponseSerializer},
+    )
+    @idempotent
+    def post(self, request, pk: int) -> Response:
+        event = get_object_or_404(Event, pk=pk)
+        if event.status != "activo":
+            return Response(
+                {"error": "No se pueden comprar tickets para eventos inactivos."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if event.waiting_room_enabled and not has_valid_admission(request, event.id):
+            return Response(
+                {"error": "Debes pasar por la sala de espera antes de comprar."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        age_error = _validate_user_age_for_event(request.user, event)
+        if age_error:
+            return Response(age_error, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = CheckoutRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        lines = serializer.validated_data["items"]
+
+        try:
+            payment_reference, tickets = reserve_cart(request.user, event, lines)
+        except InventoryUnavailable as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        paid = [ticket for ticket in tickets if ticket.payment_reference]
+        tickets_data = CheckoutTicketSerializer(tickets, many=True).data
+        if not paid:
+            return Response(
+                {
+                    "message": "Tickets gratuitas creadas exitosamente.",
+                    "payment_reference": None,
+                    "tickets": tickets_data,
+                    "total_a_pagar": "0.00",
+                    "hold_expires_at": None,
+                    "payment": None,
+                },
+                status=status.HTTP_201_CREATED,
+            )
+
+        from payments.services import build_payu_form_data, get_payu_config  # Lazy import
+
+        try:
+            config = get_payu_config()
+        except ImproperlyConfigured as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        payment_data = build_payu_form_data(
+            config,
+            reference_code=payment_reference,
+            amount_value=sum((ticket.config_type.price * Decimal(ticket.amount) for ticket in paid), Decimal("0")),
+            description=f"{event.event_name} - {len(paid)} tipo(s) de ticket",
+            buyer_email=request.user.email,
+        )
+
+        return Response(
+            {
+                "message": "Orden creada. Procede al pago.",
+                "payment_reference": payment_reference,
+                "tickets": tickets_data,
+                "total_a_pagar": payment_data["amount"],
+                "hold_expires_at": paid[0].hold_expires_at,
                 "payment": payment_data,
             },
             status=status.HTTP_201_CREATED,
@@ -354,7 +518,7 @@ class MyCreatedEventsAPIView(APIView):
     """
     Eventos CREADOS por el usuario autenticado (Organizador).
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     # NOTA: Decide si es solo IsAuthenticated o IsAdminGroup
     permission_classes = [IsAuthenticated] 
 
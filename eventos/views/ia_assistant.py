@@ -1,14 +1,18 @@
 """
 eventos/views/ia_assistant.py
 Vista para el asistente de IA que responde dudas sobre eventos usando Gemini.
+
+Las llamadas a Gemini abiertas por proceso se limitan a
+``AI_UPSTREAM_CONCURRENCY`` y cada una espera a lo sumo
+``AI_UPSTREAM_TIMEOUT`` segundos, para que un Gemini lento no ocupe todos
+los workers del servidor: sin cupo la vista responde 503.
 """
 import os
 import re
-import json
 import logging
-import unicodedata
+import threading
 from datetime import datetime, timedelta
-from difflib import get_close_matches
+from functools import lru_cache
 
 import google.generativeai as genai
 from django.conf import settings
@@ -20,11 +24,39 @@ from rest_framework import status, serializers
 from rest_framework.permissions import AllowAny
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
+from ..ai_cache import answer_cache, answer_key
 from ..models import Event
+from ..places import get_place_index, normalizar
 from usuarios.serializers import EmptySerializer
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_UPSTREAM_CONCURRENCY = 8
+DEFAULT_UPSTREAM_TIMEOUT = 20
+
+
+class UpstreamBusy(Exception):
+    """Todos los cupos de llamadas a Gemini del proceso siguen ocupados."""
+
+
+@lru_cache(maxsize=None)
+def _upstream_slots(size):
+    return threading.BoundedSemaphore(size)
+
+
+def generate_answer(api_key, prompt):
+    """Llama a Gemini y devuelve el texto de la respuesta, dentro de un cupo del proceso."""
+    timeout = getattr(settings, "AI_UPSTREAM_TIMEOUT", DEFAULT_UPSTREAM_TIMEOUT)
+    slots = _upstream_slots(getattr(settings, "AI_UPSTREAM_CONCURRENCY", DEFAULT_UPSTREAM_CONCURRENCY))
+    if not slots.acquire(timeout=timeout):
+        raise UpstreamBusy("No hay cupo para llamar a Gemini.")
+    try:
+        genai.configure(api_key=api_key)
+        model = genai.GenerativeModel('gemini-2.0-flash')  # Modelo rápido y barato
+        return model.generate_content(prompt, request_options={"timeout": timeout}).text
+    finally:
+        slots.release()
+
 
 class EventQAView(APIView):
     """
@@ -49,7 +81,7 @@ class EventQAView(APIView):
             )
 
         # 2. Buscar el evento
-        event = get_object_or_404(Event, pk=event_id)
+        event = get_object_or_404(Event.objects.select_related("location"), pk=event_id)
 
         # 3. Configurar Gemini
         api_key = os.getenv("GEMINI_API_KEY")
@@ -61,12 +93,9 @@ class EventQAView(APIView):
             )
 
         try:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-2.0-flash')  # Modelo rápido y barato
-
             # 4. Construir el Prompt (La magia)
             # Le damos contexto y reglas claras a la IA.
-            prompt = f"""
+            contexto = f"""
             Actúa como un asistente útil y amable para el evento "{event.event_name}".
             
             Información del evento:
@@ -74,7 +103,8 @@ class EventQAView(APIView):
             - Fecha Inicio: {event.start_datetime}
             - Ubicación: {event.location if event.location else event.city_text}
             - Edad Mínima: {event.min_age if event.min_age else "Todas las edades"}
-            
+            """
+            prompt = contexto + f"""
             El usuario pregunta: "{question}"
 
             Instrucciones:
@@ -84,13 +114,22 @@ class EventQAView(APIView):
             4. Usa un tono entusiasta.
             """
 
-            # 5. Llamar a Gemini
-            response = model.generate_content(prompt)
+            # 5. Llamar a Gemini; la misma pregunta sobre el mismo contenido reutiliza la respuesta
+            answer = answer_cache.get_or_compute(
+                answer_key(f"event:{event.pk}", question, contexto),
+                lambda: generate_answer(api_key, prompt),
+            )
             
             return Response({
-                "answer": response.text
+                "answer": answer
             }, status=status.HTTP_200_OK)
 
+        except UpstreamBusy:
+            logger.warning("Gemini saturado: pregunta del evento %s rechazada", event.pk)
+            return Response(
+                {"error": "El asistente está ocupado. Intenta de nuevo en unos segundos."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         except Exception as e:
             logger.error(f"Error llamando a Gemini: {str(e)}")
             return Response(
@@ -113,39 +152,11 @@ class ChatBotView(APIView):
     Chatbot general para recomendaciones de eventos y FAQ
     """
     permission_classes = [AllowAny]
-    
-    # Cache de ciudades y departamentos
-    _ciudades_col = None
-    _departamentos_col = None
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Cargar ciudades y departamentos desde el fixture (solo una vez)
-        if ChatBotView._ciudades_col is None:
-            try:
-                fixture_path = os.path.join(
-                    os.path.dirname(__file__), 
-                    '../fixtures/departamentos_ciudades.json'
-                )
-                with open(fixture_path, encoding='utf-8') as f:
-                    data = json.load(f)
-                ChatBotView._ciudades_col = [
-                    self.normalizar(x['fields']['name']) 
-                    for x in data if x['model'].endswith('city')
-                ]
-                ChatBotView._departamentos_col = [
-                    self.normalizar(x['fields']['name']) 
-                    for x in data if x['model'].endswith('department')
-                ]
-            except Exception as e:
-                logger.error(f"Error cargando fixture: {str(e)}")
-                ChatBotView._ciudades_col = []
-                ChatBotView._departamentos_col = []
 
     @staticmethod
     def normalizar(texto):
         """Normaliza texto removiendo acentos y convirtiendo a minúsculas"""
-        return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('utf-8').lower()
+        return normalizar(texto)
 
     @extend_schema(
         tags=["IA Assistant"],
@@ -183,76 +194,17 @@ class ChatBotView(APIView):
                     "answer": "Aquí tienes los horarios de los eventos que mencioné antes:\n" + '\n'.join(eventos_previos)
                 })
 
-        # --- Categorías ---
-        categorias_dict = {
-            "musica": ["musica", "música"],
-            "deporte": ["deporte", "deportes"],
-            "educacion": ["educacion", "educación"],
-            "tecnologia": ["tecnologia", "tecnología"],
-            "arte": ["arte"],
-            "otros": ["otros"]
-        }
         palabras_recomendacion = [
             "recomienda", "sugerencia", "evento", "interesa", 
             "buscar", "hay", "donde", "cuáles", "cuales"
         ]
 
-        # --- Fuzzy matching categoría ---
-        cat = None
-        for palabra in palabras_usuario:
-            for key, variantes in categorias_dict.items():
-                coincidencias = get_close_matches(
-                    palabra, 
-                    [self.normalizar(v) for v in variantes], 
-                    n=1, 
-                    cutoff=0.7
-                )
-                if coincidencias:
-                    cat = key
-                    break
-            if cat:
-                break
-
-        # --- Fuzzy matching ciudad ---
-        ciudad = None
-        for palabra in palabras_usuario:
-            coincidencias = get_close_matches(
-                palabra, 
-                self._ciudades_col, 
-                n=1, 
-                cutoff=0.7
-            )
-            if coincidencias:
-                ciudad = coincidencias[0]
-                break
-
-        # --- Fuzzy matching departamento (y obtener nombre real) ---
-        departamento = None
-        departamento_real = None
-        if ChatBotView._departamentos_col:
-            # Cargar mapeo normalizado -> real
-            if not hasattr(self, '_departamento_map'):
-                fixture_path = os.path.join(
-                    os.path.dirname(__file__), 
-                    '../fixtures/departamentos_ciudades.json'
-                )
-                with open(fixture_path, encoding='utf-8') as f:
-                    data = json.load(f)
-                self._departamento_map = {
-                    self.normalizar(x['fields']['name']): x['fields']['name']
-                    for x in data if x['model'].endswith('department')
-                }
-            for palabra in palabras_usuario:
-                coincidencias = get_close_matches(
-                    palabra, 
-                    list(self._departamento_map.keys()), 
-                    n=1, 
-                    cutoff=0.7
-                )
-                if coincidencias:
-                    departamento = coincidencias[0]
-                    departamento_real = self._departamento_map[departamento]
-                    break
+        # --- Fuzzy matching de categoría, ciudad y departamento (índice del proceso) ---
+        lugares = get_place_index()
+        cat = lugares.category(palabras_usuario)
+        ciudad = lugares.cities.first_match(palabras_usuario)
+        departamento = lugares.departments.first_match(palabras_usuario)
+        departamento_real = lugares.departments.canonical.get(departamento) if departamento else None
 
         # --- Reconocimiento de fechas ---
         hoy = datetime.now().date()
@@ -431,10 +383,13 @@ Si te preguntan algo fuera de ese contexto, responde: 'Solo puedo ayudarte con t
 
 El usuario dice: '{user_message}'
 """
-        return self._call_gemini(prompt)
+        return self._call_gemini(prompt, question=user_message, context="default")
 
-    def _call_gemini(self, prompt):
-        """Método auxiliar para llamar a Gemini"""
+    def _call_gemini(self, prompt, question="", context=None):
+        """
+        Método auxiliar para llamar a Gemini. La respuesta se cachea por
+        ``question`` normalizada y ``context`` (por defecto el prompt completo).
+        """
         try:
             api_key = os.getenv("GEMINI_API_KEY")
             if not api_key:
@@ -443,12 +398,19 @@ El usuario dice: '{user_message}'
                     status=status.HTTP_503_SERVICE_UNAVAILABLE
                 )
             
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            response = model.generate_content(prompt)
+            answer = answer_cache.get_or_compute(
+                answer_key("chat", question, prompt if context is None else context),
+                lambda: generate_answer(api_key, prompt),
+            )
             
-            return Response({"answer": response.text})
-        
+            return Response({"answer": answer})
+
+        except UpstreamBusy:
+            logger.warning("Gemini saturado: mensaje del chatbot rechazado")
+            return Response(
+                {"answer": "El asistente está ocupado. Intenta de nuevo en unos segundos."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         except Exception as e:
             logger.error(f"Error Gemini: {str(e)}")
             return Response(
@@ -3,12 +3,12 @@
 from __future__ import annotations
 
 from rest_framework import status, viewsets
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
 from drf_spectacular.utils import extend_schema
 
+from usuarios.authentication import AccessTokenAuthentication
 from usuarios.permissions import IsAdminGroup
 
 from ..models import TicketType
@@ -20,7 +20,7 @@ class TicketTypeViewSet(viewsets.ModelViewSet):
 
 	queryset = TicketType.objects.all().order_by("ticket_name")
 	serializer_class = TicketTypeSerializer
-	authentication_classes = [TokenAuthentication]
+	authentication_classes = [AccessTokenAuthentication]
 
 	def get_permissions(self):
 		if getattr(self, "action", None) in {"create", "update", "partial_update", "destroy"}:
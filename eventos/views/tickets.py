@@ -1,22 +1,22 @@
 """Vistas relacionadas con tickets: envío, historial y validación."""
 
-from typing import List
 import logging
 
-from django.conf import settings
-from django.core.mail import send_mail
+from django.core.exceptions import ImproperlyConfigured
 from django.shortcuts import get_object_or_404
 from drf_spectacular.types import OpenApiTypes  
 from drf_spectacular.utils import extend_schema, OpenApiTypes
 from rest_framework import generics, status, serializers
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.generics import RetrieveAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from usuarios.authentication import AccessTokenAuthentication
+from usuarios.email_service import queue_email
 from usuarios.permissions import IsStaffOrAdmin
+from usuarios.roles import has_role
 from usuarios.serializers import EmptySerializer, MessageSerializer
 
 from ..models import Ticket, TicketAccessLog
@@ -52,13 +52,13 @@ class TicketDetailAPIView(RetrieveAPIView):
 
     queryset = Ticket.objects.select_related("user", "event", "config_type__ticket_type")
     serializer_class = TicketSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):  # type: ignore[override]
         queryset = super().get_queryset()
         user = self.request.user
-        if user and user.is_authenticated and user.groups.filter(name__in={"Administrador", "Staff"}).exists():
+        if has_role(user, "Administrador", "Staff"):
             return queryset
         return queryset.filter(user=user)
 
@@ -66,7 +66,7 @@ class TicketDetailAPIView(RetrieveAPIView):
         obj = super().get_object()
         user = self.request.user
         if user and user.is_authenticated:
-            if obj.user_id == user.id or user.groups.filter(name__in={"Administrador", "Staff"}).exists():
+            if obj.user_id == user.id or has_role(user, "Administrador", "Staff"):
                 return obj
         raise PermissionDenied("No estás autorizado para consultar este ticket.")
 
@@ -74,7 +74,7 @@ class TicketDetailAPIView(RetrieveAPIView):
 class ResendTicketEmailAPIView(APIView):
     """Permite reenviar por correo el ticket del usuario autenticado."""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -90,33 +90,27 @@ class ResendTicketEmailAPIView(APIView):
         if ticket.user_id != request.user.id:
             raise PermissionDenied("No estás autorizado para reenviar este ticket.")
 
-        qr_base64 = ticket.get_qr_base64() if hasattr(ticket, "get_qr_base64") else None
-        subject = f"Tu ticket para {ticket.event.event_name}"
-        message_lines: List[str] = [
-            f"Hola {ticket.user.first_name or ticket.user.email}",
-            "",
-            "Adjuntamos los detalles de tu ticket:",
-            f"Evento: {ticket.event.event_name}",
-            f"Tipo: {ticket.config_type.ticket_type.ticket_name}",
-            f"Código único: {ticket.unique_code}",
-        ]
-        if qr_base64:
-            message_lines.append(f"QR (base64): {qr_base64}")
-        message_lines.append("\n¡Te esperamos en el evento!")
-
-        send_mail(
-            subject,
-            "\n".join(message_lines),
-            settings.DEFAULT_FROM_EMAIL,
-            [ticket.user.email],
-            fail_silently=False,
-        )
+        try:
+            queue_email(
+                ticket.user.email,
+                f"Tu ticket para {ticket.event.event_name}",
+                "emails/ticket",
+                {
+                    "name": ticket.user.first_name or ticket.user.email,
+                    "event_name": ticket.event.event_name,
+                    "ticket_type": ticket.config_type.ticket_type.ticket_name,
+                    "unique_code": ticket.unique_code,
+                    "qr_base64": ticket.get_qr_base64(),
+                },
+            )
+        except ImproperlyConfigured as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response({"message": "Ticket enviado al correo."}, status=status.HTTP_200_OK)
 
 
 class MyTicketsAPIView(APIView):
     """Lista los tickets pertenecientes al usuario autenticado."""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -134,7 +128,7 @@ class MyTicketsAPIView(APIView):
 class TicketAccessLogListView(generics.ListAPIView):# Devuelve un 200 OK
     """Auditoría de accesos asociados a un ticket."""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
     serializer_class = TicketAccessLogSerializer
 
@@ -146,7 +140,7 @@ class TicketAccessLogListView(generics.ListAPIView):# Devuelve un 200 OK
         ticket_id = self.kwargs.get("ticket_id")
         ticket = get_object_or_404(Ticket.objects.select_related("user"), pk=ticket_id)
         user = self.request.user
-        if not user.groups.filter(name__in={"Administrador", "Staff"}).exists() and ticket.user_id != user.id:
+        if not has_role(user, "Administrador", "Staff") and ticket.user_id != user.id:
             raise PermissionDenied("No puedes consultar el historial de este ticket.")
         return TicketAccessLog.objects.filter(ticket=ticket).select_related("accessed_by").order_by(
             "-access_time"
@@ -156,7 +150,7 @@ class TicketAccessLogListView(generics.ListAPIView):# Devuelve un 200 OK
 class TicketValidationAPIView(APIView):
     """Valida tickets por código único y registra el acceso."""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated, IsStaffOrAdmin]
 
     @extend_schema(
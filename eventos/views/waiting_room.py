@@ -0,0 +1,68 @@
+"""Vistas de la sala de espera virtual para aperturas de venta."""
+
+from __future__ import annotations
+
+from dataclasses import asdict
+
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from usuarios.authentication import AccessTokenAuthentication
+from usuarios.serializers import EmptySerializer
+
+from ..serializers import QueueStatusSerializer
+from ..waiting_room import get_room_settings, join_queue, queue_available, queue_status
+
+
+class WaitingRoomAPIView(APIView):
+    """Entrega turnos de la sala de espera y emite tokens de admisión para comprar."""
+
+    authentication_classes = [AccessTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        tags=["Sala de espera"],
+        operation_id="waiting_room_join",
+        request=EmptySerializer,
+        responses=QueueStatusSerializer,
+    )
+    def post(self, request, pk: int) -> Response:
+        rate = get_room_settings(pk)
+        if not rate:
+            return Response(
+                {"error": "Este evento no usa sala de espera."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not queue_available():
+            return Response(
+                {"error": "La sala de espera no está disponible en este momento."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        queue_token, queue = join_queue(pk, request.user.id, rate)
+        return Response({"queue_token": queue_token, **asdict(queue)}, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        tags=["Sala de espera"],
+        operation_id="waiting_room_status",
+        parameters=[OpenApiParameter("queue_token", str, required=True)],
+        responses=QueueStatusSerializer,
+    )
+    def get(self, request, pk: int) -> Response:
+        rate = get_room_settings(pk)
+        if not rate:
+            return Response(
+                {"error": "Este evento no usa sala de espera."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not queue_available():
+            return Response(
+                {"error": "La sala de espera no está disponible en este momento."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        queue = queue_status(pk, request.user.id, request.query_params.get("queue_token", ""), rate)
+        if queue is None:
+            return Response({"error": "Token de cola inválido."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(asdict(queue), status=status.HTTP_200_OK)
@@ -0,0 +1,154 @@
+"""
+eventos/waiting_room.py
+Sala de espera virtual para aperturas de venta con alta demanda.
+
+El estado de la cola vive en la caché de Django (Redis en producción,
+LocMemCache en local con DEBUG). Sin una caché configurada la sala no
+entrega turnos: con DummyCache los contadores no existen. Cada evento tiene dos contadores:
+``tail`` (último turno entregado) y ``head`` (último turno admitido).
+``head`` avanza como máximo ``per_tick`` turnos por tick; el primer cliente
+que consulta en cada tick gana un ``cache.add`` y hace el avance. Los
+turnos y admisiones viajan como tokens firmados, sin consultas a la base.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+QUEUE_SALT = "eventos.waiting_room.queue"
+ADMISSION_SALT = "eventos.waiting_room.admission"
+ADMISSION_HEADER = "HTTP_X_ADMISSION_TOKEN"
+
+DEFAULT_RATE_PER_MINUTE = 120
+DEFAULT_TICK_SECONDS = 5
+DEFAULT_ADMISSION_TTL = 600
+QUEUE_TTL = 6 * 60 * 60
+ROOM_SETTINGS_TTL = 30
+
+
+@dataclass(frozen=True)
+class QueueStatus:
+    """Posición de un cliente en la cola y, si aplica, su token de admisión."""
+
+    position: int
+    ahead: int
+    admitted: bool
+    admission_token: Optional[str] = None
+    estimated_wait_seconds: int = 0
+
+
+def queue_available() -> bool:
+    """False si la caché está desactivada y no hay dónde llevar los contadores de la cola."""
+    return not settings.CACHES["default"]["BACKEND"].endswith(".DummyCache")
+
+
+def _key(event_id: int, name: str) -> str:
+    return f"waiting_room:{event_id}:{name}"
+
+
+def get_room_settings(event_id: int) -> Optional[int]:
+    """
+    Devuelve la tasa de admisión por minuto del evento, o None si no usa sala de espera.
+    Se cachea unos segundos para que sondear la cola no consulte la base de datos.
+    """
+    from .models import Event
+
+    key = _key(event_id, "rate")
+    rate = cache.get(key)
+    if rate is None:
+        row = Event.objects.filter(pk=event_id).values("waiting_room_enabled", "waiting_room_rate_per_minute").first()
+        if row and row["waiting_room_enabled"]:
+            rate = row["waiting_room_rate_per_minute"] or getattr(
+                settings, "WAITING_ROOM_RATE_PER_MINUTE", DEFAULT_RATE_PER_MINUTE
+            )
+        else:
+            rate = 0
+        cache.set(key, rate, ROOM_SETTINGS_TTL)
+    return rate or None
+
+
+def invalidate_room_settings(event_id: int) -> None:
+    """Descarta la configuración cacheada tras editar el evento."""
+    cache.delete(_key(event_id, "rate"))
+
+
+def _incr(key: str, delta: int = 1) -> int:
+    cache.add(key, 0, QUEUE_TTL)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:  # la llave expiró entre add e incr
+        cache.add(key, 0, QUEUE_TTL)
+        return cache.incr(key, delta)
+
+
+def _advance_head(event_id: int, rate_per_minute: int) -> int:
+    """Admite el siguiente bloque de turnos si nadie lo hizo en el tick actual."""
+    tick = getattr(settings, "WAITING_ROOM_TICK_SECONDS", DEFAULT_TICK_SECONDS)
+    head_key = _key(event_id, "head")
+    if cache.add(_key(event_id, "tick"), 1, tick):
+        per_tick = max(1, math.ceil(rate_per_minute * tick / 60))
+        head = cache.get(head_key, 0)
+        tail = cache.get(_key(event_id, "tail"), 0)
+        if head < tail:
+            return _incr(head_key, min(per_tick, tail - head))
+        return head
+    return cache.get(head_key, 0)
+
+
+def _admission_token(event_id: int, user_id: int) -> str:
+    return signing.dumps({"e": event_id, "u": user_id}, salt=ADMISSION_SALT)
+
+
+def _status(event_id: int, user_id: int, position: int, rate_per_minute: int) -> QueueStatus:
+    head = _advance_head(event_id, rate_per_minute)
+    if position <= head:
+        return QueueStatus(
+            position=position,
+            ahead=0,
+            admitted=True,
+            admission_token=_admission_token(event_id, user_id),
+        )
+    ahead = position - head
+    return QueueStatus(
+        position=position,
+        ahead=ahead,
+        admitted=False,
+        estimated_wait_seconds=math.ceil(ahead * 60 / rate_per_minute),
+    )
+
+
+def join_queue(event_id: int, user_id: int, rate_per_minute: int) -> tuple[str, QueueStatus]:
+    """Entrega un turno nuevo al usuario y devuelve su token de cola y estado."""
+    position = _incr(_key(event_id, "tail"))
+    queue_token = signing.dumps({"e": event_id, "u": user_id, "p": position}, salt=QUEUE_SALT)
+    return queue_token, _status(event_id, user_id, position, rate_per_minute)
+
+
+def queue_status(event_id: int, user_id: int, queue_token: str, rate_per_minute: int) -> Optional[QueueStatus]:
+    """Consulta el turno de un token de cola; None si el token es inválido o ajeno."""
+    try:
+        data = signing.loads(queue_token, salt=QUEUE_SALT, max_age=QUEUE_TTL)
+    except signing.BadSignature:
+        return None
+    if data.get("e") != event_id or data.get("u") != user_id:
+        return None
+    return _status(event_id, user_id, int(data["p"]), rate_per_minute)
+
+
+def has_valid_admission(request, event_id: int) -> bool:
+    """Verifica el token de admisión enviado en la cabecera X-Admission-Token."""
+    token = request.META.get(ADMISSION_HEADER)
+    if not token:
+        return False
+    max_age = getattr(settings, "WAITING_ROOM_ADMISSION_TTL", DEFAULT_ADMISSION_TTL)
+    try:
+        data = signing.loads(token, salt=ADMISSION_SALT, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return data.get("e") == event_id and data.get("u") == request.user.id
@@ -0,0 +1,23 @@
+"""Clases de paginación compartidas por las APIs del proyecto."""
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    """Paginación por número de página; el cliente puede pedir hasta 500 resultados con ``page_size``."""
+
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class HistoryCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) del más reciente al más antiguo.
+    Cada página es un ``WHERE id < cursor`` sobre un índice, sin OFFSET ni COUNT.
+    """
+
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    ordering = "-id"
@@ -64,6 +64,47 @@ PAYU_CONFIRMATION_URL = get_env("PAYU_CONFIRMATION_URL")
 PAYU_RESPONSE_URL = get_env("PAYU_RESPONSE_URL")
 PAYU_SANDBOX = get_env("PAYU_SANDBOX", default=True, cast="bool")
 
+# Minutos que un ticket pendiente retiene inventario mientras se completa el pago
+TICKET_HOLD_MINUTES = get_env("TICKET_HOLD_MINUTES", default=15, cast="int")
+
+# Sala de espera virtual: compradores admitidos por minuto, tick de avance y vigencia de la admisión
+WAITING_ROOM_RATE_PER_MINUTE = get_env("WAITING_ROOM_RATE_PER_MINUTE", default=120, cast="int")
+WAITING_ROOM_TICK_SECONDS = get_env("WAITING_ROOM_TICK_SECONDS", default=5, cast="int")
+WAITING_ROOM_ADMISSION_TTL = get_env("WAITING_ROOM_ADMISSION_TTL", default=600, cast="int")
+
+# Horas que se conserva la respuesta asociada a una cabecera Idempotency-Key
+IDEMPOTENCY_KEY_TTL_HOURS = get_env("IDEMPOTENCY_KEY_TTL_HOURS", default=24, cast="int")
+# Segundos que una petición en curso retiene su llave; después otra petición puede tomarla
+IDEMPOTENCY_KEY_LEASE_SECONDS = get_env("IDEMPOTENCY_KEY_LEASE_SECONDS", default=60, cast="int")
+
+# Notificaciones de PayU: True solo las guarda en la bandeja y exige un proceso aparte con
+# ``python manage.py process_payment_inbox --loop``; False las aplica dentro de la petición
+PAYU_NOTIFICATIONS_INBOX = get_env("PAYU_NOTIFICATIONS_INBOX", default=False, cast="bool")
+PAYU_INBOX_MAX_ATTEMPTS = get_env("PAYU_INBOX_MAX_ATTEMPTS", default=5, cast="int")
+# Conciliación: usuario de la API de reportes y cliente de estado (ruta importable)
+PAYU_API_LOGIN = get_env("PAYU_API_LOGIN")
+PAYU_STATUS_CLIENT = get_env("PAYU_STATUS_CLIENT", default="payments.gateway.PayUStatusClient")
+
+# Segundos que se cachean los grupos (roles) de un usuario
+USER_ROLES_CACHE_SECONDS = get_env("USER_ROLES_CACHE_SECONDS", default=60, cast="int")
+
+# Vigencia en segundos del token de acceso firmado (Authorization: Bearer)
+ACCESS_TOKEN_SECONDS = get_env("ACCESS_TOKEN_SECONDS", default=300, cast="int")
+
+# Cancelación masiva de eventos: por defecto la procesa un proceso aparte con
+# ``python manage.py process_cancellation_jobs --loop``; True la corre en un hilo del
+# proceso web al confirmar (solo para desarrollo: el hilo muere con el worker de gunicorn)
+EVENT_CANCELLATION_RUN_IN_THREAD = get_env("EVENT_CANCELLATION_RUN_IN_THREAD", default=False, cast="bool")
+
+# Caché de respuestas de Gemini: vigencia (s), entradas por proceso y espera máxima por una llamada en curso (s)
+AI_ANSWER_CACHE_SECONDS = get_env("AI_ANSWER_CACHE_SECONDS", default=3600, cast="int")
+AI_ANSWER_CACHE_MAX_ENTRIES = get_env("AI_ANSWER_CACHE_MAX_ENTRIES", default=1000, cast="int")
+AI_ANSWER_LOCK_SECONDS = get_env("AI_ANSWER_LOCK_SECONDS", default=30, cast="int")
+
+# Llamadas a Gemini abiertas a la vez por proceso y segundos de espera (por cupo y por respuesta)
+AI_UPSTREAM_CONCURRENCY = get_env("AI_UPSTREAM_CONCURRENCY", default=8, cast="int")
+AI_UPSTREAM_TIMEOUT = get_env("AI_UPSTREAM_TIMEOUT", default=20, cast="int")
+
 
 # Configuración de email para recuperación y validación
 EMAIL_BACKEND = get_env("EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend")
@@ -72,6 +113,13 @@ EMAIL_PORT = get_env("EMAIL_PORT", default=587, cast="int")
 EMAIL_USE_TLS = get_env("EMAIL_USE_TLS", default=True, cast="bool")
 EMAIL_HOST_USER = get_env("EMAIL_HOST_USER", default="")
 EMAIL_HOST_PASSWORD = get_env("EMAIL_HOST_PASSWORD", default="")
+# Outbox de correos: True solo los encola y exige un proceso aparte con
+# ``python manage.py send_queued_emails --loop``; False los envía al confirmar la transacción
+EMAIL_OUTBOX_ENABLED = get_env("EMAIL_OUTBOX_ENABLED", default=False, cast="bool")
+# Intentos máximos, espera base (segundos) entre reintentos y segundos que un lote queda reclamado
+EMAIL_OUTBOX_LEASE_SECONDS = get_env("EMAIL_OUTBOX_LEASE_SECONDS", default=300, cast="int")
+EMAIL_OUTBOX_MAX_ATTEMPTS = get_env("EMAIL_OUTBOX_MAX_ATTEMPTS", default=5, cast="int")
+EMAIL_OUTBOX_RETRY_SECONDS = get_env("EMAIL_OUTBOX_RETRY_SECONDS", default=60, cast="int")
 
 # Logging básico para actividad y errores
 LOG_DIR = BASE_DIR / "logs"
@@ -170,6 +218,8 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-admission-token',
+    'idempotency-key',
 ]
 
 CSRF_TRUSTED_ORIGINS = [
@@ -200,7 +250,7 @@ WSGI_APPLICATION = "gestify.wsgi.application"
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "usuarios.authentication.AccessTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -216,6 +266,17 @@ DATABASES = {
     "default": env.db(default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
 }
 
+# Caché compartida entre procesos (roles, sala de espera, respuestas de IA).
+# En producción: CACHE_URL=redis://host:6379/1. Sin CACHE_URL se usa LocMemCache solo con
+# DEBUG; fuera de DEBUG la caché queda desactivada para que cada worker no sirva roles ni
+# turnos distintos, y la sala de espera responde 503 hasta configurar CACHE_URL.
+if get_env("CACHE_URL"):
+    CACHES = {"default": env.cache("CACHE_URL")}
+elif DEBUG:
+    CACHES = {"default": env.cache_url_config("locmemcache://")}
+else:
+    CACHES = {"default": env.cache_url_config("dummycache://")}
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Mi API',
     'DESCRIPTION': 'Documentación de mi API con Swagger y DRF',
@@ -0,0 +1,181 @@
+"""
+payments/gateway.py
+Clientes para consultar el estado de un pago directamente en la pasarela.
+
+La conciliación usa el cliente configurado en ``PAYU_STATUS_CLIENT`` (ruta
+importable). ``PayUStatusClient`` consulta la API de reportes de PayU;
+``FakeStatusClient`` responde en memoria para pruebas y desarrollo local.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Iterable, Mapping, Optional
+
+import httpx
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .services import _get_config_value, get_payu_config
+
+DEFAULT_STATUS_CLIENT = "payments.gateway.PayUStatusClient"
+DEFAULT_RECONCILE_CONCURRENCY = 10
+
+PAYU_REPORTS_URL = "https://api.payulatam.com/reports-api/4.0/service.cgi"
+PAYU_SANDBOX_REPORTS_URL = "https://sandbox.api.payulatam.com/reports-api/4.0/service.cgi"
+
+# Estado de la transacción en la API de reportes -> state_pol de las notificaciones
+PAYU_REPORT_STATES = {
+    "APPROVED": "4",
+    "EXPIRED": "5",
+    "DECLINED": "6",
+    "PENDING": "7",
+    "ERROR": "104",
+}
+
+
+@dataclass(frozen=True)
+class GatewayStatus:
+    """Estado de una referencia según la pasarela, con los campos de una notificación."""
+
+    reference_code: str
+    state_pol: str
+    transaction_id: Optional[str] = None
+    amount: Optional[Decimal] = None
+    currency: Optional[str] = None
+
+    def as_notification(self) -> Dict[str, object]:
+        """Payload equivalente al que enviaría PayU en su confirmación."""
+        payload = {"reference_sale": self.reference_code, "state_pol": self.state_pol}
+        if self.transaction_id:
+            payload["transaction_id"] = self.transaction_id
+        if self.amount is not None:
+            payload["value"] = str(self.amount)
+        if self.currency:
+            payload["currency"] = self.currency
+        return payload
+
+
+class PaymentStatusClient(ABC):
+    """Interfaz de los clientes de estado; ``fetch_status`` devuelve None si la pasarela no conoce la referencia."""
+
+    @abstractmethod
+    async def fetch_status(self, reference_code: str) -> Optional[GatewayStatus]:
+        """Estado de ``reference_code`` en la pasarela."""
+
+    async def aclose(self) -> None:
+        """Libera conexiones abiertas por el cliente."""
+
+
+class PayUStatusClient(PaymentStatusClient):
+    """Consulta ``ORDER_DETAIL_BY_REFERENCE_CODE`` en la API de reportes de PayU."""
+
+    def __init__(self, timeout: float = 10.0):
+        config = get_payu_config()
+        api_login = _get_config_value("PAYU_API_LOGIN", "PAYU_API_LOGIN")
+        if not api_login:
+            raise ImproperlyConfigured("Falta la configuración requerida 'PAYU_API_LOGIN' para consultar PayU")
+        self.merchant = {"apiLogin": api_login, "apiKey": config["api_key"]}
+        self.test = bool(config["sandbox"])
+        self.url = PAYU_SANDBOX_REPORTS_URL if self.test else PAYU_REPORTS_URL
+        self.client = httpx.AsyncClient(timeout=timeout, headers={"Accept": "application/json"})
+
+    async def fetch_status(self, reference_code: str) -> Optional[GatewayStatus]:
+        response = await self.client.post(
+            self.url,
+            json={
+                "test": self.test,
+                "language": "es",
+                "command": "ORDER_DETAIL_BY_REFERENCE_CODE",
+                "merchant": self.merchant,
+                "details": {"referenceCode": reference_code},
+            },
+        )
+        response.raise_for_status()
+        body = response.json()
+        if body.get("code") != "SUCCESS":
+            raise RuntimeError(f"PayU respondió {body.get('code')}: {body.get('error')}")
+        orders = (body.get("result") or {}).get("payload") or []
+        transactions = [tx for order in orders for tx in order.get("transactions") or []]
+        if not transactions:
+            return None
+        # Si algún intento quedó aprobado prevalece; si no, el último reportado
+        states = [(tx.get("transactionResponse") or {}).get("state") for tx in transactions]
+        chosen = transactions[states.index("APPROVED")] if "APPROVED" in states else transactions[-1]
+        state = (chosen.get("transactionResponse") or {}).get("state")
+        if state not in PAYU_REPORT_STATES:
+            return None
+        tx_value = (chosen.get("additionalValues") or {}).get("TX_VALUE") or {}
+        return GatewayStatus(
+            reference_code=reference_code,
+            state_pol=PAYU_REPORT_STATES[state],
+            transaction_id=chosen.get("id"),
+            amount=Decimal(str(tx_value["value"])) if tx_value.get("value") is not None else None,
+            currency=tx_value.get("currency"),
+        )
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class FakeStatusClient(PaymentStatusClient):
+    """
+    Cliente en memoria: responde ``states[referencia]`` o ``default_state``
+    tras ``delay`` segundos. Por defecto las referencias no listadas son
+    desconocidas (None), para no aprobar pagos que nadie configuró.
+    """
+
+    def __init__(
+        self,
+        states: Optional[Mapping[str, str]] = None,
+        default_state: Optional[str] = None,
+        delay: float = 0.0,
+    ):
+        self.states = dict(states or {})
+        self.default_state = default_state
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch_status(self, reference_code: str) -> Optional[GatewayStatus]:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        state = self.states.get(reference_code, self.default_state)
+        if state is None:
+            return None
+        return GatewayStatus(reference_code=reference_code, state_pol=state, transaction_id=f"fake-{reference_code}")
+
+
+def get_status_client_class() -> type:
+    """Clase configurada en PAYU_STATUS_CLIENT."""
+    return import_string(getattr(settings, "PAYU_STATUS_CLIENT", DEFAULT_STATUS_CLIENT))
+
+
+def get_status_client(**kwargs) -> PaymentStatusClient:
+    """Instancia el cliente de estado configurado en PAYU_STATUS_CLIENT."""
+    return get_status_client_class()(**kwargs)
+
+
+async def fetch_statuses(
+    client: PaymentStatusClient,
+    references: Iterable[str],
+    concurrency: int = DEFAULT_RECONCILE_CONCURRENCY,
+) -> Dict[str, object]:
+    """
+    Consulta varias referencias en paralelo, con a lo sumo ``concurrency`` peticiones abiertas.
+    Cada referencia queda con su ``GatewayStatus``, None o la excepción que produjo.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(reference: str):
+        async with semaphore:
+            try:
+                return reference, await client.fetch_status(reference)
+            except Exception as exc:  # noqa: BLE001 - se informa por referencia
+                return reference, exc
+
+    return dict(await asyncio.gather(*(fetch(reference) for reference in references)))
@@ -0,0 +1,161 @@
+"""
+payments/idempotency.py
+Soporte para la cabecera Idempotency-Key en endpoints de compra y pago.
+
+La primera petición con una llave reserva una fila en ``IdempotencyKey`` y,
+al terminar, guarda su respuesta. Los reintentos con la misma llave reciben
+esa respuesta sin ejecutar de nuevo la vista. Las llaves vencen tras
+IDEMPOTENCY_KEY_TTL_HOURS y se purgan con ``purge_idempotency_keys``.
+
+Mientras la petición original está en curso, ``expires_at`` es el fin de su
+turno (IDEMPOTENCY_KEY_LEASE_SECONDS): si el proceso murió sin responder,
+al vencer el turno otra petición con la misma llave lo toma. Ese valor sirve
+también de ficha: la petición original solo guarda su respuesta si sigue
+siendo la dueña. Se guardan las respuestas 2xx y los 4xx deterministas; los
+5xx, los 4xx transitorios y las respuestas marcadas con ``do_not_replay``
+liberan la llave para que el cliente reintente.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+DEFAULT_TTL_HOURS = 24
+DEFAULT_LEASE_SECONDS = 60
+# Rechazos que se repetirían igual con el mismo cuerpo; 408, 409 y 429 son transitorios
+REPLAYABLE_CLIENT_ERRORS = {400, 401, 403, 404, 405, 410, 422}
+DEFAULT_PURGE_BATCH_SIZE = 1000
+
+IDEMPOTENCY_PARAMETER = OpenApiParameter(
+    name=IDEMPOTENCY_HEADER,
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.HEADER,
+    required=False,
+    description="Llave única por intento de compra; los reintentos con la misma llave devuelven la primera respuesta.",
+)
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def _request_hash(request) -> str:
+    return _digest(json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder))
+
+
+def do_not_replay(response):
+    """Marca una respuesta para no guardarla, p. ej. la de un error inesperado atrapado por la vista."""
+    response.idempotent_replay = False
+    return response
+
+
+def _replayable(response) -> bool:
+    if not getattr(response, "idempotent_replay", True):
+        return False
+    return 200 <= response.status_code < 300 or response.status_code in REPLAYABLE_CLIENT_ERRORS
+
+
+def _stored_body(response):
+    """Cuerpo tal como lo serializa DRF, para que la repetición sea idéntica (p. ej. microsegundos)."""
+    data = getattr(response, "data", None)
+    return None if data is None else json.loads(json.dumps(data, cls=JSONEncoder))
+
+
+def idempotent(view_method):
+    """
+    Decora un método de APIView para respetar la cabecera Idempotency-Key.
+    Sin cabecera la vista se ejecuta normalmente. Las respuestas 5xx no se
+    guardan, para que el cliente pueda reintentar con la misma llave.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"La cabecera {IDEMPOTENCY_HEADER} admite máximo {MAX_KEY_LENGTH} caracteres."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        key_hash = _digest(str(request.user.pk), request.method, request.path, key)
+        request_hash = _request_hash(request)
+        now = timezone.now()
+        ttl = timedelta(hours=getattr(settings, "IDEMPOTENCY_KEY_TTL_HOURS", DEFAULT_TTL_HOURS))
+        leased_until = now + timedelta(seconds=getattr(settings, "IDEMPOTENCY_KEY_LEASE_SECONDS", DEFAULT_LEASE_SECONDS))
+
+        # Una llave vencida (o un turno abandonado) se trata como nueva
+        IdempotencyKey.objects.filter(key_hash=key_hash, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key_hash=key_hash, request_hash=request_hash, expires_at=leased_until)
+        except IntegrityError:
+            stored = IdempotencyKey.objects.filter(key_hash=key_hash).first()
+            if stored is None:
+                return Response(
+                    {"error": "La petición original acaba de terminar con error. Reintenta."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            if stored.request_hash != request_hash:
+                return Response(
+                    {"error": f"La cabecera {IDEMPOTENCY_HEADER} ya se usó con un cuerpo distinto."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if stored.status_code is None:
+                return Response(
+                    {"error": "La petición original sigue en proceso. Reintenta en unos segundos."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return Response(stored.response_body, status=stored.status_code, headers={"Idempotent-Replayed": "true"})
+
+        # Solo la dueña del turno puede guardar o liberar la llave
+        owned = IdempotencyKey.objects.filter(key_hash=key_hash, status_code__isnull=True, expires_at=leased_until)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            owned.delete()
+            raise
+
+        if not _replayable(response):
+            owned.delete()
+        elif not owned.update(
+            status_code=response.status_code,
+            response_body=_stored_body(response),
+            expires_at=timezone.now() + ttl,
+        ):
+            logger.warning("Llave de idempotencia tomada por otra petición antes de guardar la respuesta")
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(*, batch_size: int = DEFAULT_PURGE_BATCH_SIZE) -> int:
+    """Elimina por lotes las llaves vencidas y devuelve cuántas se borraron."""
+    now = timezone.now()
+    deleted = 0
+    while True:
+        batch = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list("key_hash", flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(key_hash__in=batch).delete()[0]
@@ -0,0 +1,99 @@
+"""
+payments/inbox.py
+Bandeja de entrada de notificaciones de PayU.
+
+El webhook valida la firma, guarda la notificación con un único INSERT y
+responde de inmediato; ``process_inbox_batch`` (comando
+``process_payment_inbox``) la aplica después con ``process_payu_notification``.
+Las filas de una misma referencia se procesan en orden de llegada: si otra
+ejecución tiene bloqueada una fila anterior de la referencia, o una falla y
+se reintentará, las siguientes esperan al próximo lote.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Mapping
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import PaymentInbox
+from .services import get_payu_config, process_payu_notification
+
+logger = logging.getLogger("payments")
+
+DEFAULT_INBOX_BATCH_SIZE = 100
+DEFAULT_INBOX_MAX_ATTEMPTS = 5
+
+
+def receive_notification(payload: Mapping[str, object], source: str) -> PaymentInbox:
+    """Guarda una notificación ya validada para procesarla fuera de la petición."""
+    if hasattr(payload, "dict"):
+        # Las confirmaciones de PayU llegan como formulario (QueryDict)
+        payload = payload.dict()
+    return PaymentInbox.objects.create(
+        reference_code=str(payload["reference_sale"])[:64],
+        source=source,
+        payload=dict(payload),
+    )
+
+
+def process_inbox_batch(batch_size: int = DEFAULT_INBOX_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Procesa un lote de notificaciones pendientes en orden de llegada.
+    Los fallos se reintentan en lotes siguientes hasta PAYU_INBOX_MAX_ATTEMPTS.
+    """
+    max_attempts = getattr(settings, "PAYU_INBOX_MAX_ATTEMPTS", DEFAULT_INBOX_MAX_ATTEMPTS)
+    result = {"processed": 0, "retried": 0, "failed": 0, "deferred": 0}
+    with transaction.atomic():
+        entries = list(
+            PaymentInbox.objects.select_for_update(skip_locked=True)
+            .filter(status=PaymentInbox.Status.PENDIENTE)
+            .order_by("id")[:batch_size]
+        )
+        if not entries:
+            return result
+
+        # Fila pendiente más antigua de cada referencia que quedó fuera del lote
+        earliest_outside = dict(
+            PaymentInbox.objects.filter(
+                status=PaymentInbox.Status.PENDIENTE,
+                reference_code__in={entry.reference_code for entry in entries},
+            )
+            .exclude(id__in=[entry.id for entry in entries])
+            .values("reference_code")
+            .annotate(first_id=Min("id"))
+            .values_list("reference_code", "first_id")
+        )
+
+        config = get_payu_config()
+        blocked = set()
+        for entry in entries:
+            reference = entry.reference_code
+            if reference in blocked or entry.id > earliest_outside.get(reference, entry.id):
+                blocked.add(reference)
+                result["deferred"] += 1
+                continue
+            entry.attempts += 1
+            try:
+                with transaction.atomic():
+                    process_payu_notification(entry.payload, config)
+            except Exception as exc:  # noqa: BLE001 - se registra y reintenta
+                logger.warning("Error procesando notificación %s de %s: %s", entry.pk, reference, exc)
+                entry.last_error = str(exc)[:1000]
+                if entry.attempts >= max_attempts:
+                    entry.status = PaymentInbox.Status.FALLIDO
+                    result["failed"] += 1
+                else:
+                    blocked.add(reference)
+                    result["retried"] += 1
+            else:
+                entry.status = PaymentInbox.Status.PROCESADO
+                entry.processed_at = timezone.now()
+                entry.last_error = ""
+                result["processed"] += 1
+        PaymentInbox.objects.bulk_update(entries, ["status", "attempts", "last_error", "processed_at"])
+    return result
@@ -0,0 +1,106 @@
+"""
+payments/ledger.py
+Libro de cambios de estado de pagos y agregados de ingresos.
+
+Cada cambio de estado de una ``PaymentTransaction`` inserta una fila en
+``PaymentLedgerEntry`` y, en la misma transacción, suma su efecto sobre el
+ingreso aprobado a ``DailyRevenue`` y ``EventRevenue`` con UPDATE ... F().
+Los reportes leen solo esos agregados, cuyo tamaño depende de días y
+eventos y no del número de transacciones.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DailyRevenue, EventRevenue, PaymentLedgerEntry, PaymentTransaction
+
+APPROVED_STATUS = "aprobado"
+
+
+def build_entry(
+    payment: PaymentTransaction,
+    *,
+    from_status: str,
+    from_amount: Decimal,
+    event_id: Optional[int] = None,
+) -> Optional[PaymentLedgerEntry]:
+    """Fila del libro para el estado actual de ``payment``; None si no cambió nada relevante."""
+    was_approved = from_status == APPROVED_STATUS
+    is_approved = payment.status == APPROVED_STATUS
+    revenue_delta = (payment.amount if is_approved else Decimal("0")) - (from_amount if was_approved else Decimal("0"))
+    if from_status == payment.status and not revenue_delta:
+        return None
+    return PaymentLedgerEntry(
+        payment_id=payment.pk,
+        reference_code=payment.reference_code,
+        event_id=event_id,
+        from_status=from_status or "",
+        to_status=payment.status,
+        amount=payment.amount,
+        currency=payment.currency,
+        revenue_delta=revenue_delta,
+        approved_delta=int(is_approved) - int(was_approved),
+    )
+
+
+def record_transition(
+    payment: PaymentTransaction,
+    *,
+    from_status: str,
+    from_amount: Decimal,
+    event_id: Optional[int] = None,
+) -> Optional[PaymentLedgerEntry]:
+    """Registra el cambio de ``payment`` desde ``from_status``; debe llamarse dentro de la transacción del cambio."""
+    entry = build_entry(payment, from_status=from_status, from_amount=from_amount, event_id=event_id)
+    if entry is not None:
+        record_entries([entry])
+    return entry
+
+
+def record_entries(entries: Iterable[PaymentLedgerEntry]) -> List[PaymentLedgerEntry]:
+    """Inserta las filas con un ``bulk_create`` y aplica su efecto agregado a los acumulados."""
+    entries = list(entries)
+    if not entries:
+        return entries
+    now = timezone.now()
+    for entry in entries:
+        entry.created_at = entry.created_at or now
+    PaymentLedgerEntry.objects.bulk_create(entries)
+
+    daily: Dict[Tuple, List] = defaultdict(lambda: [Decimal("0"), 0])
+    per_event: Dict[Tuple, List] = defaultdict(lambda: [Decimal("0"), 0])
+    for entry in entries:
+        if not entry.revenue_delta and not entry.approved_delta:
+            continue
+        targets = [daily[(timezone.localdate(entry.created_at), entry.currency)]]
+        if entry.event_id is not None:
+            targets.append(per_event[(entry.event_id, entry.currency)])
+        for totals in targets:
+            totals[0] += entry.revenue_delta
+            totals[1] += entry.approved_delta
+
+    for (day, currency), (revenue, count) in daily.items():
+        _bump(DailyRevenue, {"day": day, "currency": currency}, revenue, count)
+    for (event_id, currency), (revenue, count) in per_event.items():
+        _bump(EventRevenue, {"event_id": event_id, "currency": currency}, revenue, count)
+    return entries
+
+
+def _bump(model, lookup: Dict[str, object], revenue: Decimal, count: int) -> None:
+    """Suma al acumulado con un UPDATE atómico, creando la fila la primera vez."""
+    changes = {"revenue": F("revenue") + revenue, "approved_count": F("approved_count") + count}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, revenue=revenue, approved_count=count)
+    except IntegrityError:
+        # Otra transacción creó la fila entre el UPDATE y el INSERT
+        model.objects.filter(**lookup).update(**changes)
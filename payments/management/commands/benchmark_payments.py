@@ -0,0 +1,319 @@
+"""
+Benchmark de extremo a extremo del flujo compra -> pago -> confirmación.
+
+Siembra un evento de pago y usuarios con token, levanta la API en un
+servidor WSGI dentro del proceso y el simulador de PayU apuntando a su
+endpoint de confirmación. Cada flujo compra un ticket (BuyTicketAPIView),
+envía el formulario de pago al simulador y termina cuando la transacción
+llega a un estado final. Si las notificaciones van a la bandeja
+(PAYU_NOTIFICATIONS_INBOX), un hilo del mismo proceso la procesa.
+Reporta rendimiento, latencias p50/p95/p99 por etapa y verifica que
+tickets, aforo y acumulados de ingresos coincidan con los pagos aprobados.
+
+Como ``loadtest_purchases``, solo corre con DEBUG, contra SQLite o una
+base ``test_*`` salvo con ``--i-know``; los pagos y el libro de pagos
+generados se conservan. Requiere PostgreSQL para cifras válidas: en SQLite
+las confirmaciones concurrentes fallan con "database is locked" y, agotados
+los reintentos del simulador (``--retries``), quedan pagos sin estado final.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+from urllib import error, parse, request as urlrequest
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import Sum
+
+from eventos.management.commands.loadtest_purchases import _percentile, _QuietHandler, _QuietServer, check_database
+from eventos.models import Event, Ticket, TicketStatusChoices, TicketType, TicketTypeEvent
+from payments.inbox import process_inbox_batch
+from payments.models import EventRevenue, PaymentTransaction
+from payments.services import FINAL_PAYMENT_STATUSES, get_payu_config
+from payments.simulator import PayUSimulator, add_scenario_arguments, scenario_from_options
+from usuarios.authentication import issue_access_token
+from usuarios.models import CustomUser
+
+POLL_SECONDS = 0.02
+
+
+def _post(url: str, data: bytes, headers: Dict[str, str], timeout: float) -> Tuple[Optional[int], dict]:
+    req = urlrequest.Request(url, data=data, method="POST", headers=headers)
+    try:
+        with urlrequest.urlopen(req, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"{}")
+    except error.HTTPError as exc:
+        return exc.code, {}
+    except (error.URLError, OSError, ValueError):
+        return None, {}
+
+
+class Command(BaseCommand):
+    help = "Mide compra, pago y confirmación de extremo a extremo contra un simulador local de PayU."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flows", type=int, default=500, help="Flujos completos a ejecutar.")
+        parser.add_argument("--concurrency", type=int, default=20, help="Flujos en paralelo.")
+        parser.add_argument("--price", type=Decimal, default=Decimal("50000"), help="Precio del ticket sembrado.")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Espera máxima por las confirmaciones (s).")
+        parser.add_argument("--keep", action="store_true", help="Conserva el evento y usuarios sembrados.")
+        parser.add_argument(
+            "--i-know",
+            action="store_true",
+            help="Permite correr contra una base que no es local ni de pruebas.",
+        )
+        add_scenario_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options["flows"] <= 0 or options["concurrency"] <= 0 or options["price"] <= 0:
+            raise CommandError("--flows, --concurrency y --price deben ser positivos.")
+        try:
+            scenario = scenario_from_options(options)
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+        config = get_payu_config()
+        check_database(options["i_know"])
+        if connection.vendor == "sqlite" and options["concurrency"] > 1:
+            self.stdout.write(
+                self.style.WARNING(
+                    "SQLite serializa las escrituras: habrá confirmaciones con 'database is locked' y pagos "
+                    "sin estado final. Usa PostgreSQL para medir."
+                )
+            )
+
+        run_id = uuid.uuid4().hex[:8]
+        event, config_type, users, ticket_type_created = self._seed(run_id, options)
+        try:
+            self._run(event, config_type, users, scenario, config, options)
+        finally:
+            if not options["keep"]:
+                event.delete()
+                CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+                if ticket_type_created:
+                    TicketType.objects.filter(pk=config_type.ticket_type_id, tickettypeevent__isnull=True).delete()
+
+    def _run(self, event, config_type, users, scenario, config, options) -> None:
+        tokens = [issue_access_token(user)[0] for user in users]
+        server = _QuietServer(("127.0.0.1", 0), _QuietHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        simulator = PayUSimulator(
+            config["api_key"],
+            config["merchant_id"],
+            scenario,
+            callback_url=f"{base_url}/api/payments/payu/confirmation/",
+        ).start()
+
+        stop = threading.Event()
+        worker = None
+        if getattr(settings, "PAYU_NOTIFICATIONS_INBOX", False):
+            worker = threading.Thread(target=self._inbox_worker, args=(stop,), daemon=True)
+            worker.start()
+
+        started_at: Dict[str, float] = {}
+        finished_at: Dict[str, Tuple[float, str]] = {}
+        lock = threading.Lock()
+        poller = threading.Thread(target=self._poll, args=(stop, started_at, finished_at, lock), daemon=True)
+        poller.start()
+
+        buy_url = f"{base_url}/api/events/{event.id}/buy/"
+        buy_body = json.dumps({"config_type_id": config_type.id, "amount": 1}).encode("utf-8")
+        self.stdout.write(
+            f"Ejecutando {options['flows']} flujos con {options['concurrency']} hilos "
+            f"(API {base_url}, simulador {simulator.url})..."
+        )
+
+        def flow(token: str) -> Tuple[str, Optional[float], Optional[float]]:
+            begin = time.perf_counter()
+            code, body = _post(
+                buy_url,
+                buy_body,
+                {"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+                options["timeout"],
+            )
+            if code not in (200, 201) or not body.get("payment"):
+                return f"compra {code}", None, None
+            bought = time.perf_counter()
+            form = body["payment"]
+            with lock:
+                started_at[form["referenceCode"]] = begin
+            code, _ = _post(
+                simulator.url,
+                parse.urlencode({key: str(value) for key, value in form.items()}).encode("utf-8"),
+                {"Content-Type": "application/x-www-form-urlencoded"},
+                options["timeout"],
+            )
+            if code != 200:
+                with lock:
+                    started_at.pop(form["referenceCode"], None)
+                return f"pago {code}", bought - begin, None
+            return "enviado", bought - begin, time.perf_counter() - bought
+
+        # Los rechazos esperados (aforo, firmas) y los 5xx ya cuentan en el reporte;
+        # sus trazas no se registran una a una
+        logging.disable(logging.CRITICAL)
+        began = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                results = list(executor.map(flow, tokens))
+            deadline = time.perf_counter() + options["timeout"]
+            while time.perf_counter() < deadline:
+                with lock:
+                    if len(finished_at) >= len(started_at):
+                        break
+                time.sleep(POLL_SECONDS)
+            # Deja llegar duplicados y "pendientes" atrasados antes de verificar
+            while simulator.pending_callbacks() and time.perf_counter() < deadline:
+                time.sleep(POLL_SECONDS)
+            time.sleep(scenario.max_delay)
+        finally:
+            stop.set()
+            simulator.stop()
+            server.shutdown()
+            server.server_close()
+            poller.join()
+            if worker is not None:
+                worker.join()
+            logging.disable(logging.NOTSET)
+
+        self._report(results, started_at, finished_at, began, simulator.stats)
+        self._verify(event, config_type, list(started_at))
+
+    def _seed(self, run_id: str, options) -> Tuple[Event, TicketTypeEvent, List[CustomUser], bool]:
+        event = Event.objects.create(
+            event_name=f"Benchmark de pagos {run_id}",
+            description="Evento sembrado por benchmark_payments.",
+            status="activo",
+        )
+        ticket_type, ticket_type_created = TicketType.objects.get_or_create(ticket_name="Benchmark de pagos")
+        config_type = TicketTypeEvent.objects.create(
+            event=event,
+            ticket_type=ticket_type,
+            price=options["price"],
+            maximun_capacity=options["flows"],
+        )
+        users = CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    username=f"paybench-{run_id}-{index}",
+                    email=f"paybench-{run_id}-{index}@example.com",
+                    first_name="Pago",
+                    last_name=str(index),
+                    password="!",
+                )
+                for index in range(options["flows"])
+            ]
+        )
+        if any(user.pk is None for user in users):
+            users = list(CustomUser.objects.filter(username__startswith=f"paybench-{run_id}-"))
+        return event, config_type, users, ticket_type_created
+
+    @staticmethod
+    def _inbox_worker(stop: threading.Event) -> None:
+        try:
+            while not stop.is_set():
+                try:
+                    result = process_inbox_batch()
+                except OperationalError:
+                    # SQLite bloqueada por escrituras concurrentes; se reintenta el lote
+                    close_old_connections()
+                    time.sleep(POLL_SECONDS)
+                    continue
+                if result["processed"] + result["failed"] == 0:
+                    time.sleep(POLL_SECONDS)
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def _poll(stop: threading.Event, started_at, finished_at, lock) -> None:
+        """Marca el instante en que cada referencia llega a un estado final."""
+        try:
+            while not stop.is_set():
+                with lock:
+                    waiting = [reference for reference in started_at if reference not in finished_at]
+                if waiting:
+                    try:
+                        rows = list(
+                            PaymentTransaction.objects.filter(
+                                reference_code__in=waiting, status__in=FINAL_PAYMENT_STATUSES
+                            ).values_list("reference_code", "status")
+                        )
+                    except OperationalError:
+                        rows = []
+                    now = time.perf_counter()
+                    with lock:
+                        for reference, payment_status in rows:
+                            finished_at.setdefault(reference, (now, payment_status))
+                time.sleep(POLL_SECONDS)
+        finally:
+            close_old_connections()
+
+    def _report(self, results, started_at, finished_at, began: float, simulator_stats: Counter) -> None:
+        buy = sorted(latency for _, latency, _ in results if latency is not None)
+        pay = sorted(latency for _, _, latency in results if latency is not None)
+        end_to_end = sorted(finished_at[ref][0] - started_at[ref] for ref in started_at if ref in finished_at)
+        last = max((finished for finished, _ in finished_at.values()), default=began)
+        elapsed = max(last - began, 1e-9)
+
+        def line(label: str, values: List[float]) -> str:
+            return f"{label} p50/p95/p99: " + " / ".join(
+                f"{_percentile(values, p) * 1000:.1f} ms" for p in (50, 95, 99)
+            )
+
+        self.stdout.write(
+            f"Flujos terminados: {len(end_to_end)}/{len(results)} en {elapsed:.2f} s; "
+            f"rendimiento: {len(end_to_end) / elapsed:.1f} flujos/s"
+        )
+        if len(end_to_end) < len(started_at):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{len(started_at) - len(end_to_end)} pagos sin estado final al terminar la espera "
+                    "(ver callbacks_failed del simulador)."
+                )
+            )
+        self.stdout.write(line("Compra", buy))
+        self.stdout.write(line("Checkout en simulador", pay))
+        self.stdout.write(line("Extremo a extremo", end_to_end))
+        outcomes = Counter(result for result, _, _ in results)
+        outcomes.update(payment_status for _, payment_status in finished_at.values())
+        self.stdout.write("Resultados: " + ", ".join(f"{key}: {value}" for key, value in sorted(outcomes.items())))
+        self.stdout.write("Simulador: " + ", ".join(f"{key}: {value}" for key, value in sorted(simulator_stats.items())))
+
+    def _verify(self, event: Event, config_type: TicketTypeEvent, references: List[str]) -> None:
+        payments = PaymentTransaction.objects.filter(reference_code__in=references)
+        approved = payments.filter(status="aprobado")
+        approved_count = approved.count()
+        approved_total = approved.aggregate(total=Sum("amount"))["total"] or Decimal("0")
+        sold = (
+            Ticket.objects.filter(config_type=config_type, status=TicketStatusChoices.COMPRADA)
+            .aggregate(total=Sum("amount"))["total"]
+            or 0
+        )
+        counters = TicketTypeEvent.objects.with_inventory().get(pk=config_type.pk)
+        rollup = EventRevenue.objects.filter(event=event).aggregate(
+            revenue=Sum("revenue"), approved=Sum("approved_count")
+        )
+
+        problems = []
+        if sold != approved_count:
+            problems.append(f"{sold} boletos comprados para {approved_count} pagos aprobados")
+        if counters.total_sold != sold:
+            problems.append(f"capacity_sold={counters.total_sold} no coincide con {sold} boletos comprados")
+        if (rollup["approved"] or 0) != approved_count or (rollup["revenue"] or 0) != approved_total:
+            problems.append(
+                f"acumulado de ingresos {rollup['revenue']} ({rollup['approved']}) no coincide con "
+                f"{approved_total} ({approved_count})"
+            )
+        if problems:
+            raise CommandError("Inconsistencia tras el benchmark: " + "; ".join(problems) + ".")
+        self.stdout.write(self.style.SUCCESS("Tickets, aforo e ingresos consistentes con los pagos aprobados."))
@@ -0,0 +1,46 @@
+"""Levanta el simulador local de PayU hasta que se interrumpa con Ctrl+C."""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.services import get_payu_config
+from payments.simulator import PayUSimulator, add_scenario_arguments, scenario_from_options
+
+
+class Command(BaseCommand):
+    help = "Simula el checkout de PayU y envía confirmaciones con retrasos, duplicados y fallos configurables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Dirección donde escucha el simulador.")
+        parser.add_argument("--port", type=int, default=8081, help="Puerto del simulador.")
+        parser.add_argument(
+            "--callback-url",
+            default="",
+            help="URL de confirmación; vacío usa el confirmationUrl de cada formulario.",
+        )
+        add_scenario_arguments(parser)
+
+    def handle(self, *args, **options):
+        try:
+            scenario = scenario_from_options(options)
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+        config = get_payu_config()
+        simulator = PayUSimulator(
+            config["api_key"],
+            config["merchant_id"],
+            scenario,
+            callback_url=options["callback_url"] or None,
+            host=options["host"],
+            port=options["port"],
+        ).start()
+        self.stdout.write(f"Simulador de PayU escuchando en {simulator.url} (Ctrl+C para salir)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            simulator.stop()
+        self.stdout.write("Resumen: " + ", ".join(f"{key}: {value}" for key, value in sorted(simulator.stats.items())))
@@ -0,0 +1,51 @@
+"""Aplica en lotes las notificaciones de PayU guardadas por el webhook."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.inbox import DEFAULT_INBOX_BATCH_SIZE, process_inbox_batch
+
+
+class Command(BaseCommand):
+    help = "Procesa las notificaciones pendientes de PaymentInbox en orden de llegada por referencia."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_INBOX_BATCH_SIZE,
+            help="Cantidad de notificaciones tomadas por transacción.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Sigue ejecutándose y sondea la bandeja cuando se vacía.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Segundos de espera entre sondeos con --loop.",
+        )
+
+    def handle(self, *args, **options):
+        totals = {"processed": 0, "retried": 0, "failed": 0, "deferred": 0}
+        try:
+            while True:
+                result = process_inbox_batch(batch_size=options["batch_size"])
+                for key, value in result.items():
+                    totals[key] += value
+                # Un lote sin avances (solo diferidos o reintentos) espera antes de volver a intentar
+                if result["processed"] + result["failed"] == 0:
+                    if not options["loop"]:
+                        break
+                    time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Notificaciones procesadas: {totals['processed']}. Reintentos: {totals['retried']}. "
+                f"Fallidas: {totals['failed']}."
+            )
+        )
@@ -0,0 +1,21 @@
+"""Elimina las respuestas guardadas de Idempotency-Key que ya vencieron."""
+
+from django.core.management.base import BaseCommand
+
+from payments.idempotency import DEFAULT_PURGE_BATCH_SIZE, purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Purga en lotes las llaves de idempotencia vencidas."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_PURGE_BATCH_SIZE,
+            help="Cantidad de llaves eliminadas por consulta.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Llaves de idempotencia eliminadas: {deleted}."))
@@ -0,0 +1,85 @@
+"""
+Recalcula los acumulados de ingresos a partir del libro de pagos.
+
+Las transacciones sin ninguna fila en el libro (anteriores a él) reciben
+primero una fila de apertura con su estado actual, fechada en su última
+actualización. Luego DailyRevenue y EventRevenue se reconstruyen con dos
+agregaciones sobre el libro. Pensado para la carga inicial o para corregir
+desvíos; durante la reconstrucción conviene pausar el procesamiento de pagos.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum
+from django.db.models.functions import TruncDate
+
+from eventos.models import Event
+from payments.ledger import build_entry
+from payments.models import DailyRevenue, EventRevenue, PaymentLedgerEntry, PaymentTransaction
+
+
+class Command(BaseCommand):
+    help = "Crea filas de apertura en el libro de pagos y reconstruye los acumulados de ingresos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Transacciones por lote al crear las filas de apertura.",
+        )
+
+    def handle(self, *args, **options):
+        opened = self._open_missing(options["batch_size"])
+        with transaction.atomic():
+            DailyRevenue.objects.all().delete()
+            EventRevenue.objects.all().delete()
+            daily = (
+                PaymentLedgerEntry.objects.annotate(day=TruncDate("created_at"))
+                .values("day", "currency")
+                .annotate(revenue=Sum("revenue_delta"), approved_count=Sum("approved_delta"))
+                .order_by()
+            )
+            DailyRevenue.objects.bulk_create([DailyRevenue(**row) for row in daily], batch_size=1000)
+            per_event = (
+                PaymentLedgerEntry.objects.filter(event_id__in=Event.objects.values("id"))
+                .values("event_id", "currency")
+                .annotate(revenue=Sum("revenue_delta"), approved_count=Sum("approved_delta"))
+                .order_by()
+            )
+            EventRevenue.objects.bulk_create([EventRevenue(**row) for row in per_event], batch_size=1000)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Filas de apertura: {opened}. Días: {DailyRevenue.objects.count()}. "
+                f"Eventos: {EventRevenue.objects.count()}."
+            )
+        )
+
+    def _open_missing(self, batch_size: int) -> int:
+        without_entries = (
+            PaymentTransaction.objects.filter(
+                ~Exists(PaymentLedgerEntry.objects.filter(payment_id=OuterRef("pk")))
+            )
+            .exclude(status="")
+            .only("id", "reference_code", "status", "amount", "currency", "updated_at", "ticket__event_id")
+            .select_related("ticket")
+            .order_by("id")
+        )
+        created, last_id = 0, 0
+        while True:
+            batch = list(without_entries.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return created
+            last_id = batch[-1].id
+            entries = []
+            for payment in batch:
+                entry = build_entry(
+                    payment,
+                    from_status="",
+                    from_amount=payment.amount,
+                    event_id=payment.ticket.event_id if payment.ticket else None,
+                )
+                entry.created_at = payment.updated_at
+                entries.append(entry)
+            PaymentLedgerEntry.objects.bulk_create(entries)
+            created += len(entries)
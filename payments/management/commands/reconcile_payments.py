@@ -0,0 +1,73 @@
+"""Concilia con la pasarela las transacciones que siguen iniciadas o pendientes."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.gateway import (
+    DEFAULT_RECONCILE_CONCURRENCY,
+    FakeStatusClient,
+    get_status_client,
+    get_status_client_class,
+)
+from payments.reconciliation import (
+    DEFAULT_RECONCILE_CHUNK_SIZE,
+    DEFAULT_STALE_MINUTES,
+    reconcile_stale_payments,
+)
+
+
+class Command(BaseCommand):
+    help = "Consulta en la pasarela el estado de las transacciones sin confirmar y aplica los resultados."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-minutes",
+            type=int,
+            default=DEFAULT_STALE_MINUTES,
+            help="Solo concilia transacciones sin cambios en este número de minutos.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_RECONCILE_CHUNK_SIZE,
+            help="Transacciones consultadas y aplicadas por bloque.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=DEFAULT_RECONCILE_CONCURRENCY,
+            help="Consultas simultáneas como máximo contra la pasarela.",
+        )
+        parser.add_argument(
+            "--fake-state",
+            default=None,
+            help=(
+                "Usa el cliente en memoria y responde este state_pol para todas las referencias (ej. 4). "
+                "Solo con DEBUG o con PAYU_STATUS_CLIENT apuntando al cliente en memoria."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] <= 0 or options["concurrency"] <= 0:
+            raise CommandError("--chunk-size y --concurrency deben ser positivos.")
+        if options["fake_state"]:
+            # Cambia pagos reales sin consultar la pasarela: solo en desarrollo o pruebas
+            if not settings.DEBUG and not issubclass(get_status_client_class(), FakeStatusClient):
+                raise CommandError("--fake-state solo se permite con DEBUG o con un PAYU_STATUS_CLIENT de pruebas.")
+            client = FakeStatusClient(default_state=options["fake_state"])
+        else:
+            client = get_status_client()
+
+        totals = reconcile_stale_payments(
+            client,
+            older_than_minutes=options["older_than_minutes"],
+            chunk_size=options["chunk_size"],
+            concurrency=options["concurrency"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Transacciones revisadas: {totals['checked']}. Actualizadas: {totals['updated']}. "
+                f"Sin cambios: {totals['unchanged']}. Desconocidas en la pasarela: {totals['missing']}. "
+                f"Errores: {totals['errors']}."
+            )
+        )
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentNotification',
+            fields=[
+                ('dedupe_key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('reference_code', models.CharField(db_index=True, max_length=64)),
+                ('transaction_id', models.CharField(blank=True, default='', max_length=64)),
+                ('state_pol', models.CharField(blank=True, default='', max_length=8)),
+                ('payment_status', models.CharField(max_length=32)),
+                ('ticket_id', models.IntegerField(blank=True, null=True)),
+                ('ticket_status', models.CharField(blank=True, default='', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'payments_payment_notification',
+            },
+        ),
+    ]
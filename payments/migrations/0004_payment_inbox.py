@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:14
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference_code', models.CharField(max_length=64)),
+                ('source', models.CharField(max_length=16)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('status', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesado', 'Procesado'), ('fallido', 'Fallido')], default='pendiente', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'payments_payment_inbox',
+                'indexes': [models.Index(fields=['status', 'id'], name='payments_pa_status_4a2b52_idx'), models.Index(fields=['reference_code', 'status'], name='payments_pa_referen_be8c1c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations
+from django.db.models import Q
+
+BATCH_SIZE = 1000
+
+
+def link_transactions(apps, schema_editor):
+    """Enlaza cada transacción con su ticket (por unique_code o payment_reference) y su comprador."""
+    PaymentTransaction = apps.get_model("payments", "PaymentTransaction")
+    Ticket = apps.get_model("eventos", "Ticket")
+    User = apps.get_model("usuarios", "CustomUser")
+
+    pending = PaymentTransaction.objects.filter(Q(ticket__isnull=True) | Q(user__isnull=True)).order_by("id")
+    last_id = 0
+    while True:
+        batch = list(pending.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        references = {payment.reference_code for payment in batch}
+
+        tickets = {}
+        # Orden descendente: en órdenes de carrito gana el primer ticket de la referencia
+        for ticket_id, user_id, unique_code, payment_reference in (
+            Ticket.objects.filter(Q(unique_code__in=references) | Q(payment_reference__in=references))
+            .order_by("-id")
+            .values_list("id", "user_id", "unique_code", "payment_reference")
+        ):
+            for reference in (unique_code, payment_reference):
+                if reference in references:
+                    tickets[reference] = (ticket_id, user_id)
+        users = dict(
+            User.objects.filter(email__in={payment.buyer_email for payment in batch}).values_list("email", "id")
+        )
+
+        for payment in batch:
+            ticket_id, user_id = tickets.get(payment.reference_code, (None, None))
+            payment.ticket_id = payment.ticket_id or ticket_id
+            payment.user_id = payment.user_id or user_id or users.get(payment.buyer_email)
+        PaymentTransaction.objects.bulk_update(batch, ["ticket", "user"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0005_payment_transaction_links"),
+    ]
+
+    operations = [
+        migrations.RunPython(link_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0013_event_cancellation_job'),
+        ('payments', '0006_backfill_payment_transaction_links'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('currency', models.CharField(max_length=8)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('approved_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'payments_daily_revenue',
+                'constraints': [models.UniqueConstraint(fields=('day', 'currency'), name='daily_revenue_day_currency_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EventRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=8)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('approved_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='eventos.event')),
+            ],
+            options={
+                'db_table': 'payments_event_revenue',
+                'constraints': [models.UniqueConstraint(fields=('event', 'currency'), name='event_revenue_event_currency_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference_code', models.CharField(max_length=64)),
+                ('from_status', models.CharField(blank=True, default='', max_length=32)),
+                ('to_status', models.CharField(max_length=32)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(max_length=8)),
+                ('revenue_delta', models.DecimalField(decimal_places=2, default=0, help_text='Variación del ingreso aprobado que produce el cambio.', max_digits=12)),
+                ('approved_delta', models.SmallIntegerField(default=0, help_text='+1 al aprobarse, -1 al dejar de estar aprobada.')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('event', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='eventos.event')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='payments.paymenttransaction')),
+            ],
+            options={
+                'db_table': 'payments_ledger_entry',
+                'indexes': [models.Index(fields=['payment', 'id'], name='payments_le_payment_7f4d80_idx')],
+            },
+        ),
+    ]
@@ -2,7 +2,10 @@
 payments/models.py
 Modelo principal para transacciones de pago. Clean code y docstrings.
 """
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 class PaymentTransaction(models.Model):
     """Modelo para registrar transacciones de pago (auditoría y control)."""
@@ -15,7 +18,168 @@ class PaymentTransaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     gateway = models.CharField(max_length=32, default='PayU')
+    # Ticket de la referencia (el primero de la orden en compras de carrito) y su comprador
+    ticket = models.ForeignKey(
+        'eventos.Ticket', on_delete=models.SET_NULL, null=True, blank=True, related_name='payment_transactions'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='payment_transactions'
+    )
     class Meta:
         db_table = "payments_payment_transaction"
+        indexes = [
+            # Historial por usuario con paginación por cursor sobre el id
+            models.Index(fields=["user", "-id"], name="payment_user_history_idx"),
+        ]
     def __str__(self):
-        return f"{self.reference_code} - {self.status}"
\ No newline at end of file
+        return f"{self.reference_code} - {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Primera respuesta de una petición con cabecera Idempotency-Key.
+    La llave es un hash de (usuario, ruta, Idempotency-Key); mientras
+    ``status_code`` es nulo la petición original sigue en curso y
+    ``expires_at`` marca el fin de su turno.
+    """
+    key_hash = models.CharField(max_length=64, primary_key=True)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "payments_idempotency_key"
+
+    def __str__(self):
+        return f"{self.key_hash} - {self.status_code}"
+
+
+class PaymentNotification(models.Model):
+    """
+    Resultado de una notificación de PayU ya procesada.
+    La llave es un hash de (reference_sale, transaction_id, state_pol); los
+    reintentos con la misma llave responden con este resultado sin reprocesar.
+    """
+    dedupe_key = models.CharField(max_length=64, primary_key=True)
+    reference_code = models.CharField(max_length=64, db_index=True)
+    transaction_id = models.CharField(max_length=64, blank=True, default="")
+    state_pol = models.CharField(max_length=8, blank=True, default="")
+    payment_status = models.CharField(max_length=32)
+    ticket_id = models.IntegerField(null=True, blank=True)
+    ticket_status = models.CharField(max_length=20, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "payments_payment_notification"
+
+    def __str__(self):
+        return f"{self.reference_code} - {self.state_pol} - {self.payment_status}"
+
+
+class PaymentInbox(models.Model):
+    """
+    Notificación de PayU recibida y con firma válida, pendiente de procesar.
+    El webhook solo inserta la fila; el comando ``process_payment_inbox`` la
+    aplica en lotes, respetando el orden de llegada de cada referencia.
+    """
+
+    class Status(models.TextChoices):
+        PENDIENTE = "pendiente", "Pendiente"
+        PROCESADO = "procesado", "Procesado"
+        FALLIDO = "fallido", "Fallido"
+
+    reference_code = models.CharField(max_length=64)
+    source = models.CharField(max_length=16)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDIENTE)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "payments_payment_inbox"
+        indexes = [
+            models.Index(fields=["status", "id"]),
+            models.Index(fields=["reference_code", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.reference_code} - {self.source} ({self.status})"
+
+
+class PaymentLedgerEntry(models.Model):
+    """
+    Cambio de estado de una transacción. Las filas solo se insertan: el
+    historial de ingresos se lee aquí aunque ``PaymentTransaction`` guarde
+    únicamente el último estado de cada referencia.
+    """
+    payment = models.ForeignKey(PaymentTransaction, on_delete=models.PROTECT, related_name="ledger_entries")
+    reference_code = models.CharField(max_length=64)
+    # Se conserva el id aunque el evento se borre
+    event = models.ForeignKey(
+        "eventos.Event", on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+"
+    )
+    from_status = models.CharField(max_length=32, blank=True, default="")
+    to_status = models.CharField(max_length=32)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=8)
+    revenue_delta = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, help_text="Variación del ingreso aprobado que produce el cambio."
+    )
+    approved_delta = models.SmallIntegerField(default=0, help_text="+1 al aprobarse, -1 al dejar de estar aprobada.")
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = "payments_ledger_entry"
+        indexes = [
+            models.Index(fields=["payment", "id"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("El libro de pagos no admite modificaciones.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("El libro de pagos no admite borrados.")
+
+    def __str__(self):
+        return f"{self.reference_code}: {self.from_status or '-'} -> {self.to_status}"
+
+
+class DailyRevenue(models.Model):
+    """Ingreso aprobado neto por día y moneda, mantenido al escribir el libro de pagos."""
+    day = models.DateField()
+    currency = models.CharField(max_length=8)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    approved_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "payments_daily_revenue"
+        constraints = [
+            models.UniqueConstraint(fields=["day", "currency"], name="daily_revenue_day_currency_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.currency}: {self.revenue}"
+
+
+class EventRevenue(models.Model):
+    """Ingreso aprobado neto por evento y moneda, mantenido al escribir el libro de pagos."""
+    event = models.ForeignKey("eventos.Event", on_delete=models.CASCADE, related_name="revenue_rollups")
+    currency = models.CharField(max_length=8)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    approved_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "payments_event_revenue"
+        constraints = [
+            models.UniqueConstraint(fields=["event", "currency"], name="event_revenue_event_currency_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} {self.currency}: {self.revenue}"
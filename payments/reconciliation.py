@@ -0,0 +1,102 @@
+"""
+payments/reconciliation.py
+Conciliación de transacciones que se quedaron en ``iniciada`` o ``pendiente``.
+
+Cuando la notificación de PayU se pierde, el comando ``reconcile_payments``
+recorre las transacciones viejas por bloques, consulta su estado en la
+pasarela en paralelo y aplica cada resultado con ``process_payu_notification``,
+como si la confirmación hubiera llegado: mismas transiciones, mismo bloqueo
+y misma deduplicación.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Dict, Iterator, List
+
+from django.db import transaction
+from django.utils import timezone
+
+from .gateway import DEFAULT_RECONCILE_CONCURRENCY, GatewayStatus, PaymentStatusClient, fetch_statuses
+from .models import PaymentTransaction
+from .services import get_payu_config, process_payu_notification
+
+logger = logging.getLogger("payments")
+
+STALE_STATUSES = ("iniciada", "pendiente")
+DEFAULT_STALE_MINUTES = 30
+DEFAULT_RECONCILE_CHUNK_SIZE = 200
+
+
+def stale_chunks(older_than_minutes: int, chunk_size: int) -> Iterator[List[PaymentTransaction]]:
+    """Transacciones sin confirmar y sin cambios recientes, por bloques en orden de id."""
+    cutoff = timezone.now() - timedelta(minutes=older_than_minutes)
+    queryset = (
+        PaymentTransaction.objects.filter(status__in=STALE_STATUSES, updated_at__lt=cutoff)
+        .only("id", "reference_code", "amount", "currency")
+        .order_by("id")
+    )
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1].id
+        yield chunk
+
+
+def apply_statuses(payments: List[PaymentTransaction], results: Dict[str, object]) -> Dict[str, int]:
+    """Aplica los estados de un bloque en una transacción, con un savepoint por referencia."""
+    config = get_payu_config()
+    summary = {"updated": 0, "unchanged": 0, "missing": 0, "errors": 0}
+    with transaction.atomic():
+        for payment in payments:
+            result = results.get(payment.reference_code)
+            if isinstance(result, Exception):
+                logger.warning("No se pudo consultar %s en la pasarela: %s", payment.reference_code, result)
+                summary["errors"] += 1
+                continue
+            if not isinstance(result, GatewayStatus):
+                summary["missing"] += 1
+                continue
+            if result.state_pol == "7":
+                # Sigue pendiente en la pasarela; no hay nada que aplicar
+                summary["unchanged"] += 1
+                continue
+            payload = result.as_notification()
+            payload.setdefault("value", str(payment.amount))
+            payload.setdefault("currency", payment.currency)
+            try:
+                with transaction.atomic():
+                    _outcome, duplicate = process_payu_notification(payload, config)
+            except Exception as exc:  # noqa: BLE001 - se registra y sigue con el bloque
+                logger.error("Error conciliando %s: %s", payment.reference_code, exc, exc_info=True)
+                summary["errors"] += 1
+                continue
+            summary["unchanged" if duplicate else "updated"] += 1
+    return summary
+
+
+def reconcile_stale_payments(
+    client: PaymentStatusClient,
+    *,
+    older_than_minutes: int = DEFAULT_STALE_MINUTES,
+    chunk_size: int = DEFAULT_RECONCILE_CHUNK_SIZE,
+    concurrency: int = DEFAULT_RECONCILE_CONCURRENCY,
+) -> Dict[str, int]:
+    """Concilia todas las transacciones viejas sin confirmar y devuelve el resumen."""
+    totals = {"checked": 0, "updated": 0, "unchanged": 0, "missing": 0, "errors": 0}
+    loop = asyncio.new_event_loop()
+    try:
+        for chunk in stale_chunks(older_than_minutes, chunk_size):
+            references = [payment.reference_code for payment in chunk]
+            results = loop.run_until_complete(fetch_statuses(client, references, concurrency))
+            totals["checked"] += len(chunk)
+            for key, value in apply_statuses(chunk, results).items():
+                totals[key] += value
+    finally:
+        loop.run_until_complete(client.aclose())
+        loop.close()
+    return totals
@@ -3,7 +3,7 @@ payments/serializers.py
 Serializador principal para transacciones de pago. Clean code y docstrings.
 """
 from rest_framework import serializers
-from .models import PaymentTransaction
+from .models import DailyRevenue, EventRevenue, PaymentTransaction
 
 class PaymentTransactionSerializer(serializers.ModelSerializer):
     """Serializador para el modelo PaymentTransaction."""
@@ -11,6 +11,33 @@ class PaymentTransactionSerializer(serializers.ModelSerializer):
         model = PaymentTransaction
         fields = '__all__'
 
+class PaymentHistorySerializer(serializers.ModelSerializer):
+    """Transacción del historial del usuario con el evento y tipo de ticket asociados."""
+    event_id = serializers.IntegerField(source="ticket.event_id", read_only=True, default=None)
+    event_name = serializers.CharField(source="ticket.event.event_name", read_only=True, default=None)
+    ticket_type = serializers.CharField(
+        source="ticket.config_type.ticket_type.ticket_name", read_only=True, default=None
+    )
+
+    class Meta:
+        model = PaymentTransaction
+        fields = [
+            "id",
+            "reference_code",
+            "transaction_id",
+            "status",
+            "amount",
+            "currency",
+            "gateway",
+            "created_at",
+            "updated_at",
+            "ticket_id",
+            "event_id",
+            "event_name",
+            "ticket_type",
+        ]
+        read_only_fields = fields
+
 class PayUDataResponseSerializer(serializers.Serializer):
     """Datos que se devuelven al front-end para iniciar el pago en PayU."""
     sandbox = serializers.BooleanField()
@@ -23,4 +50,40 @@ class PayUDataResponseSerializer(serializers.Serializer):
     signature = serializers.CharField()
     buyerEmail = serializers.EmailField()
     confirmationUrl = serializers.URLField()
-    responseUrl = serializers.URLField()
\ No newline at end of file
+    responseUrl = serializers.URLField()
+
+
+class RevenueQuerySerializer(serializers.Serializer):
+    """Filtros del reporte de ingresos."""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    event = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if attrs.get("date_from") and attrs.get("date_to") and attrs["date_from"] > attrs["date_to"]:
+            raise serializers.ValidationError("date_from no puede ser posterior a date_to.")
+        return attrs
+
+
+class DailyRevenueSerializer(serializers.ModelSerializer):
+    """Ingreso aprobado neto de un día."""
+    class Meta:
+        model = DailyRevenue
+        fields = ["day", "currency", "revenue", "approved_count"]
+
+
+class EventRevenueSerializer(serializers.ModelSerializer):
+    """Ingreso aprobado neto acumulado de un evento."""
+    event_name = serializers.CharField(source="event.event_name", read_only=True)
+
+    class Meta:
+        model = EventRevenue
+        fields = ["event_id", "event_name", "currency", "revenue", "approved_count"]
+
+
+class RevenueReportSerializer(serializers.Serializer):
+    """Reporte de ingresos; ``daily`` solo se incluye para administradores."""
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    daily = DailyRevenueSerializer(many=True, required=False)
+    events = EventRevenueSerializer(many=True)
@@ -5,13 +5,16 @@ from __future__ import annotations
 import hashlib
 import logging
 import os
+from collections import defaultdict
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from typing import Dict, Optional, Tuple, TYPE_CHECKING
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 
-from .models import PaymentTransaction
+from .models import PaymentNotification, PaymentTransaction
 
 if TYPE_CHECKING:  # pragma: no cover
     from eventos.models import Ticket
@@ -65,6 +68,39 @@ def generate_payu_signature(api_key: str, merchant_id: str, reference_code: str,
     return hashlib.md5(signature_str.encode("utf-8")).hexdigest()
 
 
+def build_payu_form_data(
+    config: Dict[str, str | bool],
+    *,
+    reference_code: str,
+    amount_value: Decimal,
+    description: str,
+    buyer_email: str,
+) -> Dict[str, object]:
+    """Arma los datos que el front-end envía a PayU, incluida la firma."""
+    # PayU exige montos con dos decimales exactos
+    amount = format(amount_value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP), ".2f")
+    signature = generate_payu_signature(
+        config["api_key"],
+        config["merchant_id"],
+        reference_code,
+        amount,
+        currency=config["currency"],
+    )
+    return {
+        "sandbox": config["sandbox"],
+        "merchantId": config["merchant_id"],
+        "accountId": config["account_id"],
+        "description": description,
+        "referenceCode": reference_code,
+        "amount": amount,
+        "currency": config["currency"],
+        "signature": signature,
+        "buyerEmail": buyer_email,
+        "confirmationUrl": config["confirmation_url"],
+        "responseUrl": config["response_url"],
+    }
+
+
 def validate_payu_signature(
     config: Dict[str, str | bool],
     reference_code: str,
@@ -117,70 +153,158 @@ def normalize_amount(value: object) -> Decimal:
 
 PAYU_STATE_MAP = {
     "4": "aprobado",
+    "5": "expirada",
     "6": "rechazado",
     "7": "pendiente",
     "104": "error",
 }
 
 
+# Pago aprobado cuyos tickets ya estaban cancelados: se cobra pero debe devolverse
+REFUND_STATUS = "reembolso_pendiente"
+
+FINAL_PAYMENT_STATUSES = {"aprobado", "rechazado", "error", "expirada", REFUND_STATUS}
+
+
 def map_payu_state(state: object) -> str:
     """Traduce el código de estado de PayU a una etiqueta legible."""
 
     return PAYU_STATE_MAP.get(str(state), "desconocido")
 
 
+def notification_dedupe_key(reference_code: str, transaction_id: Optional[str], state_pol: str) -> str:
+    """Hash de (reference_sale, transaction_id, state_pol) que identifica un reintento de PayU."""
+    raw = "|".join((reference_code, transaction_id or "", state_pol))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def lock_payment_transaction(reference_code: str, defaults: Dict[str, object]) -> PaymentTransaction:
+    """
+    Devuelve la transacción de la referencia con bloqueo de fila, creándola si no existe.
+    Debe llamarse dentro de ``transaction.atomic``.
+    """
+    payment = PaymentTransaction.objects.select_for_update().filter(reference_code=reference_code).first()
+    if payment is not None:
+        return payment
+    try:
+        with transaction.atomic():
+            return PaymentTransaction.objects.create(reference_code=reference_code, **defaults)
+    except IntegrityError:
+        # Otra notificación de la misma referencia creó la fila primero
+        return PaymentTransaction.objects.select_for_update().get(reference_code=reference_code)
+
+
 def update_payment_transaction(
-    reference_code: str,
+    payment: PaymentTransaction,
     *,
     amount: Decimal,
     currency: str,
     status: str,
     buyer_email: Optional[str] = None,
     transaction_id: Optional[str] = None,
+    event_id: Optional[int] = None,
 ) -> PaymentTransaction:
-    """Crea o actualiza el registro de transacción local con la información recibida."""
+    """
+    Actualiza la transacción local (ya bloqueada) con la información recibida
+    y registra el cambio de estado en el libro de pagos, acumulado en ``event_id``.
+    """
+    from .ledger import record_transition
 
-    defaults = {
+    values = {
         "amount": amount,
         "currency": currency,
         "status": status,
     }
     if buyer_email:
-        defaults["buyer_email"] = buyer_email
+        values["buyer_email"] = buyer_email
     if transaction_id:
-        defaults["transaction_id"] = transaction_id
-
-    transaction_obj, _created = PaymentTransaction.objects.update_or_create(
-        reference_code=reference_code,
-        defaults=defaults,
+        values["transaction_id"] = transaction_id
+
+    changed = [name for name, value in values.items() if getattr(payment, name) != value]
+    if changed:
+        from_status, from_amount = payment.status, payment.amount
+        for name in changed:
+            setattr(payment, name, values[name])
+        payment.save(update_fields=[*changed, "updated_at"])
+        record_transition(payment, from_status=from_status, from_amount=from_amount, event_id=event_id)
+    return payment
+
+
+def update_ticket_status(reference_code: str, state_pol: str) -> Tuple[Optional["Ticket"], bool]:
+    """
+    Sincroniza el estado de los tickets asociados según la respuesta de PayU.
+    La referencia puede ser el unique_code de un ticket o la de una orden de carrito;
+    se devuelve el primer ticket de la referencia y si el pago requiere reembolso.
+
+    Cada transición es un UPDATE condicionado al estado de origen, y el aforo se
+    ajusta solo con las filas que realmente cambiaron. Un pago aprobado solo
+    confirma tickets pendientes: si la orden tiene tickets cancelados (retención
+    vencida o evento cancelado) no se reactiva ninguno y el pago queda por reembolsar.
+    """
+
+    from eventos.models import Ticket, TicketStatusChoices
+    from eventos.services import _release_held, _release_sold, adjust_sold
+
+    tickets = list(
+        Ticket.objects.select_for_update()
+        .filter(Q(unique_code=reference_code) | Q(payment_reference=reference_code))
+        .order_by("id")
     )
-    return transaction_obj
-
-
-def update_ticket_status(reference_code: str, state_pol: str) -> Optional["Ticket"]:
-    """Sincroniza el estado del ticket asociado según la respuesta de PayU."""
-
-    from eventos.models import Ticket
-
-    ticket = Ticket.objects.select_related("config_type").filter(unique_code=reference_code).first()
-    if not ticket:
+    if not tickets:
         logger.warning("Ticket con referencia %s no encontrado al procesar PayU", reference_code)
-        return None
+        return None, False
+
+    if state_pol == "4":
+        if any(ticket.status == TicketStatusChoices.CANCELADA for ticket in tickets):
+            logger.warning(
+                "Pago aprobado para la referencia %s con tickets cancelados; queda pendiente de reembolso",
+                reference_code,
+            )
+            return tickets[0], True
+        sources = {TicketStatusChoices.PENDIENTE}
+        target = TicketStatusChoices.COMPRADA
+    elif state_pol in {"6", "104"}:
+        sources = {TicketStatusChoices.COMPRADA}
+        target = TicketStatusChoices.CANCELADA
+    else:
+        return tickets[0], False
 
-    if state_pol == "4" and ticket.status != "comprada":
-        ticket.status = "comprada"
-        ticket.save(update_fields=["status"])
-    elif state_pol in {"6", "104"} and ticket.status == "comprada":
-        ticket.status = "cancelada"
-        ticket.save(update_fields=["status"])
-    return ticket
+    moving = [ticket for ticket in tickets if ticket.status in sources]
+    if not moving:
+        return tickets[0], False
+    Ticket.objects.filter(id__in=[ticket.id for ticket in moving], status__in=sources).update(
+        status=target, hold_expires_at=None
+    )
+
+    sold: Dict[Tuple[int, Optional[int]], int] = defaultdict(int)
+    held: Dict[Tuple[int, Optional[int]], int] = defaultdict(int)
+    for ticket in moving:
+        counter = (ticket.config_type_id, ticket.inventory_shard)
+        sold[counter] += ticket.amount
+        if ticket.status == TicketStatusChoices.PENDIENTE and ticket.hold_expires_at is not None:
+            held[counter] += ticket.amount
+        ticket.status = target
+        ticket.hold_expires_at = None
+        ticket._remember_values(["status", "hold_expires_at"])
+
+    if target == TicketStatusChoices.COMPRADA:
+        # Primero se suma lo vendido y luego se libera la retención, como en Ticket.save
+        for (config_type_id, shard), total in sold.items():
+            adjust_sold(config_type_id, total, shard)
+        _release_held(held)
+    else:
+        _release_sold(sold)
+    return tickets[0], False
 
 
 def process_payu_notification(
     payload: Dict[str, object],
     config: Dict[str, str | bool],
-) -> Tuple[PaymentTransaction, Optional["Ticket"], str]:
-    """Procesa la notificación de PayU, actualizando la transacción y el ticket."""
+) -> Tuple[PaymentNotification, bool]:
+    """
+    Procesa la notificación de PayU en una transacción con la fila de pago bloqueada.
+    Devuelve el resultado guardado y si la notificación era un reintento ya procesado.
+    """
 
     reference_code = str(payload.get("reference_sale") or payload.get("referenceCode"))
     value = payload.get("value") or payload.get("amount") or "0"
@@ -192,19 +316,52 @@ def process_payu_notification(
         or payload.get("transactionId")
         or payload.get("reference_pol")
     )
+    transaction_id = str(transaction_id) if transaction_id else None
+
+    dedupe_key = notification_dedupe_key(reference_code, transaction_id, state_pol)
+    cached = PaymentNotification.objects.filter(pk=dedupe_key).first()
+    if cached is not None:
+        return cached, True
 
     amount_decimal = normalize_amount(value)
     status_label = map_payu_state(state_pol)
+    values = {
+        "amount": amount_decimal,
+        "currency": currency,
+        "status": status_label,
+        "buyer_email": str(buyer_email) if buyer_email else None,
+        "transaction_id": transaction_id,
+    }
 
-    payment = update_payment_transaction(
-        reference_code,
-        amount=amount_decimal,
-        currency=currency,
-        status=status_label,
-        buyer_email=str(buyer_email) if buyer_email else None,
-        transaction_id=str(transaction_id) if transaction_id else None,
-    )
-
-    ticket = update_ticket_status(reference_code, state_pol)
-
-    return payment, ticket, status_label
+    with transaction.atomic():
+        # Una transacción nueva nace sin estado; el primer cambio lo registra en el libro
+        payment = lock_payment_transaction(
+            reference_code,
+            {name: value for name, value in values.items() if value is not None and name != "status"},
+        )
+        # Un reintento concurrente pudo terminar mientras se esperaba el bloqueo
+        cached = PaymentNotification.objects.filter(pk=dedupe_key).first()
+        if cached is not None:
+            return cached, True
+
+        if state_pol == "7" and payment.status in FINAL_PAYMENT_STATUSES:
+            # Un "pendiente" atrasado no revierte un estado final ya aplicado
+            values["status"] = payment.status
+        ticket, needs_refund = update_ticket_status(reference_code, state_pol)
+        if needs_refund:
+            values["status"] = REFUND_STATUS
+        if ticket is not None and payment.ticket_id is None:
+            # Transacción creada por la notificación: se enlaza con su ticket y comprador
+            payment.ticket, payment.user_id = ticket, ticket.user_id
+            PaymentTransaction.objects.filter(pk=payment.pk).update(ticket=ticket, user_id=ticket.user_id)
+        update_payment_transaction(payment, **values, event_id=ticket.event_id if ticket else None)
+        outcome = PaymentNotification.objects.create(
+            dedupe_key=dedupe_key,
+            reference_code=reference_code,
+            transaction_id=transaction_id or "",
+            state_pol=state_pol,
+            payment_status=values["status"],
+            ticket_id=ticket.id if ticket else None,
+            ticket_status=ticket.status if ticket else "",
+        )
+    return outcome, False
@@ -0,0 +1,275 @@
+"""
+payments/simulator.py
+Simulador local de la pasarela PayU para pruebas de extremo a extremo.
+
+Recibe por POST el formulario que arman ``BuyTicketAPIView`` y
+``PayUInitPaymentView`` (``build_payu_form_data``), valida su firma como
+``generate_payu_signature`` y envía después la confirmación al
+``confirmationUrl`` con la firma que espera ``validate_payu_signature``.
+El escenario controla retrasos, duplicados, reordenamientos (un "pendiente"
+que llega después del estado final) y pagos rechazados. Usar solo en
+entornos locales o de pruebas.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib import error, parse, request as urlrequest
+
+from .services import generate_payu_signature
+
+logger = logging.getLogger("payments")
+
+REQUIRED_FORM_FIELDS = ("merchantId", "referenceCode", "amount", "currency", "signature")
+FAILURE_STATES = ("6", "104")
+STATE_MESSAGES = {"4": "APPROVED", "6": "DECLINED", "7": "PENDING", "104": "ERROR"}
+
+
+@dataclass
+class SimulatorScenario:
+    """Comportamiento de las confirmaciones; las tasas son probabilidades entre 0 y 1."""
+
+    min_delay: float = 0.05
+    max_delay: float = 0.5
+    duplicate_rate: float = 0.0
+    reorder_rate: float = 0.0
+    failure_rate: float = 0.0
+    retries: int = 3
+    seed: Optional[int] = None
+
+
+def confirmation_value(amount: str) -> str:
+    """Monto como lo firma PayU en la confirmación: un decimal si el segundo es cero."""
+    value = Decimal(amount).quantize(Decimal("0.01"))
+    return format(value, ".1f") if value == value.quantize(Decimal("0.1")) else format(value, ".2f")
+
+
+class PayUSimulator:
+    """Servidor HTTP que imita el checkout de PayU y sus confirmaciones asíncronas."""
+
+    def __init__(
+        self,
+        api_key: str,
+        merchant_id: str,
+        scenario: Optional[SimulatorScenario] = None,
+        *,
+        callback_url: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        callback_workers: int = 16,
+        timeout: float = 10.0,
+    ):
+        self.api_key = api_key
+        self.merchant_id = merchant_id
+        self.scenario = scenario or SimulatorScenario()
+        self.callback_url = callback_url
+        self.timeout = timeout
+        self.stats: Counter = Counter()
+        self._random = random.Random(self.scenario.seed)
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[float, int, str, Dict[str, str], int]] = []
+        self._sequence = itertools.count()
+        self._wakeup = threading.Condition(self._lock)
+        self._running = False
+        self._executor = ThreadPoolExecutor(max_workers=callback_workers, thread_name_prefix="payu-sim-callback")
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "PayUSimulator":
+        self._running = True
+        for target in (self._server.serve_forever, self._dispatch):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
+        self._executor.shutdown(wait=True)
+
+    def pending_callbacks(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    # --- Checkout ---
+
+    def _handler_class(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8")
+                if "json" in (self.headers.get("Content-Type") or ""):
+                    form = {key: str(value) for key, value in json.loads(body or "{}").items()}
+                else:
+                    form = {key: values[-1] for key, values in parse.parse_qs(body).items()}
+                status_code, payload = simulator.checkout(form)
+                encoded = json.dumps(payload).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def checkout(self, form: Dict[str, str]) -> Tuple[int, Dict[str, object]]:
+        """Valida un formulario de pago y programa sus confirmaciones."""
+        missing = [field for field in REQUIRED_FORM_FIELDS if not form.get(field)]
+        if missing:
+            return 400, {"error": f"Faltan campos: {', '.join(missing)}"}
+        try:
+            Decimal(form["amount"])
+        except InvalidOperation:
+            return 400, {"error": "Monto inválido"}
+        expected = generate_payu_signature(
+            self.api_key, form["merchantId"], form["referenceCode"], form["amount"], currency=form["currency"]
+        )
+        if form["merchantId"] != str(self.merchant_id) or form["signature"] != expected:
+            with self._lock:
+                self.stats["rejected_signatures"] += 1
+            return 400, {"error": "Firma inválida"}
+
+        callback_url = self.callback_url or form.get("confirmationUrl")
+        if not callback_url:
+            return 400, {"error": "Falta confirmationUrl"}
+
+        scenario = self.scenario
+        with self._lock:
+            rng = self._random
+            final_state = rng.choice(FAILURE_STATES) if rng.random() < scenario.failure_rate else "4"
+            delays = [rng.uniform(scenario.min_delay, scenario.max_delay)]
+            if rng.random() < scenario.duplicate_rate:
+                delays.append(rng.uniform(scenario.min_delay, scenario.max_delay))
+                self.stats["duplicates"] += 1
+            # Un "pendiente" que llega después del estado final
+            late_pending = rng.random() < scenario.reorder_rate
+            if late_pending:
+                self.stats["reordered"] += 1
+            self.stats["payments"] += 1
+            self.stats[f"state_{final_state}"] += 1
+
+        transaction_id = str(uuid.uuid4())
+        final = self._callback(form, transaction_id, final_state)
+        for delay in delays:
+            self._schedule(delay, callback_url, final)
+        if late_pending:
+            pending = self._callback(form, transaction_id, "7")
+            self._schedule(max(delays) + scenario.min_delay, callback_url, pending)
+        return 200, {"transactionId": transaction_id, "referenceCode": form["referenceCode"], "state": "PENDING"}
+
+    def _callback(self, form: Dict[str, str], transaction_id: str, state_pol: str) -> Dict[str, str]:
+        value = confirmation_value(form["amount"])
+        return {
+            "merchant_id": form["merchantId"],
+            "reference_sale": form["referenceCode"],
+            "value": value,
+            "currency": form["currency"],
+            "state_pol": state_pol,
+            "response_message_pol": STATE_MESSAGES[state_pol],
+            "transaction_id": transaction_id,
+            "reference_pol": transaction_id[:8],
+            "email_buyer": form.get("buyerEmail", ""),
+            "sign": generate_payu_signature(
+                self.api_key, form["merchantId"], form["referenceCode"], value, form["currency"], state_pol=state_pol
+            ),
+        }
+
+    # --- Confirmaciones ---
+
+    def _schedule(self, delay: float, url: str, payload: Dict[str, str], attempt: int = 1) -> None:
+        with self._wakeup:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._sequence), url, payload, attempt))
+            self._wakeup.notify()
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._wakeup:
+                while self._running and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._wakeup.wait(timeout)
+                if not self._running:
+                    return
+                _due, _seq, url, payload, attempt = heapq.heappop(self._queue)
+            self._executor.submit(self._send, url, payload, attempt)
+
+    def _send(self, url: str, payload: Dict[str, str], attempt: int) -> None:
+        req = urlrequest.Request(
+            url,
+            data=parse.urlencode(payload).encode("utf-8"),
+            method="POST",
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        outcome = "callbacks_sent"
+        try:
+            with urlrequest.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+        except error.HTTPError as exc:
+            outcome = "callbacks_failed" if exc.code >= 500 or exc.code == 429 else "callbacks_rejected"
+        except (error.URLError, OSError):
+            outcome = "callbacks_failed"
+        with self._lock:
+            self.stats[outcome] += 1
+        if outcome == "callbacks_failed" and attempt <= self.scenario.retries:
+            # PayU reintenta las confirmaciones que no reciben respuesta
+            self._schedule(min(2 ** attempt * 0.1, 5.0), url, payload, attempt + 1)
+
+
+def add_scenario_arguments(parser) -> None:
+    """Opciones de línea de comandos comunes para construir un ``SimulatorScenario``."""
+    parser.add_argument("--min-delay", type=float, default=0.05, help="Retraso mínimo de la confirmación (s).")
+    parser.add_argument("--max-delay", type=float, default=0.5, help="Retraso máximo de la confirmación (s).")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="Probabilidad de repetir la confirmación.")
+    parser.add_argument(
+        "--reorder-rate",
+        type=float,
+        default=0.0,
+        help="Probabilidad de enviar un 'pendiente' después del estado final.",
+    )
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probabilidad de pago rechazado o con error.")
+    parser.add_argument("--retries", type=int, default=3, help="Reintentos de una confirmación sin respuesta.")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para reproducir el escenario.")
+
+
+def scenario_from_options(options) -> SimulatorScenario:
+    if options["min_delay"] < 0 or options["max_delay"] < options["min_delay"]:
+        raise ValueError("Se requiere 0 <= --min-delay <= --max-delay.")
+    for name in ("duplicate_rate", "reorder_rate", "failure_rate"):
+        if not 0 <= options[name] <= 1:
+            raise ValueError(f"--{name.replace('_', '-')} debe estar entre 0 y 1.")
+    return SimulatorScenario(
+        min_delay=options["min_delay"],
+        max_delay=options["max_delay"],
+        duplicate_rate=options["duplicate_rate"],
+        reorder_rate=options["reorder_rate"],
+        failure_rate=options["failure_rate"],
+        retries=options["retries"],
+        seed=options["seed"],
+    )
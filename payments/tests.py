@@ -0,0 +1,556 @@
+import asyncio
+import json
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from eventos.cancellation import process_cancellation_job
+from eventos.models import Event, EventCancellationJob, Ticket, TicketStatusChoices, TicketType, TicketTypeEvent
+from eventos.services import acquire_inventory, hold_expiry, release_expired_holds
+from usuarios.models import CustomUser
+
+from .gateway import FakeStatusClient, PaymentStatusClient
+from .idempotency import IDEMPOTENCY_HEADER, _digest
+from .inbox import process_inbox_batch
+from .models import DailyRevenue, EventRevenue, IdempotencyKey, PaymentInbox, PaymentLedgerEntry, PaymentNotification, PaymentTransaction
+from .services import (
+    REFUND_STATUS,
+    build_payu_form_data,
+    generate_payu_signature,
+    get_payu_config,
+    process_payu_notification,
+)
+from .simulator import PayUSimulator, SimulatorScenario, confirmation_value, scenario_from_options
+
+CONFIRMATION_URL = "/api/payments/payu/confirmation/"
+
+
+class PaymentTestMixin:
+    """Evento de pago, comprador y notificaciones firmadas como las de PayU."""
+
+    price = Decimal("50000")
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="comprador", email="comprador@example.com", password="x", first_name="C", last_name="P"
+        )
+        self.event = Event.objects.create(event_name="Concierto", description="d", status="activo")
+        self.config_type = TicketTypeEvent.objects.create(
+            event=self.event,
+            ticket_type=TicketType.objects.create(ticket_name="General"),
+            price=self.price,
+            maximun_capacity=10,
+        )
+        self.config = get_payu_config()
+
+    def reserve(self, amount=1, reference=None):
+        """Ticket pendiente con retención y su transacción iniciada, como en BuyTicketAPIView."""
+        acquired, shard = acquire_inventory(self.config_type, amount)
+        self.assertTrue(acquired)
+        ticket = Ticket.objects.create(
+            user=self.user,
+            event=self.event,
+            config_type=self.config_type,
+            amount=amount,
+            unique_code=str(uuid.uuid4()),
+            payment_reference=reference,
+            hold_expires_at=hold_expiry(),
+            inventory_shard=shard,
+        )
+        payment = PaymentTransaction.objects.create(
+            reference_code=reference or ticket.unique_code,
+            status="iniciada",
+            amount=self.price * amount,
+            buyer_email=self.user.email,
+            ticket=ticket,
+            user=self.user,
+        )
+        return ticket, payment
+
+    def notification(self, payment, state_pol, transaction_id="tx-1"):
+        value = confirmation_value(str(payment.amount))
+        return {
+            "merchant_id": self.config["merchant_id"],
+            "reference_sale": payment.reference_code,
+            "value": value,
+            "currency": payment.currency,
+            "state_pol": state_pol,
+            "transaction_id": transaction_id,
+            "email_buyer": payment.buyer_email,
+            "sign": generate_payu_signature(
+                self.config["api_key"],
+                self.config["merchant_id"],
+                payment.reference_code,
+                value,
+                payment.currency,
+                state_pol=state_pol,
+            ),
+        }
+
+    def confirm(self, payment, state_pol, transaction_id="tx-1"):
+        return APIClient().post(CONFIRMATION_URL, self.notification(payment, state_pol, transaction_id))
+
+    def counters(self):
+        return TicketTypeEvent.objects.values("capacity_sold", "capacity_held").get(pk=self.config_type.pk)
+
+
+class ConfirmationDeliveryTests(PaymentTestMixin, TestCase):
+    def test_confirmation_is_applied_in_the_request_by_default(self):
+        ticket, payment = self.reserve()
+
+        response = self.confirm(payment, "4")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        payment.refresh_from_db()
+        ticket.refresh_from_db()
+        self.assertEqual(payment.status, "aprobado")
+        self.assertEqual(ticket.status, TicketStatusChoices.COMPRADA)
+        self.assertFalse(PaymentInbox.objects.exists())
+
+    @override_settings(PAYU_NOTIFICATIONS_INBOX=True)
+    def test_inbox_mode_applies_the_confirmation_in_the_worker(self):
+        ticket, payment = self.reserve()
+
+        response = self.confirm(payment, "4")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "iniciada")
+
+        process_inbox_batch()
+
+        payment.refresh_from_db()
+        ticket.refresh_from_db()
+        self.assertEqual(payment.status, "aprobado")
+        self.assertEqual(ticket.status, TicketStatusChoices.COMPRADA)
+
+
+class NotificationProcessingTests(PaymentTestMixin, TestCase):
+    def test_repeated_notification_is_applied_once(self):
+        ticket, payment = self.reserve(amount=2)
+        payload = self.notification(payment, "4")
+
+        outcome, duplicate = process_payu_notification(payload, self.config)
+        replay, replay_duplicate = process_payu_notification(payload, self.config)
+
+        self.assertFalse(duplicate)
+        self.assertTrue(replay_duplicate)
+        self.assertEqual(replay.pk, outcome.pk)
+        self.assertEqual(PaymentNotification.objects.count(), 1)
+        self.assertEqual(self.counters(), {"capacity_sold": 2, "capacity_held": 0})
+
+    def test_late_pending_does_not_downgrade_an_approved_payment(self):
+        ticket, payment = self.reserve()
+        process_payu_notification(self.notification(payment, "4"), self.config)
+
+        process_payu_notification(self.notification(payment, "7"), self.config)
+
+        payment.refresh_from_db()
+        ticket.refresh_from_db()
+        self.assertEqual(payment.status, "aprobado")
+        self.assertEqual(ticket.status, TicketStatusChoices.COMPRADA)
+
+    def test_rejection_after_approval_releases_the_sold_tickets(self):
+        ticket, payment = self.reserve(amount=3)
+        process_payu_notification(self.notification(payment, "4"), self.config)
+
+        process_payu_notification(self.notification(payment, "6", transaction_id="tx-2"), self.config)
+
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, TicketStatusChoices.CANCELADA)
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 0})
+
+    def test_approval_after_hold_expired_does_not_reactivate_the_ticket(self):
+        ticket, payment = self.reserve(amount=2)
+        Ticket.objects.filter(pk=ticket.pk).update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+        release_expired_holds()
+
+        response = self.confirm(payment, "4")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["payment_status"], REFUND_STATUS)
+        payment.refresh_from_db()
+        ticket.refresh_from_db()
+        self.assertEqual(payment.status, REFUND_STATUS)
+        self.assertEqual(ticket.status, TicketStatusChoices.CANCELADA)
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 0})
+
+    def test_approval_after_cancellation_keeps_the_whole_order_cancelled(self):
+        reference = str(uuid.uuid4())
+        first, payment = self.reserve(reference=reference)
+        second = Ticket.objects.create(
+            user=self.user,
+            event=self.event,
+            config_type=self.config_type,
+            unique_code=str(uuid.uuid4()),
+            payment_reference=reference,
+            status=TicketStatusChoices.CANCELADA,
+        )
+
+        process_payu_notification(self.notification(payment, "4"), self.config)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, REFUND_STATUS)
+        self.assertEqual(
+            set(Ticket.objects.filter(pk__in=[first.pk, second.pk]).values_list("status", flat=True)),
+            {TicketStatusChoices.PENDIENTE, TicketStatusChoices.CANCELADA},
+        )
+        self.assertEqual(self.counters()["capacity_sold"], 0)
+
+
+class ReconciliationTests(PaymentTestMixin, TestCase):
+    def test_status_client_must_implement_fetch_status(self):
+        class Incomplete(PaymentStatusClient):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_fake_client_does_not_know_unlisted_references(self):
+        client = FakeStatusClient(states={"conocida": "4"})
+
+        self.assertIsNone(asyncio.run(client.fetch_status("otra")))
+        self.assertEqual(asyncio.run(client.fetch_status("conocida")).state_pol, "4")
+
+    def test_fake_state_is_refused_with_the_real_client(self):
+        ticket, payment = self.reserve()
+
+        with self.assertRaises(CommandError):
+            call_command("reconcile_payments", "--fake-state", "4", "--older-than-minutes", "0")
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "iniciada")
+
+    @override_settings(PAYU_STATUS_CLIENT="payments.gateway.FakeStatusClient")
+    def test_fake_state_reconciles_with_the_test_client(self):
+        ticket, payment = self.reserve()
+
+        call_command("reconcile_payments", "--fake-state", "4", "--older-than-minutes", "0", stdout=StringIO())
+
+        payment.refresh_from_db()
+        ticket.refresh_from_db()
+        self.assertEqual(payment.status, "aprobado")
+        self.assertEqual(ticket.status, TicketStatusChoices.COMPRADA)
+
+
+class PaymentHistoryTests(PaymentTestMixin, TestCase):
+    url = "/api/payments/user/history/"
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_history_pages_by_cursor_from_the_newest_payment(self):
+        payments = [self.reserve()[1] for _ in range(3)]
+
+        first = self.client.get(self.url, {"page_size": 2}).json()
+        second = self.client.get(first["next"]).json()
+
+        self.assertEqual([row["id"] for row in first["results"]], [payments[2].pk, payments[1].pk])
+        self.assertEqual([row["id"] for row in second["results"]], [payments[0].pk])
+        self.assertIsNone(second["next"])
+        self.assertEqual(first["results"][0]["event_name"], "Concierto")
+        self.assertEqual(first["results"][0]["ticket_type"], "General")
+
+    def test_history_only_lists_the_users_payments(self):
+        self.reserve()
+        other = CustomUser.objects.create_user(
+            username="otro", email="otro@example.com", password="x", first_name="O", last_name="T"
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+
+        self.assertEqual(client.get(self.url).json()["results"], [])
+
+    def test_history_runs_the_same_queries_for_any_page_size(self):
+        for _ in range(4):
+            self.reserve()
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url, {"page_size": 1})
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url, {"page_size": 4})
+
+        self.assertEqual(len(large), len(small))
+
+
+class RevenueLedgerTests(PaymentTestMixin, TestCase):
+    def rollups(self):
+        daily = DailyRevenue.objects.values_list("revenue", "approved_count").get(day=timezone.localdate())
+        per_event = EventRevenue.objects.values_list("revenue", "approved_count").get(event=self.event)
+        return daily, per_event
+
+    def test_approval_is_added_to_the_daily_and_event_rollups(self):
+        ticket, payment = self.reserve(amount=2)
+
+        process_payu_notification(self.notification(payment, "4"), self.config)
+        process_payu_notification(self.notification(payment, "4"), self.config)
+
+        expected = (Decimal("100000.00"), 1)
+        self.assertEqual(self.rollups(), (expected, expected))
+        entry = PaymentLedgerEntry.objects.get(payment=payment, to_status="aprobado")
+        self.assertEqual(entry.event_id, self.event.pk)
+        self.assertEqual(entry.revenue_delta, Decimal("100000.00"))
+
+    def test_reversal_after_approval_nets_the_rollups_to_zero(self):
+        ticket, payment = self.reserve()
+        process_payu_notification(self.notification(payment, "4"), self.config)
+
+        process_payu_notification(self.notification(payment, "6", transaction_id="tx-2"), self.config)
+
+        self.assertEqual(self.rollups(), ((Decimal("0.00"), 0), (Decimal("0.00"), 0)))
+        self.assertEqual(
+            list(PaymentLedgerEntry.objects.filter(payment=payment).values_list("to_status", flat=True)),
+            ["aprobado", "rechazado"],
+        )
+
+    def test_refund_pending_payment_is_not_counted_as_revenue(self):
+        ticket, payment = self.reserve()
+        Ticket.objects.filter(pk=ticket.pk).update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+        release_expired_holds()
+
+        process_payu_notification(self.notification(payment, "4"), self.config)
+
+        self.assertFalse(EventRevenue.objects.filter(approved_count__gt=0).exists())
+        self.assertEqual(PaymentLedgerEntry.objects.get(payment=payment).to_status, REFUND_STATUS)
+
+    def test_refund_after_event_cancellation_nets_the_rollups_to_zero(self):
+        ticket, payment = self.reserve(amount=2)
+        process_payu_notification(self.notification(payment, "4"), self.config)
+        job = EventCancellationJob.objects.create(event=self.event, total_tickets=1)
+
+        process_cancellation_job(job.pk)
+
+        self.assertEqual(self.rollups(), ((Decimal("0.00"), 0), (Decimal("0.00"), 0)))
+        refund = PaymentLedgerEntry.objects.get(payment=payment, to_status=REFUND_STATUS)
+        self.assertEqual((refund.revenue_delta, refund.approved_delta), (Decimal("-100000.00"), -1))
+
+    def test_rebuild_matches_the_incremental_rollups_and_opens_legacy_payments(self):
+        for state_pol in ("4", "4", "6"):
+            _ticket, payment = self.reserve()
+            process_payu_notification(self.notification(payment, state_pol), self.config)
+        _ticket, legacy = self.reserve()
+        PaymentTransaction.objects.filter(pk=legacy.pk).update(status="aprobado")
+        expected = ((Decimal("150000.00"), 3), (Decimal("150000.00"), 3))
+
+        call_command("rebuild_revenue_rollups", stdout=StringIO())
+
+        self.assertEqual(self.rollups(), expected)
+        self.assertEqual(PaymentLedgerEntry.objects.get(payment=legacy).from_status, "")
+
+    def test_report_shows_each_organizer_only_their_events(self):
+        _ticket, payment = self.reserve()
+        process_payu_notification(self.notification(payment, "4"), self.config)
+        organizer = CustomUser.objects.create_user(
+            username="organiza", email="organiza@example.com", password="x", first_name="O", last_name="R"
+        )
+        client = APIClient()
+        client.force_authenticate(organizer)
+
+        self.assertEqual(client.get("/api/payments/revenue/").json()["events"], [])
+        Event.objects.filter(pk=self.event.pk).update(creator=organizer)
+        report = client.get("/api/payments/revenue/").json()
+
+        self.assertEqual([row["event_id"] for row in report["events"]], [self.event.pk])
+        self.assertEqual(report["events"][0]["approved_count"], 1)
+        self.assertNotIn("daily", report)
+
+
+class IdempotencyKeyTests(PaymentTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/events/{self.event.pk}/checkout/"
+
+    def body(self, amount):
+        return {"items": [{"config_type_id": self.config_type.pk, "amount": amount}]}
+
+    def checkout(self, amount, key):
+        body = self.body(amount)
+        return self.client.post(self.url, body, format="json", **{f"HTTP_{IDEMPOTENCY_HEADER.upper().replace('-', '_')}": key})
+
+    def test_retry_with_the_same_key_replays_the_first_response(self):
+        first = self.checkout(2, "compra-1")
+        retry = self.checkout(2, "compra-1")
+
+        self.assertEqual(first.status_code, retry.status_code)
+        self.assertEqual(first.json(), retry.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Ticket.objects.count(), 1)
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 2})
+
+    def test_same_key_with_a_different_body_is_rejected(self):
+        self.checkout(2, "compra-1")
+
+        response = self.checkout(3, "compra-1")
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 2})
+
+    def test_new_key_runs_a_new_purchase(self):
+        self.checkout(1, "compra-1")
+        self.checkout(1, "compra-2")
+
+        self.assertEqual(Ticket.objects.count(), 2)
+        self.assertEqual(self.counters(), {"capacity_sold": 0, "capacity_held": 2})
+
+    def key_hash(self, key):
+        return _digest(str(self.user.pk), "POST", self.url, key)
+
+    def test_request_in_progress_blocks_retries_until_its_lease_ends(self):
+        IdempotencyKey.objects.create(
+            key_hash=self.key_hash("compra-1"),
+            request_hash=_digest(json.dumps(self.body(1), sort_keys=True)),
+            expires_at=timezone.now() + timedelta(seconds=30),
+        )
+
+        self.assertEqual(self.checkout(1, "compra-1").status_code, 409)
+
+    def test_abandoned_key_is_taken_over_after_its_lease(self):
+        IdempotencyKey.objects.create(
+            key_hash=self.key_hash("compra-1"),
+            request_hash=_digest(json.dumps(self.body(1), sort_keys=True)),
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        response = self.checkout(1, "compra-1")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        stored = IdempotencyKey.objects.get(key_hash=self.key_hash("compra-1"))
+        self.assertEqual(stored.status_code, 201)
+        self.assertGreater(stored.expires_at, timezone.now() + timedelta(hours=1))
+
+    def test_unexpected_error_in_payment_initiation_is_not_replayed(self):
+        ticket, payment = self.reserve()
+        url = f"/api/payments/ticket/{ticket.pk}/pay/"
+        headers = {f"HTTP_{IDEMPOTENCY_HEADER.upper().replace('-', '_')}": "pago-1"}
+
+        with mock.patch("payments.views.build_payu_form_data", side_effect=RuntimeError("caído")):
+            failed = self.client.post(url, {}, format="json", **headers)
+        retried = self.client.post(url, {}, format="json", **headers)
+
+        self.assertEqual(failed.status_code, 400)
+        self.assertEqual(retried.status_code, 200, retried.content)
+        self.assertNotIn("Idempotent-Replayed", retried)
+
+    def test_deterministic_rejection_is_replayed(self):
+        self.checkout(11, "compra-1")
+
+        retry = self.checkout(11, "compra-1")
+
+        self.assertEqual(retry.status_code, 400)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+
+
+class SimulatorTests(PaymentTestMixin, TestCase):
+    def simulator(self, **scenario):
+        simulator = PayUSimulator(
+            self.config["api_key"],
+            self.config["merchant_id"],
+            SimulatorScenario(seed=1, **scenario),
+            callback_url="http://127.0.0.1:9/confirmation/",
+        ).start()
+        self.addCleanup(simulator.stop)
+        return simulator
+
+    def form(self, payment):
+        form = build_payu_form_data(
+            self.config,
+            reference_code=payment.reference_code,
+            amount_value=payment.amount,
+            description="Concierto - General",
+            buyer_email=payment.buyer_email,
+        )
+        return {key: str(value) for key, value in form.items()}
+
+    def test_checkout_schedules_a_confirmation_the_backend_accepts(self):
+        _ticket, payment = self.reserve()
+        simulator = self.simulator()
+
+        with mock.patch.object(simulator, "_schedule") as schedule:
+            status_code, body = simulator.checkout(self.form(payment))
+
+        self.assertEqual(status_code, 200, body)
+        (_delay, url, callback), _kwargs = schedule.call_args
+        self.assertEqual(url, "http://127.0.0.1:9/confirmation/")
+        process_payu_notification(callback, self.config)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "aprobado")
+
+    def test_duplicates_and_late_pending_are_scheduled_after_the_final_state(self):
+        _ticket, payment = self.reserve()
+        simulator = self.simulator(duplicate_rate=1, reorder_rate=1)
+
+        with mock.patch.object(simulator, "_schedule") as schedule:
+            simulator.checkout(self.form(payment))
+
+        states = [call.args[2]["state_pol"] for call in schedule.call_args_list]
+        self.assertEqual(states, ["4", "4", "7"])
+        self.assertEqual((simulator.stats["duplicates"], simulator.stats["reordered"]), (1, 1))
+
+    def test_checkout_rejects_tampered_forms(self):
+        _ticket, payment = self.reserve()
+        simulator = self.simulator()
+        form = self.form(payment)
+
+        self.assertEqual(simulator.checkout({**form, "amount": "1.00"})[0], 400)
+        self.assertEqual(simulator.checkout({key: value for key, value in form.items() if key != "signature"})[0], 400)
+        self.assertEqual(simulator.stats["rejected_signatures"], 1)
+
+    def test_failed_callbacks_are_retried_a_bounded_number_of_times(self):
+        simulator = self.simulator(retries=2)
+
+        with mock.patch("payments.simulator.urlrequest.urlopen", side_effect=OSError), mock.patch.object(
+            simulator, "_schedule"
+        ) as schedule:
+            simulator._send("http://127.0.0.1:9/", {}, attempt=2)
+            simulator._send("http://127.0.0.1:9/", {}, attempt=3)
+
+        self.assertEqual(schedule.call_count, 1)
+        self.assertEqual(simulator.stats["callbacks_failed"], 2)
+
+    def test_scenario_options_are_validated(self):
+        options = {
+            "min_delay": 0.5,
+            "max_delay": 0.1,
+            "duplicate_rate": 0,
+            "reorder_rate": 0,
+            "failure_rate": 0,
+            "retries": 3,
+            "seed": None,
+        }
+        with self.assertRaises(ValueError):
+            scenario_from_options(options)
+        with self.assertRaises(ValueError):
+            scenario_from_options({**options, "max_delay": 1, "failure_rate": 2})
+
+
+class BenchmarkRunTests(TransactionTestCase):
+    def test_benchmark_completes_and_cleans_up_what_it_seeds(self):
+        out = StringIO()
+
+        call_command(
+            "benchmark_payments", flows=3, concurrency=1, min_delay=0, max_delay=0.01, timeout=20, stdout=out
+        )
+
+        # En SQLite las escrituras concurrentes pueden devolver 500 ("table is locked"),
+        # así que no se exige que terminen todos los flujos, solo que cuadren
+        self.assertIn("Flujos terminados: ", out.getvalue())
+        self.assertIn("Tickets, aforo e ingresos consistentes", out.getvalue())
+        self.assertFalse(Event.objects.exists())
+        self.assertFalse(CustomUser.objects.filter(username__startswith="paybench-").exists())
+        # Los pagos se conservan para auditoría, desligados de tickets y compradores
+        self.assertFalse(PaymentTransaction.objects.filter(user__isnull=False).exists())
+        self.assertFalse(PaymentTransaction.objects.filter(ticket__isnull=False).exists())
@@ -3,7 +3,13 @@ payments/urls.py
 URLs principales del módulo de pagos. Organización y comentarios claros.
 """
 from django.urls import path
-from .views import PayUConfirmationAPIView, PayUInitPaymentView, UserPaymentHistoryView, PayUWebhookAPIView
+from .views import (
+    PayUConfirmationAPIView,
+    PayUInitPaymentView,
+    PayUWebhookAPIView,
+    RevenueReportView,
+    UserPaymentHistoryView,
+)
 
 urlpatterns = [
     # --- Confirmación de pago PayU ---
@@ -14,4 +20,6 @@ urlpatterns = [
     path('ticket/<int:ticket_id>/pay/', PayUInitPaymentView.as_view(), name='ticket-pay'),
     # --- Historial de pagos del usuario ---
     path('user/history/', UserPaymentHistoryView.as_view(), name='user-payment-history'),
+    # --- Reporte de ingresos (administrador u organizador) ---
+    path('revenue/', RevenueReportView.as_view(), name='payments-revenue'),
 ]
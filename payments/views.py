@@ -1,8 +1,11 @@
 """Vistas principales del módulo de pagos."""
 
 import logging
-from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
 
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.decorators import method_decorator
@@ -11,18 +14,31 @@ from django_ratelimit.decorators import ratelimit
 
 from drf_spectacular.utils import extend_schema
 from rest_framework import status, serializers
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 
+from gestify.pagination import HistoryCursorPagination
+from usuarios.authentication import AccessTokenAuthentication
+from usuarios.roles import has_role
 from usuarios.serializers import EmptySerializer
-from .models import PaymentTransaction
-from .serializers import PaymentTransactionSerializer, PayUDataResponseSerializer
+from .idempotency import IDEMPOTENCY_PARAMETER, do_not_replay, idempotent
+from .inbox import receive_notification
+from .ledger import record_transition
+from .models import DailyRevenue, EventRevenue, PaymentTransaction
+from .serializers import (
+    DailyRevenueSerializer,
+    EventRevenueSerializer,
+    PaymentHistorySerializer,
+    PayUDataResponseSerializer,
+    RevenueQuerySerializer,
+    RevenueReportSerializer,
+)
 from .services import (
-    generate_payu_signature,
+    REFUND_STATUS,
+    build_payu_form_data,
     get_payu_config,
     process_payu_notification,
     validate_payu_signature,
@@ -53,36 +69,55 @@ def _handle_payu_notification(request, source: str) -> Response:
         logger.warning("Firma inválida PayU (%s) para referencia %s", source, reference_code)
         return Response({'error': 'Firma inválida'}, status=status.HTTP_400_BAD_REQUEST)
 
+    if getattr(settings, "PAYU_NOTIFICATIONS_INBOX", False):
+        # Solo se guarda la notificación; el comando process_payment_inbox la aplica
+        receive_notification(payload, source)
+        return Response({'message': 'Notificación recibida.'}, status=status.HTTP_200_OK)
+
     try:
-        payment, ticket, status_label = process_payu_notification(payload, config)
+        outcome, duplicate = process_payu_notification(payload, config)
     except Exception as exc:  # pragma: no cover - fallback de seguridad
         logger.error("Error procesando notificación PayU (%s): %s", source, exc, exc_info=True)
         return Response({'error': 'Error procesando la notificación de pago.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    state_pol = str(payload.get("state_pol"))
-    if state_pol == "4":
-        if not ticket:
+    if duplicate:
+        logger.info(
+            "Notificación PayU (%s) repetida para referencia %s; se devuelve el resultado previo",
+            source,
+            outcome.reference_code,
+        )
+
+    status_label = outcome.payment_status
+    if outcome.state_pol == "4":
+        if outcome.ticket_id is None:
             return Response({'error': 'Ticket no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        if status_label == REFUND_STATUS:
+            # La orden ya estaba cancelada: se acusa recibo sin reactivar los tickets
+            return Response({
+                'message': 'Pago recibido para tickets cancelados; queda pendiente de reembolso.',
+                'payment_status': status_label,
+                'ticket_id': outcome.ticket_id,
+                'ticket_status': outcome.ticket_status,
+            }, status=status.HTTP_200_OK)
         logger.info(
             "Pago confirmado (%s): referencia=%s, transacción=%s",
             source,
-            payment.reference_code,
-            payment.transaction_id,
+            outcome.reference_code,
+            outcome.transaction_id,
         )
         response_body = {
             'message': 'Pago confirmado y ticket actualizado.',
             'payment_status': status_label,
+            'ticket_id': outcome.ticket_id,
+            'ticket_status': outcome.ticket_status,
         }
-        if ticket:
-            response_body['ticket_id'] = ticket.id
-            response_body['ticket_status'] = ticket.status
         return Response(response_body, status=status.HTTP_200_OK)
 
     logger.info(
         "Notificación PayU (%s) con estado %s para referencia %s",
         source,
         status_label,
-        payment.reference_code,
+        outcome.reference_code,
     )
     return Response(
         {
@@ -93,24 +128,87 @@ def _handle_payu_notification(request, source: str) -> Response:
     )
 
 class UserPaymentHistoryView(ListAPIView):
-    """Endpoint para consultar el historial de pagos del usuario autenticado."""
-    authentication_classes = [TokenAuthentication]
+    """
+    Endpoint para consultar el historial de pagos del usuario autenticado.
+    Paginado por cursor sobre el índice (user, -id); evento y tipo de ticket llegan en la misma consulta.
+    """
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
-    serializer_class = PaymentTransactionSerializer
+    serializer_class = PaymentHistorySerializer
+    pagination_class = HistoryCursorPagination
 
     def get_queryset(self):
-        user = self.request.user
-        return PaymentTransaction.objects.filter(buyer_email=user.email).order_by('-id')
+        return (
+            PaymentTransaction.objects.filter(user_id=self.request.user.pk)
+            .select_related("ticket__event", "ticket__config_type__ticket_type")
+            .only(
+                "id",
+                "reference_code",
+                "transaction_id",
+                "status",
+                "amount",
+                "currency",
+                "gateway",
+                "created_at",
+                "updated_at",
+                "ticket__event__event_name",
+                "ticket__config_type__ticket_type__ticket_name",
+            )
+        )
+
+class RevenueReportView(APIView):
+    """
+    Ingresos aprobados por día y por evento, leídos solo de los acumulados
+    (DailyRevenue, EventRevenue); no recorre transacciones.
+    Los administradores ven todo; los demás, solo los eventos que crearon.
+    """
+    authentication_classes = [AccessTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    DEFAULT_DAYS = 30
+
+    @extend_schema(
+        tags=["Pagos"],
+        operation_id="payments_revenue_report",
+        parameters=[RevenueQuerySerializer],
+        responses=RevenueReportSerializer,
+    )
+    def get(self, request):
+        query = RevenueQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        date_to = query.validated_data.get("date_to") or timezone.localdate()
+        date_from = query.validated_data.get("date_from") or date_to - timedelta(days=self.DEFAULT_DAYS - 1)
+        is_admin = has_role(request.user, "Administrador")
+
+        events = EventRevenue.objects.select_related("event").only(
+            "event_id", "event__event_name", "currency", "revenue", "approved_count"
+        )
+        if not is_admin:
+            events = events.filter(event__creator_id=request.user.pk)
+        if "event" in query.validated_data:
+            events = events.filter(event_id=query.validated_data["event"])
+
+        data = {
+            "date_from": date_from,
+            "date_to": date_to,
+            "events": EventRevenueSerializer(events.order_by("-revenue", "event_id"), many=True).data,
+        }
+        if is_admin:
+            daily = DailyRevenue.objects.filter(day__range=(date_from, date_to)).order_by("day", "currency")
+            data["daily"] = DailyRevenueSerializer(daily, many=True).data
+        return Response(data, status=status.HTTP_200_OK)
+
 
 class PayUInitPaymentView(APIView):
     """Inicia el proceso de pago con PayU para un ticket específico."""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
         tags=["Pagos"],
         request=EmptySerializer,  
-        responses=PayUDataResponseSerializer 
+        responses=PayUDataResponseSerializer,
+        parameters=[IDEMPOTENCY_PARAMETER],
     )
     # --- CAMBIO 2: Añade este método 'dispatch' ---
     # (Este método aplica el rate limit a TODOS los métodos: POST, GET, etc.)
@@ -118,6 +216,7 @@ class PayUInitPaymentView(APIView):
     def dispatch(self, *args, **kwargs):
         return super().dispatch(*args, **kwargs)
     # --- FIN DEL CAMBIO ---
+    @idempotent
     def post(self, request, ticket_id):
         try:
             from eventos.models import Ticket
@@ -143,62 +242,82 @@ class PayUInitPaymentView(APIView):
                 )
 
             config = get_payu_config()
-            reference_code = ticket.unique_code
-            # PayU exige montos con dos decimales exactos
-            amount_value = (ticket.config_type.price * ticket.amount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            amount = format(amount_value, ".2f")
+            # Los tickets de un carrito se pagan juntos con la referencia de la orden
+            if ticket.payment_reference:
+                reference_code = ticket.payment_reference
+                order_tickets = list(
+                    Ticket.objects.filter(payment_reference=reference_code, user=request.user)
+                    .exclude(status__in=["cancelada", "usada"])
+                    .select_related("config_type")
+                )
+                description = f"{ticket.event.event_name} - {len(order_tickets)} tipo(s) de ticket"
+            else:
+                reference_code = ticket.unique_code
+                order_tickets = [ticket]
+                description = f"{ticket.event.event_name} - {ticket.config_type.ticket_type.ticket_name}"
             buyer_email = ticket.user.email
-            description = f"{ticket.event.event_name} - {ticket.config_type.ticket_type.ticket_name}"
-            payment, created = PaymentTransaction.objects.get_or_create(
+            payment_data = build_payu_form_data(
+                config,
                 reference_code=reference_code,
-                defaults={
-                    "amount": amount_value,
-                    "status": "iniciada",
-                    "buyer_email": buyer_email,
-                    "currency": config["currency"],
-                },
+                amount_value=sum((item.config_type.price * item.amount for item in order_tickets), Decimal("0")),
+                description=description,
+                buyer_email=buyer_email,
             )
-
-            if not created and payment.status == "aprobado":
-                return Response(
-                    {"error": "Este ticket ya cuenta con un pago aprobado."},
-                    status=status.HTTP_400_BAD_REQUEST,
+            amount_value = Decimal(payment_data["amount"])
+            linked_ticket = min(order_tickets, key=lambda item: item.id)
+            with transaction.atomic():
+                payment, created = PaymentTransaction.objects.get_or_create(
+                    reference_code=reference_code,
+                    defaults={
+                        "amount": amount_value,
+                        "status": "iniciada",
+                        "buyer_email": buyer_email,
+                        "currency": config["currency"],
+                        "ticket": linked_ticket,
+                        "user": request.user,
+                    },
                 )
 
-            if not created:
-                payment.amount = amount_value
-                payment.status = "iniciada"
-                payment.currency = config["currency"]
-                payment.buyer_email = buyer_email
-                payment.transaction_id = None
-                payment.updated_at = timezone.now()
-                payment.save(update_fields=["amount", "status", "currency", "buyer_email", "transaction_id", "updated_at"])
-            #print(f"[DEBUG PAYU - CANDADO] Generando firma con: api_key={config['api_key']}, merchant_id={config['merchant_id']}, reference_code={reference_code}, amount={amount}, currency={config['currency']}")
-            signature = generate_payu_signature(
-                config['api_key'], config['merchant_id'], reference_code, amount, currency=config['currency']
-            )
+                if not created and payment.status == "aprobado":
+                    return Response(
+                        {"error": "Este ticket ya cuenta con un pago aprobado."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
+                if created:
+                    record_transition(
+                        payment, from_status="", from_amount=Decimal("0"), event_id=linked_ticket.event_id
+                    )
+                else:
+                    from_status, from_amount = payment.status, payment.amount
+                    payment.amount = amount_value
+                    payment.status = "iniciada"
+                    payment.currency = config["currency"]
+                    payment.buyer_email = buyer_email
+                    payment.transaction_id = None
+                    payment.ticket = linked_ticket
+                    payment.user_id = request.user.pk
+                    payment.updated_at = timezone.now()
+                    payment.save(
+                        update_fields=[
+                            "amount", "status", "currency", "buyer_email", "transaction_id", "ticket", "user", "updated_at"
+                        ]
+                    )
+                    record_transition(
+                        payment, from_status=from_status, from_amount=from_amount, event_id=linked_ticket.event_id
+                    )
             logger.info(
                 "Transacción iniciada: referencia=%s, usuario=%s, ticket_id=%s",
                 reference_code,
                 buyer_email,
                 ticket_id,
             )
-            return Response({
-                "sandbox": config['sandbox'],
-                "merchantId": config['merchant_id'],
-                "accountId": config['account_id'],
-                "description": description,
-                "referenceCode": reference_code,
-                "amount": amount,
-                "currency": config['currency'],
-                "signature": signature,
-                "buyerEmail": buyer_email,
-                "confirmationUrl": config['confirmation_url'],
-                "responseUrl": config['response_url']
-            }, status=status.HTTP_200_OK)
+            return Response(payment_data, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Error iniciando pago: {str(e)}", exc_info=True)
-            return Response({"error": "No se pudo iniciar el pago. Intente nuevamente."}, status=status.HTTP_400_BAD_REQUEST)
+            return do_not_replay(
+                Response({"error": "No se pudo iniciar el pago. Intente nuevamente."}, status=status.HTTP_400_BAD_REQUEST)
+            )
 
 @method_decorator(csrf_exempt, name='dispatch')
 class PayUConfirmationAPIView(APIView):
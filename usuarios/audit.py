@@ -0,0 +1,77 @@
+"""
+usuarios/audit.py
+Utilidades de auditoría por diferencias para modelos con historial de cambios.
+
+Los modelos que heredan ``AuditSnapshotMixin`` recuerdan, al cargarse, los
+valores de sus ``AUDIT_FIELDS``. Las señales comparan contra esa foto en lugar
+de volver a consultar la fila y escriben todos los cambios de un save con un
+único ``bulk_create`` cuando la transacción confirma.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+
+
+class AuditSnapshotMixin:
+    """Guarda los valores originales de ``AUDIT_FIELDS`` al cargar la instancia."""
+
+    AUDIT_FIELDS: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._audit_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.AUDIT_FIELDS
+        }
+        return instance
+
+
+def _tracked(instance, update_fields: Optional[Iterable[str]]) -> List[str]:
+    if update_fields is None:
+        return list(instance.AUDIT_FIELDS)
+    update_fields = set(update_fields)
+    return [name for name in instance.AUDIT_FIELDS if name in update_fields or name.removesuffix("_id") in update_fields]
+
+
+def collect_changes(instance, update_fields: Optional[Iterable[str]] = None) -> List[Tuple[str, object, object]]:
+    """
+    Devuelve ``(campo, valor_anterior, valor_nuevo)`` de los campos auditados que cambian.
+    Solo consulta la base si la instancia no se cargó con todos los campos auditados.
+    """
+    if instance._state.adding or instance.pk is None:
+        return []
+    fields = _tracked(instance, update_fields)
+    if not fields:
+        return []
+    previous: Optional[Dict[str, object]] = getattr(instance, "_audit_values", None)
+    if previous is None or any(name not in previous for name in fields):
+        previous = type(instance)._default_manager.filter(pk=instance.pk).values(*fields).first()
+        if previous is None:
+            return []
+    changes = []
+    for name in fields:
+        new_value = getattr(instance, name)
+        if previous[name] != new_value:
+            changes.append((name, previous[name], new_value))
+    return changes
+
+
+def remember_values(instance, update_fields: Optional[Iterable[str]] = None) -> None:
+    """Actualiza la foto de la instancia con los valores recién guardados."""
+    if update_fields is None:
+        deferred = instance.get_deferred_fields()
+        instance._audit_values = {
+            name: getattr(instance, name) for name in instance.AUDIT_FIELDS if name not in deferred
+        }
+        return
+    snapshot = getattr(instance, "_audit_values", None)
+    if snapshot is not None:
+        for name in _tracked(instance, update_fields):
+            snapshot[name] = getattr(instance, name)
+
+
+def write_change_logs(log_model, entries: List) -> None:
+    """Inserta los registros de auditoría en un solo ``bulk_create`` al confirmar la transacción."""
+    if entries:
+        transaction.on_commit(lambda: log_model.objects.bulk_create(entries))
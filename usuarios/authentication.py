@@ -0,0 +1,101 @@
+"""
+usuarios/authentication.py
+Autenticación por token firmado de corta duración.
+
+El login entrega el ``Token`` de DRF, que solo sirve como token de refresco
+en ``/api/users/token/refresh/`` y se revoca borrando su fila, y un token de
+acceso firmado con SECRET_KEY que lleva el id del usuario, su email, sus
+roles y el vencimiento. Cada petición verifica la firma y hace una sola
+consulta por llave primaria para confirmar que el usuario sigue activo; los
+roles se leen de la caché de roles, que se invalida al cambiar los grupos,
+y no de los claims. El resto de campos se difiere hasta que la vista los lea.
+"""
+
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .models import CustomUser
+from .roles import get_user_roles
+
+ACCESS_TOKEN_SALT = "usuarios.authentication.access"
+ACCESS_TOKEN_KEYWORD = "Bearer"
+DEFAULT_ACCESS_TOKEN_SECONDS = 300
+
+
+def _access_token_seconds() -> int:
+    return getattr(settings, "ACCESS_TOKEN_SECONDS", DEFAULT_ACCESS_TOKEN_SECONDS)
+
+
+def issue_access_token(user) -> Tuple[str, datetime]:
+    """Firma un token de acceso para el usuario y devuelve el token y su vencimiento."""
+    expires = int(time.time()) + _access_token_seconds()
+    payload = {
+        "u": user.pk,
+        "e": user.email,
+        "r": sorted(get_user_roles(user)),
+        "exp": expires,
+    }
+    token = signing.dumps(payload, salt=ACCESS_TOKEN_SALT, compress=True)
+    return token, datetime.fromtimestamp(expires, tz=dt_timezone.utc)
+
+
+def read_access_token(token: str) -> Optional[dict]:
+    """Devuelve los claims de un token de acceso válido y vigente, o None."""
+    try:
+        payload = signing.loads(token, salt=ACCESS_TOKEN_SALT, max_age=_access_token_seconds())
+    except signing.BadSignature:
+        return None
+    if not isinstance(payload, dict) or payload.get("exp", 0) < time.time():
+        return None
+    return payload
+
+
+def _user_from_claims(payload: dict) -> CustomUser:
+    # Solo id, email e is_active; el resto de campos se difiere y se consulta
+    # únicamente si la vista lo necesita
+    user = CustomUser.objects.only("id", "email", "is_active").filter(pk=payload["u"]).first()
+    if user is None or not user.is_active:
+        raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+    return user
+
+
+class AccessTokenAuthentication(BaseAuthentication):
+    """
+    Acepta ``Authorization: Bearer <token firmado>``. El ``Token`` de login no
+    es una credencial de la API: solo se canjea por un token de acceso.
+    """
+
+    keyword = ACCESS_TOKEN_KEYWORD
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth:
+            return None
+        if auth[0].lower() == b"token":
+            raise exceptions.AuthenticationFailed(
+                "El token de login solo sirve para renovar el acceso; envía Authorization: Bearer <access_token>."
+            )
+        if auth[0].lower() != ACCESS_TOKEN_KEYWORD.lower().encode():
+            return None
+
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_("Invalid token header."))
+
+        payload = read_access_token(token)
+        if payload is None:
+            raise exceptions.AuthenticationFailed("Token de acceso inválido o vencido.")
+        return _user_from_claims(payload), payload
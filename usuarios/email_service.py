@@ -1,14 +1,45 @@
-"""Servicios de email y administración de tokens para el módulo de usuarios."""
+"""
+Servicios de email y administración de tokens para el módulo de usuarios.
 
+Cada correo se guarda en ``EmailOutbox`` dentro de la transacción que lo
+origina. Con ``EMAIL_OUTBOX_ENABLED`` en False (por defecto) se envía en
+cuanto esa transacción se confirma; con True solo se encola y lo despacha un
+proceso aparte, ``python manage.py send_queued_emails --loop``, en lotes por
+una sola conexión SMTP. En ambos modos los fallos quedan pendientes con
+backoff y el mismo comando (p. ej. desde cron) los reintenta.
+
+Los lotes se reclaman en una transacción corta que corre ``next_attempt_at``
+``EMAIL_OUTBOX_LEASE_SECONDS`` hacia adelante; el envío SMTP ocurre fuera de
+ella y el resultado se guarda después. Si el proceso muere a mitad de lote,
+los correos vuelven a estar disponibles al vencer ese plazo.
+"""
+
+import logging
 import secrets
+import smtplib
 from datetime import timedelta
+from functools import lru_cache, partial
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from django.conf import settings
-from django.core.mail import send_mail
 from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import Template
+from django.template.loader import get_template
 from django.utils import timezone
 
-from .models import UserToken
+from .models import EmailOutbox, UserToken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_SECONDS = 60
+DEFAULT_LEASE_SECONDS = 300
+MAX_RETRY_SECONDS = 6 * 60 * 60
 
 
 def _create_token(user, token_type, hours_valid):
@@ -34,93 +65,187 @@ def create_email_verification_token(user):
     return _create_token(user, UserToken.TokenType.EMAIL_VERIFICATION, hours_valid=24)
 
 
-def _send_email(subject, message, recipient):
+def _require_from_email() -> None:
     if not getattr(settings, "DEFAULT_FROM_EMAIL", None):
         raise ImproperlyConfigured("DEFAULT_FROM_EMAIL no está configurado.")
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [recipient],
-        fail_silently=False,
-    )
 
 
-def send_verification_email(user, token):
+def _require_frontend_url() -> None:
     if not getattr(settings, "FRONTEND_URL", None):
         raise ImproperlyConfigured("FRONTEND_URL no está configurado.")
-    verification_url = f"{settings.FRONTEND_URL}/verify-email?token={token}"
-    subject = "Verifica tu correo electrónico"
-    text_message = (
-        f"Hola {user.first_name},\n\n"
-        "Por favor verifica tu correo haciendo clic en el siguiente enlace:\n"
-        f"{verification_url}\n\nSi no creaste esta cuenta, ignora este mensaje."
+
+
+def outbox_enabled() -> bool:
+    """True si los correos los despacha ``send_queued_emails`` y no la petición."""
+    return getattr(settings, "EMAIL_OUTBOX_ENABLED", False)
+
+
+def _send_after_commit(ids: List[int]) -> None:
+    if ids and not outbox_enabled():
+        transaction.on_commit(partial(send_queued_now, ids))
+
+
+def queue_email(recipient: str, subject: str, template: str, context: Dict[str, Any]) -> EmailOutbox:
+    """
+    Encola un correo en el outbox. Se guarda en la transacción del llamador, de
+    modo que solo se envía si el cambio que lo origina se confirma.
+    """
+    _require_from_email()
+    entry = EmailOutbox.objects.create(to_email=recipient, subject=subject, template=template, context=context)
+    _send_after_commit([entry.pk])
+    return entry
+
+
+def queue_emails(messages: Iterable[Tuple[str, str, str, Dict[str, Any]]], batch_size: int = 500) -> int:
+    """Encola varios correos ``(destinatario, asunto, plantilla, contexto)`` con bulk_create."""
+    _require_from_email()
+    rows = [
+        EmailOutbox(to_email=recipient, subject=subject, template=template, context=context)
+        for recipient, subject, template, context in messages
+    ]
+    EmailOutbox.objects.bulk_create(rows, batch_size=batch_size)
+    _send_after_commit([row.pk for row in rows if row.pk is not None])
+    return len(rows)
+
+
+@lru_cache(maxsize=None)
+def _compiled_template(name: str) -> Optional[Template]:
+    # Las plantillas se compilan una vez por proceso; None si no existe la variante
+    try:
+        return get_template(name)
+    except TemplateDoesNotExist:
+        return None
+
+
+def render_email(entry: EmailOutbox) -> EmailMultiAlternatives:
+    """Construye el mensaje de un registro del outbox a partir de sus plantillas .txt y .html."""
+    text_template = _compiled_template(f"{entry.template}.txt")
+    if text_template is None:
+        raise TemplateDoesNotExist(f"{entry.template}.txt")
+    message = EmailMultiAlternatives(
+        entry.subject,
+        text_template.render(entry.context),
+        settings.DEFAULT_FROM_EMAIL,
+        [entry.to_email],
     )
-    html_message = f"""
-    <!DOCTYPE html>
-    <html lang='es'>
-    <head><meta charset='UTF-8'></head>
-    <body style='margin:0;padding:0;background:#f5f6fa;font-family:Arial,Helvetica,sans-serif;'>
-        <table width='100%' bgcolor='#f5f6fa' cellpadding='0' cellspacing='0'>
-            <tr><td align='center'>
-                <table width='480' style='background:#fff;border-radius:12px;box-shadow:0 2px 8px #0001;margin:40px 0;'>
-                    <tr><td style='padding:32px 32px 16px 32px;text-align:center;'>
-                        <div style="font-size:32px;font-weight:bold;background:linear-gradient(90deg,#2563eb,#a21caf);-webkit-background-clip:text;-webkit-text-fill-color:transparent;color:#ffffff;">Gestify</div>
-                        <h2 style='color:#222222;margin:24px 0 8px 0;'>Verifica tu correo electrónico</h2>
-                        <p style='color:#444444;margin:0 0 24px 0;'>Hola, <b>{user.first_name}</b>:</p>
-                        <p style='color:#444444;margin:0 0 24px 0;'>Por favor, haz clic en el siguiente botón para verificar tu cuenta y activar tu acceso a <b style="color:#a21caf;">Gestify</b>.</p>
-                        <a href='{verification_url}' style='display:inline-block;padding:14px 32px;background:linear-gradient(90deg,#2563eb,#a21caf);color:#fff;text-decoration:none;font-weight:bold;border-radius:8px;font-size:16px;margin-bottom:16px;'>Verificar mi correo</a>
-                        <p style='color:#888888;font-size:13px;margin:24px 0 0 0;'>Si el botón no funciona, copia y pega este enlace en tu navegador:</p>
-                        <p style='word-break:break-all;color:#2563eb;font-size:13px;margin:8px 0 0 0;'>{verification_url}</p>
-                        <p style='color:#aaaaaa;font-size:12px;margin:32px 0 0 0;'>Si no creaste esta cuenta, ignora este mensaje.</p>
-                        <hr style='border:none;border-top:1px solid #eee;margin:32px 0 16px 0;'>
-                        <p style='color:#888;font-size:13px;margin:0;'>¡Gracias por unirte a Gestify! Si tienes dudas, contáctanos en <a href='mailto:soporte@gestify.com' style='color:#2563eb;text-decoration:none;'>soporte@gestify.com</a>.</p>
-                    </td></tr>
-                </table>
-            </td></tr>
-        </table>
-    </body>
-    </html>
+    html_template = _compiled_template(f"{entry.template}.html")
+    if html_template is not None:
+        message.attach_alternative(html_template.render(entry.context), "text/html")
+    return message
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    base = getattr(settings, "EMAIL_OUTBOX_RETRY_SECONDS", DEFAULT_RETRY_SECONDS)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), MAX_RETRY_SECONDS))
+
+
+def claim_entries(batch_size: int, ids: Optional[Iterable[int]] = None) -> List[EmailOutbox]:
+    """
+    Reclama correos pendientes y vencidos en una transacción corta: suma el
+    intento y corre ``next_attempt_at`` por EMAIL_OUTBOX_LEASE_SECONDS para que
+    otro proceso no los tome mientras se envían.
     """
-    from django.core.mail import EmailMultiAlternatives
-    email = EmailMultiAlternatives(subject, text_message, settings.DEFAULT_FROM_EMAIL, [user.email])
-    email.attach_alternative(html_message, "text/html")
-    email.send()
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, "EMAIL_OUTBOX_LEASE_SECONDS", DEFAULT_LEASE_SECONDS))
+    with transaction.atomic():
+        pending = EmailOutbox.objects.select_for_update(skip_locked=True).filter(
+            status=EmailOutbox.Status.PENDIENTE, next_attempt_at__lte=now
+        )
+        if ids is not None:
+            pending = pending.filter(pk__in=list(ids))
+        entries = list(pending.order_by("next_attempt_at", "id")[:batch_size])
+        for entry in entries:
+            entry.attempts += 1
+            entry.next_attempt_at = now + lease
+        EmailOutbox.objects.bulk_update(entries, ["attempts", "next_attempt_at"])
+    return entries
+
+
+def send_entries(connection, entries: List[EmailOutbox]) -> Dict[str, int]:
+    """
+    Envía correos ya reclamados por una conexión SMTP abierta y guarda el
+    resultado. Los fallos se reprograman con backoff exponencial hasta
+    EMAIL_OUTBOX_MAX_ATTEMPTS; los que no alcanzaron a enviarse se liberan.
+    """
+    max_attempts = getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+    result = {"sent": 0, "retried": 0, "failed": 0}
+    done = []
+    for entry in entries:
+        try:
+            connection.send_messages([render_email(entry)])
+        except Exception as exc:  # noqa: BLE001 - se registra y reintenta
+            logger.warning("Error enviando correo %s a %s: %s", entry.pk, entry.to_email, exc)
+            entry.last_error = str(exc)[:1000]
+            if entry.attempts >= max_attempts:
+                entry.status = EmailOutbox.Status.FALLIDO
+                result["failed"] += 1
+            else:
+                entry.next_attempt_at = timezone.now() + _retry_delay(entry.attempts)
+                result["retried"] += 1
+            done.append(entry)
+            if isinstance(exc, (smtplib.SMTPException, OSError)):
+                # Una conexión caída se reabre; si no se puede, el resto espera al siguiente lote
+                try:
+                    connection.close()
+                    connection.open()
+                except (smtplib.SMTPException, OSError):
+                    logger.error("No se pudo reabrir la conexión SMTP; se detiene el lote.")
+                    break
+        else:
+            entry.status = EmailOutbox.Status.ENVIADO
+            entry.sent_at = timezone.now()
+            entry.last_error = ""
+            result["sent"] += 1
+            done.append(entry)
+
+    EmailOutbox.objects.bulk_update(done, ["status", "next_attempt_at", "last_error", "sent_at"])
+    skipped = [entry.pk for entry in entries if entry not in done]
+    if skipped:
+        # No se intentaron: se devuelven sin gastar el intento
+        EmailOutbox.objects.filter(pk__in=skipped).update(
+            attempts=F("attempts") - 1, next_attempt_at=timezone.now()
+        )
+    return result
+
+
+def send_outbox_batch(connection, batch_size: int = DEFAULT_OUTBOX_BATCH_SIZE) -> Dict[str, int]:
+    """Reclama y envía un lote de correos pendientes por una conexión SMTP ya abierta."""
+    return send_entries(connection, claim_entries(batch_size))
+
+
+def send_queued_now(ids: List[int]) -> Dict[str, int]:
+    """Envía en el momento los correos indicados; lo que falle queda pendiente para reintento."""
+    entries = claim_entries(len(ids), ids=ids)
+    if not entries:
+        return {"sent": 0, "retried": 0, "failed": 0}
+    # La conexión se abre en el primer envío; un error al abrirla se registra como fallo del correo
+    connection = get_connection()
+    try:
+        return send_entries(connection, entries)
+    finally:
+        connection.close()
+
+
+def send_verification_email(user, token):
+    _require_frontend_url()
+    queue_email(
+        user.email,
+        "Verifica tu correo electrónico",
+        "emails/verification",
+        {
+            "first_name": user.first_name,
+            "verification_url": f"{settings.FRONTEND_URL}/verify-email?token={token}",
+        },
+    )
 
 
 def send_confirmation_email(user):
-    subject = "Registro exitoso"
-    text_message = (
-        f"Hola {user.first_name},\n\n"
-        "Tu cuenta ha sido verificada y el registro fue exitoso. ¡Bienvenido a Gestify!"
+    queue_email(
+        user.email,
+        "Registro exitoso",
+        "emails/confirmation",
+        {"first_name": user.first_name},
     )
-    html_message = f"""
-    <!DOCTYPE html>
-    <html lang='es'>
-    <head><meta charset='UTF-8'></head>
-    <body style='margin:0;padding:0;background:#f5f6fa;font-family:Arial,Helvetica,sans-serif;'>
-        <table width='100%' bgcolor='#f5f6fa' cellpadding='0' cellspacing='0'>
-            <tr><td align='center'>
-                <table width='480' style='background:#fff;border-radius:12px;box-shadow:0 2px 8px #0001;margin:40px 0;'>
-                    <tr><td style='padding:32px 32px 16px 32px;text-align:center;'>
-                        <div style="font-size:32px;font-weight:bold;background:linear-gradient(90deg,#2563eb,#a21caf);-webkit-background-clip:text;-webkit-text-fill-color:transparent;color:#ffffff;">Gestify</div>
-                        <h2 style='color:#222222;margin:24px 0 8px 0;'>¡Registro exitoso!</h2>
-                        <p style='color:#444444;margin:0 0 24px 0;'>Hola, <b>{user.first_name}</b>:</p>
-                        <p style='color:#444444;margin:0 0 24px 0;'>Tu cuenta ha sido verificada y el registro fue exitoso.<br>¡Bienvenido a <b style="color:#a21caf;">Gestify</b>!</p>
-                        <p style='color:#888888;font-size:13px;margin:32px 0 0 0;'>Ahora puedes acceder a todas las funcionalidades de la plataforma.</p>
-                        <hr style='border:none;border-top:1px solid #eee;margin:32px 0 16px 0;'>
-                        <p style='color:#888;font-size:13px;margin:0;'>¡Gracias por unirte a Gestify! Si tienes dudas, contáctanos en <a href='mailto:soporte@gestify.com' style='color:#2563eb;text-decoration:none;'>soporte@gestify.com</a>.</p>
-                    </td></tr>
-                </table>
-            </td></tr>
-        </table>
-    </body>
-    </html>
-    """
-    from django.core.mail import EmailMultiAlternatives
-    email = EmailMultiAlternatives(subject, text_message, settings.DEFAULT_FROM_EMAIL, [user.email])
-    email.attach_alternative(html_message, "text/html")
-    email.send()
 
 
 def create_password_reset_token(user):
@@ -128,13 +253,13 @@ def create_password_reset_token(user):
 
 
 def send_password_reset_email(user, token):
-    if not getattr(settings, "FRONTEND_URL", None):
-        raise ImproperlyConfigured("FRONTEND_URL no está configurado.")
-    reset_url = f"{settings.FRONTEND_URL}/reset-password?token={token}"
-    subject = "Recuperación de contraseña"
-    message = (
-        f"Hola {user.first_name},\n\n"
-        "Para restablecer tu contraseña, haz clic en el siguiente enlace:\n"
-        f"{reset_url}\n\nSi no solicitaste este cambio, ignora este mensaje."
+    _require_frontend_url()
+    queue_email(
+        user.email,
+        "Recuperación de contraseña",
+        "emails/password_reset",
+        {
+            "first_name": user.first_name,
+            "reset_url": f"{settings.FRONTEND_URL}/reset-password?token={token}",
+        },
     )
-    _send_email(subject, message, user.email)
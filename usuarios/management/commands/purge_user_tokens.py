@@ -0,0 +1,39 @@
+"""Elimina en lotes los tokens de verificación y recuperación vencidos o ya usados."""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from usuarios.models import UserToken
+
+
+class Command(BaseCommand):
+    help = "Purga de users_token los tokens vencidos o usados, por lotes de clave primaria."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Cantidad de tokens eliminados por consulta.",
+        )
+        parser.add_argument(
+            "--grace-hours",
+            type=int,
+            default=24,
+            help="Conserva los tokens vencidos o usados durante estas horas (para mensajes al usuario).",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+        stale = UserToken.objects.filter(Q(expires_at__lt=cutoff) | Q(is_used=True, created_at__lt=cutoff))
+        batch_size = options["batch_size"]
+        deleted = 0
+        while True:
+            batch = list(stale.values_list("pk", flat=True)[:batch_size])
+            if not batch:
+                break
+            deleted += UserToken.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Tokens eliminados: {deleted}."))
@@ -0,0 +1,54 @@
+"""Despacha los correos del outbox en lotes sobre una única conexión SMTP."""
+
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from usuarios.email_service import DEFAULT_OUTBOX_BATCH_SIZE, send_outbox_batch
+
+
+class Command(BaseCommand):
+    help = "Envía los correos pendientes de EmailOutbox reutilizando una conexión SMTP."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_OUTBOX_BATCH_SIZE,
+            help="Cantidad de correos tomados por transacción.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Sigue ejecutándose y sondea el outbox cuando se vacía.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5.0,
+            help="Segundos de espera entre sondeos con --loop.",
+        )
+
+    def handle(self, *args, **options):
+        totals = {"sent": 0, "retried": 0, "failed": 0}
+        connection = get_connection()
+        connection.open()
+        try:
+            while True:
+                result = send_outbox_batch(connection, batch_size=options["batch_size"])
+                for key, value in result.items():
+                    totals[key] += value
+                if sum(result.values()) == 0:
+                    if not options["loop"]:
+                        break
+                    time.sleep(options["sleep"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Correos enviados: {totals['sent']}. Reprogramados: {totals['retried']}. Fallidos: {totals['failed']}."
+            )
+        )
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usertoken',
+            index=models.Index(fields=['user', 'token_type', 'is_used', 'expires_at'], name='users_token_user_id_390568_idx'),
+        ),
+    ]
@@ -7,6 +7,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
+from .audit import AuditSnapshotMixin
+
 class DocumentType(models.Model):
     """Tipo de documento normalizado (cédula, pasaporte, etc)."""
     name = models.CharField(max_length=50, unique=True, help_text="Nombre del tipo de documento")
@@ -21,8 +23,10 @@ class DocumentType(models.Model):
     def __str__(self):
         return f"{self.name} ({self.code})"
 
-class CustomUser(AbstractUser):
+class CustomUser(AuditSnapshotMixin, AbstractUser):
     """Usuario personalizado basado en AbstractUser."""
+    # Campos cuyo cambio queda en UserChangeLog
+    AUDIT_FIELDS = ("email", "first_name", "last_name", "phone", "birth_date", "department_id", "city_id")
     username = models.CharField(max_length=150, unique=True)
     first_name = models.CharField(max_length=150, help_text="Nombres")
     last_name = models.CharField(max_length=150, help_text="Apellidos")
@@ -87,6 +91,8 @@ class UserToken(models.Model):
         db_table = "users_token"
         indexes = [
             models.Index(fields=["token", "token_type"]),
+            # Cubre la invalidación de tokens vigentes en _create_token
+            models.Index(fields=["user", "token_type", "is_used", "expires_at"]),
         ]
 
     def __str__(self):
@@ -100,3 +106,36 @@ class UserToken(models.Model):
     def is_valid(self) -> bool:
         return (not self.is_used) and self.expires_at >= timezone.now()
 
+
+
+class EmailOutbox(models.Model):
+    """
+    Correo pendiente de envío. Se escribe en la misma transacción que el cambio
+    que lo origina; se envía al confirmarla o, con EMAIL_OUTBOX_ENABLED, lo
+    despacha el comando ``send_queued_emails``.
+    """
+
+    class Status(models.TextChoices):
+        PENDIENTE = "pendiente", "Pendiente"
+        ENVIADO = "enviado", "Enviado"
+        FALLIDO = "fallido", "Fallido"
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    template = models.CharField(max_length=100, help_text="Plantilla base, sin extensión (se usan .txt y .html).")
+    context = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDIENTE)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = "users_email_outbox"
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email} - {self.subject} ({self.status})"
@@ -2,6 +2,7 @@
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
 from rest_framework import serializers, status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
@@ -51,8 +52,9 @@ class PasswordResetRequestView(APIView):
         if not user.is_email_verified:
             return Response({'error': 'Debes verificar tu email antes de recuperar la contraseña.'}, status=status.HTTP_403_FORBIDDEN)
         try:
-            token_value = create_password_reset_token(user)
-            send_password_reset_email(user, token_value)
+            with transaction.atomic():
+                token_value = create_password_reset_token(user)
+                send_password_reset_email(user, token_value)
         except ImproperlyConfigured as exc:
             return Response({'error': str(exc)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response({'message': 'Se ha enviado el enlace de recuperación al correo.'}, status=status.HTTP_200_OK)
@@ -4,6 +4,8 @@ Permisos personalizados para el módulo de usuarios. Clean code y comentarios cl
 """
 from rest_framework.permissions import BasePermission
 
+from .roles import has_role
+
 class IsInGroup(BasePermission):
     """
     Permite acceso solo si el usuario pertenece a un grupo específico.
@@ -16,7 +18,7 @@ class IsInGroup(BasePermission):
         name = getattr(view, 'required_group', self.group_name)
         if not name:
             return False
-        return request.user.groups.filter(name=name).exists()
+        return has_role(request.user, name)
 
 class IsAdminGroup(IsInGroup):
     group_name = "Administrador"
@@ -35,7 +37,7 @@ class IsStaffOrAdmin(BasePermission):
     def has_permission(self, request, view):  # type: ignore[override]
         if not request.user or not request.user.is_authenticated:
             return False
-        return request.user.groups.filter(name__in={"Administrador", "Staff"}).exists()
+        return has_role(request.user, "Administrador", "Staff")
 
 
 class IsSelfOrAdmin(BasePermission):
@@ -44,6 +46,6 @@ class IsSelfOrAdmin(BasePermission):
     def has_object_permission(self, request, view, obj):
         if not request.user or not request.user.is_authenticated:
             return False
-        if request.user.groups.filter(name="Administrador").exists():
+        if has_role(request.user, "Administrador"):
             return True
         return obj == request.user
\ No newline at end of file
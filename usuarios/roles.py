@@ -0,0 +1,48 @@
+"""
+usuarios/roles.py
+Resolución de roles (grupos) del usuario con caché por petición y compartida.
+
+Los nombres de grupo se guardan en la instancia del usuario, que vive lo que
+dura la petición, y en la caché de Django por ``USER_ROLES_CACHE_SECONDS``.
+Las señales ``m2m_changed`` de ``CustomUser.groups`` invalidan la entrada; un
+renombre de grupo se refleja al vencer el TTL.
+"""
+
+from typing import FrozenSet, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_ROLES_CACHE_SECONDS = 60
+
+
+def _key(user_id: int) -> str:
+    return f"user_roles:{user_id}"
+
+
+def get_user_roles(user) -> FrozenSet[str]:
+    """Nombres de los grupos del usuario; vacío para usuarios anónimos."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, "_role_names", None)
+    if roles is None:
+        cached = cache.get(_key(user.pk))
+        if cached is None:
+            cached = list(user.groups.values_list("name", flat=True))
+            ttl = getattr(settings, "USER_ROLES_CACHE_SECONDS", DEFAULT_ROLES_CACHE_SECONDS)
+            cache.set(_key(user.pk), cached, ttl)
+        roles = frozenset(cached)
+        user._role_names = roles
+    return roles
+
+
+def has_role(user, *names: str) -> bool:
+    """True si el usuario pertenece a alguno de los grupos indicados."""
+    return not get_user_roles(user).isdisjoint(names)
+
+
+def invalidate_user_roles(user_ids: Iterable[int]) -> None:
+    """Descarta los roles cacheados de los usuarios indicados."""
+    keys = [_key(user_id) for user_id in user_ids]
+    if keys:
+        cache.delete_many(keys)
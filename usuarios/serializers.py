@@ -22,6 +22,20 @@ class SimpleEventSerializer(serializers.ModelSerializer):
         model = Event
         fields = ["id", "name", "date", "status"]
 
+def events_by_user(user_ids) -> dict:
+    """Eventos con tickets de cada usuario, resueltos con una sola consulta agrupada."""
+    from eventos.models import Ticket
+    rows = (
+        Ticket.objects.filter(user_id__in=user_ids)
+        .values_list('user_id', 'event_id', 'event__event_name', 'event__start_datetime', 'event__status')
+        .distinct()
+        .order_by('user_id', 'event_id')
+    )
+    result = {user_id: [] for user_id in user_ids}
+    for user_id, event_id, name, start, event_status in rows:
+        result[user_id].append(Event(id=event_id, event_name=name, start_datetime=start, status=event_status))
+    return result
+
 class CustomUserSerializer(serializers.ModelSerializer):
     department_name = serializers.SerializerMethodField()
     city_name = serializers.SerializerMethodField() # <--- cambios para la tabla de super usuario
@@ -71,11 +85,11 @@ class CustomUserSerializer(serializers.ModelSerializer):
     eventos_inscritos = serializers.SerializerMethodField()
     @extend_schema_field(SimpleEventSerializer(many=True))
     def get_eventos_inscritos(self, obj):
-        from eventos.models import Ticket
-        eventos = Ticket.objects.filter(user=obj).select_related('event').values_list('event', flat=True).distinct()
-        from eventos.models import Event
-        eventos_qs = Event.objects.filter(id__in=eventos)
-        return SimpleEventSerializer(eventos_qs, many=True).data
+        # En listas los eventos llegan precargados en el contexto (CustomUserListSerializer)
+        preloaded = self.context.get('events_by_user')
+        if preloaded is None or obj.pk not in preloaded:
+            preloaded = events_by_user([obj.pk])
+        return SimpleEventSerializer(preloaded[obj.pk], many=True).data
     document_type = serializers.StringRelatedField()
 
     class Meta:
@@ -104,6 +118,24 @@ class CustomUserSerializer(serializers.ModelSerializer):
             validated_data['password'] = make_password(validated_data['password'])
         return super().update(instance, validated_data)
     
+
+class _UserListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, 'all') else data)
+        self.child.context['events_by_user'] = events_by_user([user.pk for user in users])
+        return super().to_representation(users)
+
+
+class CustomUserListSerializer(CustomUserSerializer):
+    """
+    Versión de solo lectura para listados de usuarios. Espera usuarios con
+    select_related de documento, departamento y ciudad y prefetch de grupos;
+    los eventos inscritos de toda la página se cargan con una consulta.
+    """
+
+    class Meta(CustomUserSerializer.Meta):
+        list_serializer_class = _UserListSerializer
+
 class AssignRoleSerializer(serializers.Serializer):
     role = serializers.CharField(write_only=True)
 
@@ -186,6 +218,12 @@ class ChangePasswordSerializer(serializers.Serializer):
     old_password = serializers.CharField(write_only=True)
     new_password = serializers.CharField(write_only=True)
 
+class TokenRefreshSerializer(serializers.Serializer):
+    """Serializador para renovar el token de acceso con el token de refresco (Token de login)."""
+    refresh = serializers.CharField(write_only=True)
+    access_token = serializers.CharField(read_only=True)
+    access_expires_at = serializers.DateTimeField(read_only=True)
+
 class MessageSerializer(serializers.Serializer):
     """Serializador genérico para un mensaje de respuesta."""
     message = serializers.CharField()
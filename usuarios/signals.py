@@ -4,35 +4,59 @@ import logging
 
 from django.contrib.auth.models import Group, Permission
 from django.db import transaction
-from django.db.models.signals import post_migrate, pre_save
+from django.db.models.signals import m2m_changed, post_migrate, post_save, pre_save
 from django.dispatch import receiver
 
+from .audit import collect_changes, remember_values, write_change_logs
 from .models import CustomUser, UserChangeLog
+from .roles import invalidate_user_roles
 
 logger = logging.getLogger(__name__)
 
 @receiver(pre_save, sender=CustomUser)
-def log_user_changes(sender, instance, **kwargs):
-    """Registra cambios relevantes en el usuario para auditoría."""
-    if not instance.pk:
-        return  # Solo para actualizaciones, no creación
-    try:
-        old_user = CustomUser.objects.get(pk=instance.pk)
-    except CustomUser.DoesNotExist:
-        return
-    fields_to_track = ["email", "first_name", "last_name", "phone", "birth_date", "department_id", "city_id"]
-    for field in fields_to_track:
-        old_value = getattr(old_user, field, None)
-        new_value = getattr(instance, field, None)
-        if old_value != new_value:
-            UserChangeLog.objects.create(
+def log_user_changes(sender, instance, update_fields=None, **kwargs):
+    """Calcula los cambios relevantes del usuario para auditoría (solo actualizaciones)."""
+    instance._audit_changes = collect_changes(instance, update_fields)
+
+
+@receiver(post_save, sender=CustomUser)
+def write_user_change_logs(sender, instance, update_fields=None, **kwargs):
+    """Escribe en un solo lote los cambios calculados en ``log_user_changes``."""
+    changes = getattr(instance, "_audit_changes", None) or []
+    instance._audit_changes = None
+    changed_by = getattr(instance, '_changed_by', None)
+    write_change_logs(
+        UserChangeLog,
+        [
+            UserChangeLog(
                 user=instance,
-                changed_by=getattr(instance, '_changed_by', None),
+                changed_by=changed_by,
                 change_type="datos personales" if field != "email" else "email",
                 field_changed=field,
                 old_value=str(old_value),
-                new_value=str(new_value)
+                new_value=str(new_value),
             )
+            for field, old_value, new_value in changes
+        ],
+    )
+    remember_values(instance, update_fields)
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def invalidate_roles_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Descarta los roles cacheados cuando cambian los grupos de uno o varios usuarios."""
+    if not reverse:
+        # instance es el usuario
+        if action in {"post_add", "post_remove", "post_clear"}:
+            instance.__dict__.pop("_role_names", None)
+            invalidate_user_roles([instance.pk])
+        return
+    # instance es el grupo; en clear hay que capturar los usuarios antes de borrar
+    if action == "pre_clear":
+        instance._cleared_user_ids = list(instance.user_set.values_list("pk", flat=True))
+    elif action == "post_clear":
+        invalidate_user_roles(getattr(instance, "_cleared_user_ids", []))
+    elif action in {"post_add", "post_remove"}:
+        invalidate_user_roles(pk_set or [])
 
 GROUP_PERMISSION_MAP = {
     "Organizador": [
@@ -1,3 +1,338 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from rest_framework.authtoken.models import Token
+
+from eventos.models import Event, Ticket, TicketType, TicketTypeEvent
+
+from .email_service import (
+    claim_entries,
+    create_email_verification_token,
+    queue_email,
+    send_entries,
+    send_verification_email,
+)
+from .authentication import AccessTokenAuthentication, issue_access_token
+from .roles import get_user_roles, has_role
+from .models import CustomUser, EmailOutbox, UserChangeLog, UserToken
+
+
+class AccessTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="ana",
+            email="ana@example.com",
+            password="clave-segura-123",
+            first_name="Ana",
+            last_name="Pérez",
+        )
+        self.token, _expires = issue_access_token(self.user)
+
+    def test_bearer_user_carries_email_and_active_flag(self):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        user, _claims = AccessTokenAuthentication().authenticate(request)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, "ana@example.com")
+        self.assertIs(user.is_active, True)
+
+    def test_bearer_user_can_save_profile(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+        response = client.patch("/api/users/profile/", {"first_name": "Ana María"}, format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Ana María")
+        self.assertEqual(self.user.email, "ana@example.com")
+        self.assertTrue(self.user.is_active)
+
+    def test_invalid_bearer_token_is_rejected(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Bearer no-es-un-token")
+
+        response = client.patch("/api/users/profile/", {"first_name": "X"}, format="json")
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivated_user_loses_access_before_the_token_expires(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+        response = client.patch("/api/users/profile/", {"first_name": "X"}, format="json")
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_roles_follow_group_changes_instead_of_the_claims(self):
+        self.user.groups.add(Group.objects.get_or_create(name="Organizador")[0])
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+        user, _claims = AccessTokenAuthentication().authenticate(request)
+
+        self.assertEqual(get_user_roles(user), {"Organizador"})
+
+    def test_login_token_only_works_for_refresh(self):
+        refresh = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {refresh.key}")
+
+        response = client.patch("/api/users/profile/", {"first_name": "X"}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+        client.credentials()
+        refreshed = client.post("/api/users/token/refresh/", {"refresh": refresh.key}, format="json")
+        self.assertEqual(refreshed.status_code, 200, refreshed.content)
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {refreshed.json()['access_token']}")
+        self.assertEqual(client.patch("/api/users/profile/", {"first_name": "X"}, format="json").status_code, 200)
+
+
+class UserListTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(
+            username="admin", email="admin@example.com", password="x", first_name="A", last_name="D"
+        )
+        self.admin.groups.add(Group.objects.get_or_create(name="Administrador")[0])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.event = Event.objects.create(event_name="Feria", description="d", status="activo")
+        self.config_type = TicketTypeEvent.objects.create(
+            event=self.event,
+            ticket_type=TicketType.objects.create(ticket_name="General"),
+            price=Decimal("10000"),
+            maximun_capacity=100,
+        )
+        self.participante = Group.objects.get_or_create(name="Participante")[0]
+
+    def add_users(self, start, count):
+        for index in range(start, start + count):
+            user = CustomUser.objects.create_user(
+                username=f"usuario{index}",
+                email=f"usuario{index}@example.com",
+                password="x",
+                first_name="U",
+                last_name="L",
+            )
+            user.groups.add(self.participante)
+            Ticket.objects.create(
+                user=user, event=self.event, config_type=self.config_type, amount=1, unique_code=str(uuid.uuid4())
+            )
+
+    def list_queries(self, **params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get("/api/users/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), len(captured)
+
+    def test_page_includes_roles_and_enrolled_events(self):
+        self.add_users(1, 3)
+
+        page, _queries = self.list_queries(page_size=2, page=2)
+
+        self.assertEqual(page["count"], 4)
+        self.assertEqual([user["email"] for user in page["results"]], ["usuario2@example.com", "usuario3@example.com"])
+        self.assertEqual(page["results"][0]["role"], ["Participante"])
+        self.assertEqual([event["id"] for event in page["results"][0]["eventos_inscritos"]], [self.event.pk])
+
+    def test_query_count_does_not_depend_on_the_page_size(self):
+        self.add_users(1, 6)
+        self.client.get("/api/users/")  # carga los roles del administrador
+
+        _page, small = self.list_queries(page_size=2)
+        _page, large = self.list_queries(page_size=7)
+
+        self.assertEqual(large, small)
+
+
+class UserTokenTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="pablo", email="pablo@example.com", password="x", first_name="Pablo", last_name="T"
+        )
+
+    def token(self, *, age_hours, expires_in_hours, is_used=False):
+        token = UserToken.objects.create(
+            user=self.user,
+            token=uuid.uuid4().hex,
+            token_type=UserToken.TokenType.PASSWORD_RESET,
+            expires_at=timezone.now() + timedelta(hours=expires_in_hours),
+            is_used=is_used,
+        )
+        UserToken.objects.filter(pk=token.pk).update(created_at=timezone.now() - timedelta(hours=age_hours))
+        return token
+
+    def test_new_token_invalidates_the_previous_ones_of_its_type(self):
+        first = create_email_verification_token(self.user)
+
+        second = create_email_verification_token(self.user)
+
+        self.assertTrue(UserToken.objects.get(token=first).is_used)
+        self.assertTrue(UserToken.objects.get(token=second).is_valid())
+
+    def test_purge_removes_expired_and_used_tokens_after_the_grace_period(self):
+        expired = self.token(age_hours=60, expires_in_hours=-48)
+        used = self.token(age_hours=48, expires_in_hours=24, is_used=True)
+        recently_expired = self.token(age_hours=5, expires_in_hours=-1)
+        valid = self.token(age_hours=1, expires_in_hours=1)
+        out = StringIO()
+
+        call_command("purge_user_tokens", batch_size=1, grace_hours=24, stdout=out)
+
+        self.assertIn("Tokens eliminados: 2.", out.getvalue())
+        self.assertEqual(set(UserToken.objects.values_list("pk", flat=True)), {recently_expired.pk, valid.pk})
+        self.assertFalse(UserToken.objects.filter(pk__in=[expired.pk, used.pk]).exists())
+
+
+class UserAuditTests(TestCase):
+    def test_changes_are_logged_from_the_loaded_values(self):
+        CustomUser.objects.create_user(
+            username="marta", email="marta@example.com", password="x", first_name="Marta", last_name="R"
+        )
+        user = CustomUser.objects.get(username="marta")
+        user.email = "marta.r@example.com"
+        user.first_name = "Marta Lucía"
+        user.last_name = "R"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+
+        self.assertEqual(
+            list(
+                UserChangeLog.objects.order_by("field_changed").values_list(
+                    "field_changed", "change_type", "old_value", "new_value"
+                )
+            ),
+            [
+                ("email", "email", "marta@example.com", "marta.r@example.com"),
+                ("first_name", "datos personales", "Marta", "Marta Lucía"),
+            ],
+        )
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class RoleCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username="luis", email="luis@example.com", password="x", first_name="Luis", last_name="G"
+        )
+        self.group = Group.objects.get_or_create(name="Staff")[0]
+
+    def roles(self):
+        # Instancia nueva: no hereda la caché por petición de la anterior
+        return get_user_roles(CustomUser.objects.get(pk=self.user.pk))
+
+    def test_roles_are_read_once_and_then_served_from_the_cache(self):
+        self.roles()
+
+        with self.assertNumQueries(1):  # solo la carga del usuario
+            self.assertEqual(self.roles(), frozenset())
+
+    def test_adding_the_group_to_the_user_invalidates_the_cache(self):
+        self.roles()
+
+        self.user.groups.add(self.group)
+
+        self.assertEqual(self.roles(), {"Staff"})
+        self.assertTrue(has_role(self.user, "Staff"))
+
+    def test_changes_from_the_group_side_invalidate_the_cache(self):
+        self.roles()
+        self.group.user_set.add(self.user)
+        self.assertEqual(self.roles(), {"Staff"})
+
+        self.group.user_set.remove(self.user)
+        self.assertEqual(self.roles(), frozenset())
+
+        self.group.user_set.add(self.user)
+        self.roles()
+        self.group.user_set.clear()
+        self.assertEqual(self.roles(), frozenset())
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+    def test_without_a_shared_cache_roles_come_from_the_database(self):
+        self.roles()
+        self.user.groups.add(self.group)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.roles(), {"Staff"})
+
+
+@override_settings(DEFAULT_FROM_EMAIL="no-reply@gestify.test", FRONTEND_URL="https://gestify.test")
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="ana", email="ana@example.com", password="x", first_name="Ana", last_name="Pérez"
+        )
+
+    def queue(self):
+        return queue_email(self.user.email, "Registro exitoso", "emails/confirmation", {"first_name": "Ana"})
+
+    def test_email_is_sent_when_the_transaction_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            send_verification_email(self.user, "tok")
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("https://gestify.test/verify-email?token=tok", mail.outbox[0].body)
+        self.assertEqual(EmailOutbox.objects.get().status, EmailOutbox.Status.ENVIADO)
+
+    @override_settings(EMAIL_OUTBOX_ENABLED=True)
+    def test_outbox_mode_waits_for_the_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.queue()
+        self.assertEqual(len(mail.outbox), 0)
+
+        call_command("send_queued_emails", stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailOutbox.objects.get().status, EmailOutbox.Status.ENVIADO)
+
+    @override_settings(EMAIL_OUTBOX_ENABLED=True)
+    def test_claimed_entries_are_not_taken_twice(self):
+        self.queue()
+
+        first = claim_entries(10)
+        second = claim_entries(10)
+
+        self.assertEqual(len(first), 1)
+        self.assertEqual(second, [])
+        self.assertGreater(EmailOutbox.objects.get().next_attempt_at, timezone.now())
+
+    @override_settings(EMAIL_OUTBOX_ENABLED=True, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_sends_back_off_and_give_up(self):
+        entry = self.queue()
+        connection = mock.Mock()
+        connection.send_messages.side_effect = ValueError("rechazado")
+
+        self.assertEqual(send_entries(connection, claim_entries(10)), {"sent": 0, "retried": 1, "failed": 0})
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts, entry.last_error), (EmailOutbox.Status.PENDIENTE, 1, "rechazado"))
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_entries(connection, claim_entries(10)), {"sent": 0, "retried": 0, "failed": 1})
+        self.assertEqual(EmailOutbox.objects.get().status, EmailOutbox.Status.FALLIDO)
+
+    @override_settings(EMAIL_OUTBOX_ENABLED=True, EMAIL_OUTBOX_LEASE_SECONDS=60)
+    def test_claim_of_a_dead_worker_expires_after_the_lease(self):
+        self.queue()
+        claim_entries(10)
+
+        later = timezone.now() + timedelta(seconds=61)
+        with mock.patch("usuarios.email_service.timezone.now", return_value=later):
+            reclaimed = claim_entries(10)
+
+        self.assertEqual([entry.attempts for entry in reclaimed], [2])
@@ -10,6 +10,7 @@ from .views import (
     CustomUserRegisterView,
     CustomUserLoginView,
     ChangePasswordView,
+    TokenRefreshView,
 )
 from usuarios.password_reset import PasswordResetRequestView, PasswordResetConfirmView
 
@@ -17,6 +18,7 @@ urlpatterns = [
     # Users Auth
     path('users/register/', CustomUserRegisterView.as_view(), name='user-register'),
     path('users/login/', CustomUserLoginView.as_view(), name='user-login'),
+    path('users/token/refresh/', TokenRefreshView.as_view(), name='user-token-refresh'),
     path('users/change-password/', ChangePasswordView.as_view(), name='user-change-password'),
     # Users CRUD
     path('users/', CustomUserListView.as_view(), name="user-list"),
@@ -6,18 +6,20 @@ Vistas principales del módulo de usuarios. Clean code, docstrings y organizaci
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponse
 from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
 from rest_framework import generics, status, serializers
 from rest_framework.generics import ListAPIView, RetrieveUpdateDestroyAPIView
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from drf_spectacular.utils import extend_schema
+from gestify.pagination import StandardResultsSetPagination
 from .serializers import (
-    CustomUserSerializer, AssignRoleSerializer, DocumentTypeSerializer, EmptySerializer, RemoveRoleSerializer,
-    UserRegisterSerializer, UserLoginSerializer, ChangePasswordSerializer
+    CustomUserSerializer, CustomUserListSerializer, AssignRoleSerializer, DocumentTypeSerializer, EmptySerializer, RemoveRoleSerializer,
+    UserRegisterSerializer, UserLoginSerializer, ChangePasswordSerializer, TokenRefreshSerializer
 )
 from .models import CustomUser, DocumentType, UserToken
+from .authentication import AccessTokenAuthentication, issue_access_token
 from .permissions import IsAdminGroup, IsSelfOrAdmin
 from .email_service import (
     send_confirmation_email,
@@ -30,7 +32,7 @@ from django.contrib.auth.password_validation import validate_password
 class UserProfileUpdateView(generics.UpdateAPIView):
     """Permite al usuario autenticado editar su perfil."""
     serializer_class = CustomUserSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
@@ -43,16 +45,28 @@ class UserProfileUpdateView(generics.UpdateAPIView):
         return self.partial_update(request, *args, **kwargs)
 
     def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_object())
+        user = _users_with_relations().get(pk=request.user.pk)
+        serializer = self.get_serializer(user)
         return Response(serializer.data)
 
+
+def _users_with_relations():
+    """Usuarios con las relaciones que muestra CustomUserSerializer ya cargadas."""
+    return CustomUser.objects.select_related('document_type', 'department', 'city').prefetch_related(
+        'groups', 'user_permissions'
+    )
+
+
 class CustomUserListView(ListAPIView):
-    """Lista todos los usuarios (solo admin)."""
-    serializer_class = CustomUserSerializer
-    queryset = CustomUser.objects.all()
-    authentication_classes = [TokenAuthentication]
+    """Lista paginada de usuarios (solo admin)."""
+    serializer_class = CustomUserListSerializer
+    pagination_class = StandardResultsSetPagination
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated, IsAdminGroup]
 
+    def get_queryset(self):
+        return _users_with_relations().order_by('id')
+
     @extend_schema(tags=["Usuarios"])
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
@@ -61,7 +75,7 @@ class CustomUserRetrieveUpdateDestroyView(RetrieveUpdateDestroyAPIView):
     """Permite ver, editar o eliminar un usuario (solo admin o el propio usuario)."""
     serializer_class = CustomUserSerializer
     queryset = CustomUser.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
 
     permission_classes = [IsAuthenticated, IsSelfOrAdmin]
 
@@ -90,7 +104,7 @@ class CustomUserRetrieveUpdateDestroyView(RetrieveUpdateDestroyAPIView):
 class AssignRoleView(generics.GenericAPIView):
     """Asigna un rol a un usuario (solo admin)."""
     serializer_class = AssignRoleSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated, IsAdminGroup]
 
     @extend_schema(
@@ -112,7 +126,7 @@ class AssignRoleView(generics.GenericAPIView):
 class RemoveRoleView(generics.GenericAPIView):
     """Elimina un rol de un usuario (solo admin)."""
     serializer_class = RemoveRoleSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated, IsAdminGroup]
 
     @extend_schema(
@@ -143,13 +157,15 @@ class CustomUserRegisterView(generics.GenericAPIView):
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = serializer.save()
-        user.is_active = False
-        user.is_email_verified = False
-        user.save(update_fields=["is_active", "is_email_verified"])
         try:
-            token_value = create_email_verification_token(user)
-            send_verification_email(user, token_value)
+            # El correo se encola junto con el usuario y su token: todo o nada
+            with transaction.atomic():
+                user = serializer.save()
+                user.is_active = False
+                user.is_email_verified = False
+                user.save(update_fields=["is_active", "is_email_verified"])
+                token_value = create_email_verification_token(user)
+                send_verification_email(user, token_value)
         except ImproperlyConfigured as exc:
             return Response(
                 {"error": str(exc)},
@@ -190,9 +206,12 @@ class CustomUserLoginView(generics.GenericAPIView):
                     status=status.HTTP_403_FORBIDDEN,
                 )
             token, created = Token.objects.get_or_create(user=user)
+            access_token, access_expires_at = issue_access_token(user)
             return Response({
                 "message": "Login successful",
                 "token": token.key,
+                "access_token": access_token,
+                "access_expires_at": access_expires_at,
                 "user_id": user.id,
                 "email": user.email,
                 "username": user.username
@@ -203,10 +222,37 @@ class CustomUserLoginView(generics.GenericAPIView):
             status=status.HTTP_401_UNAUTHORIZED
         )
 
+class TokenRefreshView(generics.GenericAPIView):
+    """Emite un nuevo token de acceso firmado a partir del token de refresco (Token de login)."""
+    serializer_class = TokenRefreshSerializer
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        request=TokenRefreshSerializer,
+        responses={200: TokenRefreshSerializer},
+        tags=["Autenticación"]
+    )
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token = Token.objects.select_related("user").filter(key=serializer.validated_data["refresh"]).first()
+        # Borrar la fila del Token revoca el refresco; el acceso vigente vence en minutos
+        if token is None or not token.user.is_active:
+            return Response(
+                {"error": "Token de refresco inválido o revocado."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        access_token, access_expires_at = issue_access_token(token.user)
+        return Response(
+            {"access_token": access_token, "access_expires_at": access_expires_at},
+            status=status.HTTP_200_OK,
+        )
+
 class ChangePasswordView(generics.GenericAPIView):
     """Cambia la contraseña del usuario autenticado."""
     serializer_class = ChangePasswordSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [AccessTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @extend_schema(
@@ -247,11 +293,12 @@ class VerifyEmailView(generics.GenericAPIView):
         if not user_token.is_valid():
             return HttpResponse('Token inválido o expirado.', status=400)
         user = user_token.user
-        user.is_active = True
-        user.is_email_verified = True
-        user.save(update_fields=['is_active', 'is_email_verified'])
-        user_token.mark_used()
-        send_confirmation_email(user)
+        with transaction.atomic():
+            user.is_active = True
+            user.is_email_verified = True
+            user.save(update_fields=['is_active', 'is_email_verified'])
+            user_token.mark_used()
+            send_confirmation_email(user)
         return HttpResponse('¡Correo verificado exitosamente! Tu cuenta está activa.')
 
 class DocumentTypeListView(generics.ListAPIView):